@@ -140,6 +140,11 @@ class Cameras(TensorDataclass):
         self.camera_type = self._init_get_camera_type(camera_type)
         self.times = self._init_get_times(times)
 
+        # Lazily computed by the fast ray generation path, see _get_ray_generation_info and get_cached_image_coords
+        self._ray_generation_info: Optional[Tuple[Optional[int], bool, bool, List[int], List[int]]] = None
+        self._ray_generation_key: Optional[Tuple[torch.device, Tuple, Tuple]] = None
+        self._image_coords_cache: Dict[Tuple[int, int, torch.device], TensorType["height", "width", 2]] = {}
+
         self.__post_init__()  # This will do the dataclass post_init and broadcast all the tensors
 
     def _init_get_fc_xy(self, fc_xy, name):
@@ -301,6 +306,28 @@ class Cameras(TensorDataclass):
             image_coords = torch.stack(image_coords, dim=-1) + pixel_offset  # stored as (y, x) coordinates
         return image_coords
 
+    def get_cached_image_coords(self, image_height: int, image_width: int) -> TensorType["height", "width", 2]:
+        """Returns the pixel center coordinates of an image of the given size, on the device of the cameras.
+
+        The grid is built once per image size and shared by later calls, so it must not be modified in place.
+
+        Args:
+            image_height: Height of the image.
+            image_width: Width of the image.
+
+        Returns:
+            Grid of image coordinates.
+        """
+        key = (image_height, image_width, self.device)
+        if key not in self._image_coords_cache:
+            image_coords = torch.meshgrid(
+                torch.arange(image_height, device=self.device),
+                torch.arange(image_width, device=self.device),
+                indexing="ij",
+            )
+            self._image_coords_cache[key] = torch.stack(image_coords, dim=-1) + 0.5  # stored as (y, x) coordinates
+        return self._image_coords_cache[key]
+
     def generate_rays(  # pylint: disable=too-many-statements
         self,
         camera_indices: Union[TensorType["num_rays":..., "num_cameras_batch_dims"], int],
@@ -309,6 +336,7 @@ class Cameras(TensorDataclass):
         distortion_params_delta: Optional[TensorType["num_rays":..., 6]] = None,
         keep_shape: Optional[bool] = None,
         disable_distortion: bool = False,
+        fast_path: bool = True,
     ) -> RayBundle:
         """Generates rays for the given camera indices.
 
@@ -341,6 +369,9 @@ class Cameras(TensorDataclass):
         we will need to flatten each individual coordinate map and concatenate them, giving us only one batch dimension,
         regaurdless of the number of prepended extra batch dimensions in the camera_indices tensor.
 
+        The two most common calls, rendering the full image of a single camera (camera_indices is an int and coords
+        is None) and generating a batch of rays with one camera index each from a flat batch of cameras, skip all of
+        the above and go through _generate_rays_fast instead, as long as all the cameras share the same camera type.
 
         Args:
             camera_indices: Camera indices of the flattened cameras object to generate rays for.
@@ -351,10 +382,24 @@ class Cameras(TensorDataclass):
                 keeping dimensions. If False, we flatten at the end. If True, then we keep the shape of the
                 camera_indices and coords tensors (if we can).
             disable_distortion: If True, disables distortion.
+            fast_path: Whether to use the fast path for the cases it supports. If False, the rays are always generated
+                by the generic path.
 
         Returns:
             Rays for the given camera indices and coords.
         """
+        if fast_path and self._can_generate_rays_fast(
+            camera_indices, coords, camera_opt_to_camera, distortion_params_delta, keep_shape
+        ):
+            raybundle = self._generate_rays_fast(
+                camera_indices, coords, camera_opt_to_camera, distortion_params_delta, disable_distortion
+            )
+            # Match the generic path, which flattens full images of jagged cameras unless asked to keep the shape
+            is_jagged = self._get_ray_generation_info()[2]
+            if keep_shape is False or (keep_shape is None and coords is None and is_jagged):
+                raybundle = raybundle.flatten()
+            return raybundle
+
         # Check the argument types to make sure they're valid and all shaped correctly
         assert isinstance(camera_indices, (torch.Tensor, int)), "camera_indices must be a tensor or int"
         assert coords is None or isinstance(coords, torch.Tensor), "coords must be a tensor or None"
@@ -399,15 +444,22 @@ class Cameras(TensorDataclass):
         # a flat list of coords for each camera and then concatenate otherwise our rays will be jagged.
         # Camera indices, camera_opt, and distortion will also need to be broadcasted accordingly which is non-trivial
         if cameras.is_jagged and coords is None and (keep_shape is None or keep_shape is False):
+            # Need to get the coords of each indexed camera and flatten all coordinate maps and concatenate them.
+            # This is done in one pass: every pixel finds its image from the cumulative pixel counts of the images,
+            # and its (y, x) coordinates from its offset into that image.
             index_dim = camera_indices.shape[-1]
-            camera_indices = camera_indices.reshape(-1, index_dim)
-            _coords = [cameras.get_image_coords(index=tuple(index)).reshape(-1, 2) for index in camera_indices]
-            camera_indices = torch.cat(
-                [index.unsqueeze(0).repeat(coords.shape[0], 1) for index, coords in zip(camera_indices, _coords)],
-            )
-            coords = torch.cat(_coords, dim=0)
+            camera_indices = camera_indices.reshape(-1, index_dim).to(cameras.device)
+            true_indices = [camera_indices[..., i].long() for i in range(index_dim)]
+            heights = cameras.height[true_indices][..., 0].long()  # (num_images,)
+            widths = cameras.width[true_indices][..., 0].long()  # (num_images,)
+            num_pixels = heights * widths
+            image_starts = torch.cumsum(num_pixels, dim=0) - num_pixels
+            pixel_image = torch.repeat_interleave(torch.arange(len(num_pixels), device=cameras.device), num_pixels)
+            pixel_offsets = torch.arange(len(pixel_image), device=cameras.device) - image_starts[pixel_image]
+            pixel_widths = widths[pixel_image]
+            coords = torch.stack([pixel_offsets // pixel_widths, pixel_offsets % pixel_widths], dim=-1) + 0.5
+            camera_indices = camera_indices[pixel_image]
             assert coords.shape[0] == camera_indices.shape[0]
-            # Need to get the coords of each indexed camera and flatten all coordinate maps and concatenate them
 
         # The case where we aren't jagged && keep_shape (since otherwise coords is already set) and coords
         # is None. In this case we append (h, w) to the num_rays dimensions for all tensors. In this case,
@@ -455,6 +507,172 @@ class Cameras(TensorDataclass):
         # that we haven't caught yet with tests
         return raybundle
 
+    def _get_ray_generation_info(self) -> Tuple[Optional[int], bool, bool, List[int], List[int]]:
+        """Returns the properties of the cameras that the fast ray generation path relies on.
+
+        Computing them synchronizes with the device, so they are computed once and cached until the cameras are moved
+        to another device, or the camera type, distortion parameters, height or width are replaced or modified in
+        place.
+
+        Returns:
+            The camera type value shared by all the cameras (None if they differ), whether any of the cameras has
+            non-zero distortion parameters, whether the cameras are jagged, and the flattened heights and widths.
+        """
+        fields = (self.camera_type, self.distortion_params, self.height, self.width)
+        # pylint: disable=protected-access
+        versions = tuple(None if field is None else field._version for field in fields)
+        key = self._ray_generation_key
+        if (
+            key is None
+            or key[0] != self.device
+            or any(field is not cached_field for field, cached_field in zip(fields, key[1]))
+            or key[2] != versions
+        ):
+            camera_types = torch.unique(self.camera_type)
+            camera_type = int(camera_types[0]) if len(camera_types) == 1 else None
+            has_distortion = self.distortion_params is not None and bool(torch.any(self.distortion_params != 0))
+            self._ray_generation_info = (
+                camera_type,
+                has_distortion,
+                bool(self.is_jagged),
+                self.height.view(-1).tolist(),
+                self.width.view(-1).tolist(),
+            )
+            self._ray_generation_key = (self.device, fields, versions)
+        assert self._ray_generation_info is not None
+        return self._ray_generation_info
+
+    def _can_generate_rays_fast(
+        self,
+        camera_indices: Union[TensorType["num_rays":..., "num_cameras_batch_dims"], int],
+        coords: Optional[TensorType["num_rays":..., 2]],
+        camera_opt_to_camera: Optional[TensorType["num_rays":..., 3, 4]],
+        distortion_params_delta: Optional[TensorType["num_rays":..., 6]],
+        keep_shape: Optional[bool],
+    ) -> bool:
+        """Returns whether the arguments of generate_rays are one of the cases handled by _generate_rays_fast.
+
+        Args:
+            camera_indices: Camera indices passed to generate_rays.
+            coords: Coordinates passed to generate_rays.
+            camera_opt_to_camera: Camera optimization transform passed to generate_rays.
+            distortion_params_delta: Distortion parameters delta passed to generate_rays.
+            keep_shape: keep_shape argument passed to generate_rays.
+        """
+        if self.ndim != 1:
+            return False
+        if isinstance(camera_indices, int) and coords is None:
+            num_rays_shape = torch.Size()
+        elif isinstance(camera_indices, torch.Tensor) and isinstance(coords, torch.Tensor) and keep_shape is not True:
+            num_rays_shape = coords.shape[:-1]
+            if coords.shape[-1] != 2 or camera_indices.shape != num_rays_shape + (1,):
+                return False
+        else:
+            return False
+        if (camera_opt_to_camera is not None and camera_opt_to_camera.shape != num_rays_shape + (3, 4)) or (
+            distortion_params_delta is not None and distortion_params_delta.shape != num_rays_shape + (6,)
+        ):
+            return False
+        camera_type = self._get_ray_generation_info()[0]
+        return camera_type in [CameraType.PERSPECTIVE.value, CameraType.FISHEYE.value, CameraType.EQUIRECTANGULAR.value]
+
+    def _generate_rays_fast(
+        self,
+        camera_indices: Union[TensorType["num_rays":..., 1], int],
+        coords: Optional[TensorType["num_rays":..., 2]],
+        camera_opt_to_camera: Optional[TensorType["num_rays":..., 3, 4]] = None,
+        distortion_params_delta: Optional[TensorType["num_rays":..., 6]] = None,
+        disable_distortion: bool = False,
+    ) -> RayBundle:
+        """Generates rays for a flat batch of cameras that all share the same camera type.
+
+        This computes the same rays as _generate_rays_from_coords, without the shape checks, broadcasts and per camera
+        type masking, for the two cases accepted by _can_generate_rays_fast:
+            - camera_indices is an int and coords is None: the full image of that camera is rendered. Its intrinsics
+              and pose are gathered once and broadcast against the cached image coordinate grid.
+            - camera_indices has shape (num_rays:..., 1) and coords has shape (num_rays:..., 2).
+
+        Args:
+            camera_indices: Camera index of the full image to render, or camera index of each ray.
+            coords: Coordinates of the pixels to generate rays for. Must be None if camera_indices is an int.
+            camera_opt_to_camera: Optional transform for the camera to world matrices, of shape (3, 4) when rendering
+                a full image.
+            distortion_params_delta: Optional delta for the distortion parameters, of shape (6,) when rendering a full
+                image.
+            disable_distortion: If True, disables distortion.
+
+        Returns:
+            Rays for the given camera indices and coords, of shape (height, width) when rendering a full image.
+        """
+        camera_type, has_distortion, _, heights, widths = self._get_ray_generation_info()
+        if isinstance(camera_indices, int):
+            coords = self.get_cached_image_coords(heights[camera_indices], widths[camera_indices])  # (h, w, 2)
+            index = torch.tensor([camera_indices], device=self.device)  # (1,), broadcasts against (h, w)
+            c2w = self.camera_to_worlds[camera_indices]  # (3, 4)
+            camera_indices = index.expand(coords.shape[:-1] + (1,))  # (h, w, 1)
+        else:
+            assert coords is not None
+            camera_indices = camera_indices.to(self.device, torch.long)
+            coords = coords.to(self.device)
+            index = camera_indices[..., 0]  # (num_rays,)
+            c2w = self.camera_to_worlds[index]  # (num_rays, 3, 4)
+
+        y = coords[..., 0]
+        x = coords[..., 1]
+        fx, fy = self.fx[index, 0], self.fy[index, 0]
+        cx, cy = self.cx[index, 0], self.cy[index, 0]
+        coord_stack = torch.stack(
+            [
+                torch.stack([(x - cx) / fx, -(y - cy) / fy], -1),
+                torch.stack([(x - cx + 1) / fx, -(y - cy) / fy], -1),
+                torch.stack([(x - cx) / fx, -(y - cy + 1) / fy], -1),
+            ],
+            dim=0,
+        )  # (3, num_rays, 2)
+
+        # All-zero distortion parameters leave the coordinates unchanged, so they are skipped entirely
+        if not disable_distortion and camera_type != CameraType.EQUIRECTANGULAR.value:
+            distortion_params = self.distortion_params[index] if has_distortion else None
+            if distortion_params_delta is not None and distortion_params is not None:
+                distortion_params = distortion_params + distortion_params_delta
+            elif distortion_params_delta is not None:
+                distortion_params = distortion_params_delta
+            if distortion_params is not None:
+                coord_stack = camera_utils.radial_and_tangential_undistort(coord_stack, distortion_params)
+
+        if camera_type == CameraType.PERSPECTIVE.value:
+            directions_stack = torch.cat([coord_stack, -torch.ones_like(coord_stack[..., :1])], dim=-1)
+        elif camera_type == CameraType.FISHEYE.value:
+            theta = torch.clip(torch.sqrt(torch.sum(coord_stack**2, dim=-1, keepdim=True)), 0.0, math.pi)
+            directions_stack = torch.cat([coord_stack * torch.sin(theta) / theta, -torch.cos(theta)], dim=-1)
+        else:
+            theta = -torch.pi * coord_stack[..., 0]  # minus sign for right-handed
+            phi = torch.pi * (0.5 - coord_stack[..., 1])
+            directions_stack = torch.stack(
+                [-torch.sin(theta) * torch.sin(phi), torch.cos(phi), -torch.cos(theta) * torch.sin(phi)], dim=-1
+            )
+        directions_stack = directions_stack.float()  # (3, num_rays, 3)
+
+        if camera_opt_to_camera is not None:
+            c2w = pose_utils.multiply(c2w, camera_opt_to_camera)
+        directions_stack = torch.matmul(c2w[..., :3, :3], directions_stack[..., None])[..., 0]
+        directions_stack = normalize(directions_stack, dim=-1)
+
+        directions = directions_stack[0]
+        origins = c2w[..., :3, 3].expand(directions.shape)
+        dx = torch.sqrt(torch.sum((directions - directions_stack[1]) ** 2, dim=-1))
+        dy = torch.sqrt(torch.sum((directions - directions_stack[2]) ** 2, dim=-1))
+        pixel_area = (dx * dy)[..., None]
+        times = self.times[camera_indices, 0] if self.times is not None else None
+
+        return RayBundle(
+            origins=origins,
+            directions=directions,
+            pixel_area=pixel_area,
+            camera_indices=camera_indices,
+            times=times,
+        )
+
     # pylint: disable=too-many-statements
     def _generate_rays_from_coords(
         self,
@@ -22,7 +22,12 @@ from typing import Callable, Dict, Optional
 import torch
 from torchtyping import TensorType
 
-from nerfstudio.utils.math import Gaussians, conical_frustum_to_gaussian
+from nerfstudio.utils.math import (
+    Gaussians,
+    conical_frustum_to_gaussian,
+    packed_to_padded,
+    volume_rendering_weights,
+)
 from nerfstudio.utils.tensor_dataclass import TensorDataclass
 
 
@@ -124,16 +129,35 @@ class RaySamples(TensorDataclass):
             Weights for each sample
         """
 
+        delta_density = self.deltas * densities
+        weights = volume_rendering_weights(delta_density)  # [..., "num_samples", 1]
+
+        return weights
+
+    def get_weights_packed(
+        self, densities: TensorType["num_samples", 1], ray_indices: TensorType["num_samples"], num_rays: int
+    ) -> TensorType["num_samples", 1]:
+        """Return weights based on predicted densities, for packed samples
+
+        Args:
+            densities: Predicted densities for the packed samples
+            ray_indices: Ray index of each sample, with the samples of each ray contiguous and in order
+            num_rays: Number of rays
+
+        Returns:
+            Weights for each sample
+        """
+
         delta_density = self.deltas * densities
         alphas = 1 - torch.exp(-delta_density)
 
-        transmittance = torch.cumsum(delta_density[..., :-1, :], dim=-2)
-        transmittance = torch.cat(
-            [torch.zeros((*transmittance.shape[:1], 1, 1), device=densities.device), transmittance], dim=-2
-        )
-        transmittance = torch.exp(-transmittance)  # [..., "num_samples"]
+        # The transmittance is computed on the samples scattered into one zero padded row per ray
+        padded_delta_density, sample_offsets = packed_to_padded(delta_density, ray_indices, num_rays)
+        transmittance = torch.cumsum(padded_delta_density[:, :-1], dim=-2)
+        transmittance = torch.cat([torch.zeros((num_rays, 1, 1), device=densities.device), transmittance], dim=-2)
+        transmittance = torch.exp(-transmittance[ray_indices, sample_offsets])  # ["num_samples", 1]
 
-        weights = alphas * transmittance  # [..., "num_samples"]
+        weights = alphas * transmittance  # ["num_samples", 1]
 
         return weights
 
@@ -20,6 +20,7 @@ from __future__ import annotations
 
 from abc import abstractmethod
 from dataclasses import dataclass, field
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Type, Union
 
 import torch
@@ -49,7 +50,11 @@ from nerfstudio.data.dataparsers.phototourism_dataparser import (
     PhototourismDataParserConfig,
 )
 from nerfstudio.data.datasets.base_dataset import InputDataset
-from nerfstudio.data.pixel_samplers import EquirectangularPixelSampler, PixelSampler
+from nerfstudio.data.pixel_samplers import (
+    EquirectangularPixelSampler,
+    ImportancePixelSampler,
+    PixelSampler,
+)
 from nerfstudio.data.utils.dataloaders import (
     CacheDataloader,
     FixedIndicesEvalDataloader,
@@ -261,6 +266,16 @@ class VanillaDataManagerConfig(InstantiateConfig):
     train_num_times_to_repeat_images: int = -1
     """When not training on all images, number of iterations before picking new
     images. If -1, never pick new images."""
+    train_pixel_sampler: Literal["uniform", "importance"] = "uniform"
+    """How to sample training pixels. "importance" focuses rays on the regions of each image with the highest recent
+    rgb error, and returns loss weights that keep the rgb loss unbiased for models that use them."""
+    precompute_ray_directions: bool = False
+    """Precompute the camera space direction of every pixel for each group of cameras with the same intrinsics, so
+    that generating a batch of rays is a table lookup and a rotation instead of undistorting every ray."""
+    prefetch_images: bool = False
+    """When picking new images, load the next images in the background while training on the current ones. This
+    hides the image loading time when resampling images, but keeps up to two sets of images in memory, so it is off
+    by default."""
     eval_num_rays_per_batch: int = 1024
     """Number of rays per batch to use per eval iteration."""
     eval_num_images_to_sample_from: int = -1
@@ -279,6 +294,12 @@ class VanillaDataManagerConfig(InstantiateConfig):
     """The scale factor for scaling spatial data such as images, mask, semantics
     along with relevant information about camera intrinsics
     """
+    cache_images_type: Literal["float32", "uint8"] = "float32"
+    """Type to cache the training images as. uint8 keeps the images uncomposited and on the device, using a
+    quarter of the memory, and pixels are only normalized and alpha composited once they have been sampled."""
+    image_cache_dir: Optional[Path] = None
+    """If set, decoded (and rescaled) images are stored in a memory-mapped file in this directory, keyed by the
+    image filenames, modification times and scale factor, so that later runs skip decoding the images."""
 
 
 class VanillaDataManager(DataManager):  # pylint: disable=abstract-method
@@ -329,6 +350,7 @@ class VanillaDataManager(DataManager):  # pylint: disable=abstract-method
         return InputDataset(
             dataparser_outputs=self.train_dataparser_outputs,
             scale_factor=self.config.camera_res_scale_factor,
+            image_cache_dir=self.config.image_cache_dir,
         )
 
     def create_eval_dataset(self) -> InputDataset:
@@ -336,19 +358,33 @@ class VanillaDataManager(DataManager):  # pylint: disable=abstract-method
         return InputDataset(
             dataparser_outputs=self.dataparser.get_dataparser_outputs(split=self.test_split),
             scale_factor=self.config.camera_res_scale_factor,
+            image_cache_dir=self.config.image_cache_dir,
         )
 
     def _get_pixel_sampler(  # pylint: disable=no-self-use
-        self, dataset: InputDataset, *args: Any, **kwargs: Any
+        self, dataset: InputDataset, *args: Any, importance: bool = False, **kwargs: Any
     ) -> PixelSampler:
-        """Infer pixel sampler to use."""
+        """Infer pixel sampler to use.
+
+        Args:
+            dataset: dataset the pixel sampler samples from
+            importance: whether to focus the rays on the regions of each image with the highest error
+        """
+        kwargs.setdefault("alpha_color", dataset.alpha_color)
         # If all images are equirectangular, use equirectangular pixel sampler
         is_equirectangular = dataset.cameras.camera_type == CameraType.EQUIRECTANGULAR.value
         if is_equirectangular.all():
+            if importance:
+                raise ValueError(
+                    "The importance pixel sampler doesn't support equirectangular cameras, "
+                    'use train_pixel_sampler="uniform" instead.'
+                )
             return EquirectangularPixelSampler(*args, **kwargs)
         # Otherwise, use the default pixel sampler
         if is_equirectangular.any():
             CONSOLE.print("[bold yellow]Warning: Some cameras are equirectangular, but using default pixel sampler.")
+        if importance:
+            return ImportancePixelSampler(*args, num_cameras=len(dataset), **kwargs)
         return PixelSampler(*args, **kwargs)
 
     def setup_train(self):
@@ -363,15 +399,22 @@ class VanillaDataManager(DataManager):  # pylint: disable=abstract-method
             num_workers=self.world_size * 4,
             pin_memory=True,
             collate_fn=self.config.collate_fn,
+            image_type=self.config.cache_images_type,
+            prefetch_images=self.config.prefetch_images,
         )
         self.iter_train_image_dataloader = iter(self.train_image_dataloader)
-        self.train_pixel_sampler = self._get_pixel_sampler(self.train_dataset, self.config.train_num_rays_per_batch)
+        self.train_pixel_sampler = self._get_pixel_sampler(
+            self.train_dataset,
+            self.config.train_num_rays_per_batch,
+            importance=self.config.train_pixel_sampler == "importance",
+        )
         self.train_camera_optimizer = self.config.camera_optimizer.setup(
             num_cameras=self.train_dataset.cameras.size, device=self.device
         )
         self.train_ray_generator = RayGenerator(
             self.train_dataset.cameras.to(self.device),
             self.train_camera_optimizer,
+            use_direction_lut=self.config.precompute_ray_directions,
         )
 
     def setup_eval(self):
@@ -386,12 +429,15 @@ class VanillaDataManager(DataManager):  # pylint: disable=abstract-method
             num_workers=self.world_size * 4,
             pin_memory=True,
             collate_fn=self.config.collate_fn,
+            image_type=self.config.cache_images_type,
+            prefetch_images=self.config.prefetch_images,
         )
         self.iter_eval_image_dataloader = iter(self.eval_image_dataloader)
         self.eval_pixel_sampler = self._get_pixel_sampler(self.eval_dataset, self.config.eval_num_rays_per_batch)
         self.eval_ray_generator = RayGenerator(
             self.eval_dataset.cameras.to(self.device),
             self.train_camera_optimizer,  # should be shared between train and eval.
+            use_direction_lut=self.config.precompute_ray_directions,
         )
         # for loading full images
         self.fixed_indices_eval_dataloader = FixedIndicesEvalDataloader(
@@ -45,10 +45,12 @@ class SemanticDataManager(VanillaDataManager):  # pylint: disable=abstract-metho
         return SemanticDataset(
             dataparser_outputs=self.train_dataparser_outputs,
             scale_factor=self.config.camera_res_scale_factor,
+            image_cache_dir=self.config.image_cache_dir,
         )
 
     def create_eval_dataset(self) -> SemanticDataset:
         return SemanticDataset(
             dataparser_outputs=self.dataparser.get_dataparser_outputs(split=self.test_split),
             scale_factor=self.config.camera_res_scale_factor,
+            image_cache_dir=self.config.image_cache_dir,
         )
@@ -21,12 +21,19 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, List
 
+import torch
+
 from nerfstudio.data.datamanagers.base_datamanager import VanillaDataManagerConfig
 from nerfstudio.data.utils.nerfstudio_collate import nerfstudio_collate
 
 
 def variable_res_collate(batch: List[Dict]) -> Dict:
     """Default collate function for the cached dataloader.
+
+    Images (and masks) of different shapes can't be stacked, so their pixels are packed into a single
+    (num_pixels, num_channels) buffer instead, along with a table of the offset into the buffer, height and width of
+    each image, which lets the pixel sampler gather rays from all images at once.
+
     Args:
         batch: Batch of samples from the dataset.
     Returns:
@@ -38,13 +45,19 @@ def variable_res_collate(batch: List[Dict]) -> Dict:
         image = data.pop("image")
         mask = data.pop("mask", None)
         images.append(image)
-        if mask:
+        if mask is not None:
             masks.append(mask)
 
     new_batch: dict = nerfstudio_collate(batch)
-    new_batch["image"] = images
+    image_heights = torch.tensor([image.shape[0] for image in images], dtype=torch.long)
+    image_widths = torch.tensor([image.shape[1] for image in images], dtype=torch.long)
+    num_pixels = image_heights * image_widths
+    new_batch["image"] = torch.cat([image.reshape(-1, image.shape[-1]) for image in images], dim=0)
+    new_batch["image_offsets"] = torch.cumsum(num_pixels, dim=0) - num_pixels
+    new_batch["image_heights"] = image_heights
+    new_batch["image_widths"] = image_widths
     if masks:
-        new_batch["mask"] = masks
+        new_batch["mask"] = torch.cat([mask.reshape(-1, 1) for mask in masks], dim=0)
 
     return new_batch
 
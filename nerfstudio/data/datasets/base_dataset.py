@@ -18,7 +18,8 @@ Dataset.
 from __future__ import annotations
 
 from copy import deepcopy
-from typing import Dict
+from pathlib import Path
+from typing import Dict, Optional
 
 import numpy as np
 import numpy.typing as npt
@@ -26,9 +27,14 @@ import torch
 from PIL import Image
 from torch.utils.data import Dataset
 from torchtyping import TensorType
+from typing_extensions import Literal
 
 from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
-from nerfstudio.data.utils.data_utils import get_image_mask_tensor_from_path
+from nerfstudio.data.utils.data_utils import (
+    get_image_mask_tensor_from_path,
+    uint8_image_to_float,
+)
+from nerfstudio.data.utils.image_cache import DecodedImageCache
 
 
 class InputDataset(Dataset):
@@ -37,23 +43,45 @@ class InputDataset(Dataset):
     Args:
         dataparser_outputs: description of where and how to read input images.
         scale_factor: The scaling factor for the dataparser outputs
+        image_cache_dir: If set, decoded images are cached in a memory-mapped file in this directory.
     """
 
-    def __init__(self, dataparser_outputs: DataparserOutputs, scale_factor: float = 1.0):
+    def __init__(
+        self, dataparser_outputs: DataparserOutputs, scale_factor: float = 1.0, image_cache_dir: Optional[Path] = None
+    ):
         super().__init__()
         self._dataparser_outputs = dataparser_outputs
         self.has_masks = dataparser_outputs.mask_filenames is not None
         self.scale_factor = scale_factor
         self.scene_box = deepcopy(dataparser_outputs.scene_box)
         self.metadata = deepcopy(dataparser_outputs.metadata)
+        self.alpha_color = dataparser_outputs.alpha_color
         self.cameras = deepcopy(dataparser_outputs.cameras)
         self.cameras.rescale_output_resolution(scaling_factor=scale_factor)
+        self.image_cache = None
+        if image_cache_dir is not None and len(dataparser_outputs.image_filenames) > 0:
+            self.image_cache = DecodedImageCache(
+                cache_dir=image_cache_dir,
+                image_filenames=dataparser_outputs.image_filenames,
+                scale_factor=scale_factor,
+                load_fn=self.load_numpy_image,
+            )
 
     def __len__(self):
         return len(self._dataparser_outputs.image_filenames)
 
     def get_numpy_image(self, image_idx: int) -> npt.NDArray[np.uint8]:
-        """Returns the image of shape (H, W, 3 or 4).
+        """Returns the image of shape (H, W, 3 or 4), read from the image cache if there is one.
+
+        Args:
+            image_idx: The image index in the dataset.
+        """
+        if self.image_cache is not None:
+            return self.image_cache[image_idx]
+        return self.load_numpy_image(image_idx)
+
+    def load_numpy_image(self, image_idx: int) -> npt.NDArray[np.uint8]:
+        """Decodes the image file of shape (H, W, 3 or 4), resized by the scale factor.
 
         Args:
             image_idx: The image index in the dataset.
@@ -72,27 +100,40 @@ class InputDataset(Dataset):
         assert image.shape[2] in [3, 4], f"Image shape of {image.shape} is in correct."
         return image
 
-    def get_image(self, image_idx: int) -> TensorType["image_height", "image_width", "num_channels"]:
-        """Returns a 3 channel image.
+    def get_image_uint8(self, image_idx: int) -> TensorType["image_height", "image_width", "num_channels"]:
+        """Returns the uint8 image, with an alpha channel (appended if missing) when there is an alpha color to
+        composite with. Use uint8_image_to_float to get the same values as get_image.
 
         Args:
             image_idx: The image index in the dataset.
         """
-        image = torch.from_numpy(self.get_numpy_image(image_idx).astype("float32") / 255.0)
-        if self._dataparser_outputs.alpha_color is not None and image.shape[-1] == 4:
-            assert image.shape[-1] == 4
-            image = image[:, :, :3] * image[:, :, -1:] + self._dataparser_outputs.alpha_color * (1.0 - image[:, :, -1:])
-        else:
+        # Views into the image cache are wrapped without a copy, the image is only copied when it is collated
+        image = torch.from_numpy(self.get_numpy_image(image_idx))
+        if self._dataparser_outputs.alpha_color is None:
             image = image[:, :, :3]
+        elif image.shape[-1] == 3:
+            image = torch.cat([image, torch.full_like(image[:, :, :1], 255)], dim=-1)
         return image
 
-    def get_data(self, image_idx: int) -> Dict:
+    def get_image(self, image_idx: int) -> TensorType["image_height", "image_width", "num_channels"]:
+        """Returns a 3 channel image.
+
+        Args:
+            image_idx: The image index in the dataset.
+        """
+        return uint8_image_to_float(self.get_image_uint8(image_idx), self._dataparser_outputs.alpha_color)
+
+    def get_data(self, image_idx: int, image_type: Literal["float32", "uint8"] = "float32") -> Dict:
         """Returns the ImageDataset data as a dictionary.
 
         Args:
             image_idx: The image index in the dataset.
+            image_type: Whether to return the image as a 3 channel float image, or as an uncomposited uint8 image.
         """
-        image = self.get_image(image_idx)
+        if image_type == "uint8":
+            image = self.get_image_uint8(image_idx)
+        else:
+            image = self.get_image(image_idx)
         data = {"image_idx": image_idx}
         data["image"] = image
         if self.has_masks:
@@ -16,7 +16,8 @@
 Semantic dataset.
 """
 
-from typing import Dict
+from pathlib import Path
+from typing import Dict, Optional
 
 import torch
 
@@ -30,10 +31,14 @@ class SemanticDataset(InputDataset):
 
     Args:
         dataparser_outputs: description of where and how to read input images.
+        scale_factor: The scaling factor for the dataparser outputs
+        image_cache_dir: If set, decoded images are cached in a memory-mapped file in this directory.
     """
 
-    def __init__(self, dataparser_outputs: DataparserOutputs, scale_factor: float = 1.0):
-        super().__init__(dataparser_outputs, scale_factor)
+    def __init__(
+        self, dataparser_outputs: DataparserOutputs, scale_factor: float = 1.0, image_cache_dir: Optional[Path] = None
+    ):
+        super().__init__(dataparser_outputs, scale_factor, image_cache_dir)
         assert "semantics" in dataparser_outputs.metadata.keys() and isinstance(self.metadata["semantics"], Semantics)
         self.semantics = self.metadata["semantics"]
         self.mask_indices = torch.tensor(
@@ -16,12 +16,129 @@
 Code for sampling pixels.
 """
 
-import random
-from typing import Dict, Optional, Union
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
 
 import torch
 from torchtyping import TensorType
 
+from nerfstudio.data.utils.data_utils import uint8_image_to_float
+
+
+@dataclass
+class MaskPixelIndex:
+    """Compressed sparse row (CSR) index of the valid pixels of a batch of masks.
+
+    Row i holds the flattened (y * width + x) positions of the valid pixels of image i, so pixels can be drawn
+    uniformly from an image, or from all images, without touching the masks again.
+
+    Args:
+        pixels: flattened positions of the valid pixels, grouped by image
+        offsets: start of the row of each image in pixels
+        counts: number of valid pixels in each image
+        image_widths: width of each mask, to unflatten the positions
+    """
+
+    pixels: TensorType["num_valid_pixels"]
+    offsets: TensorType["num_images"]
+    counts: TensorType["num_images"]
+    image_widths: TensorType["num_images"]
+
+    @classmethod
+    def from_rows(cls, rows: List[torch.Tensor], image_widths: torch.Tensor) -> "MaskPixelIndex":
+        """Builds the index from the flattened masks of each image."""
+        # Positions within an image always fit in int32, which halves the size of the index.
+        dtype = torch.int32 if max(len(row) for row in rows) < 2**31 else torch.int64
+        rows = [torch.nonzero(row, as_tuple=False).squeeze(-1).to(dtype) for row in rows]
+        counts = torch.tensor([len(row) for row in rows], dtype=torch.long, device=image_widths.device)
+        offsets = torch.cumsum(counts, dim=0) - counts
+        return cls(pixels=torch.cat(rows), offsets=offsets, counts=counts, image_widths=image_widths.long())
+
+    @classmethod
+    def from_mask(cls, mask: TensorType["num_images", "image_height", "image_width", 1]) -> "MaskPixelIndex":
+        """Builds the index from a batch of boolean masks."""
+        num_images, _, image_width = mask.shape[:3]
+        image_widths = torch.full((num_images,), image_width, dtype=torch.long, device=mask.device)
+        return cls.from_rows([mask[i].reshape(-1) for i in range(num_images)], image_widths)
+
+    @classmethod
+    def from_packed_mask(
+        cls,
+        mask: TensorType["num_pixels", 1],
+        image_offsets: TensorType["num_images"],
+        image_heights: TensorType["num_images"],
+        image_widths: TensorType["num_images"],
+    ) -> "MaskPixelIndex":
+        """Builds the index from masks of different sizes packed into one buffer, see variable_res_collate."""
+        image_widths = image_widths.to(mask.device)
+        rows = [
+            mask[start : start + height * width, 0]
+            for start, height, width in zip(image_offsets.tolist(), image_heights.tolist(), image_widths.tolist())
+        ]
+        return cls.from_rows(rows, image_widths)
+
+    def get_valid_images(self) -> TensorType["num_valid_images"]:
+        """Returns the indices of the images with at least one valid pixel."""
+        valid_images = torch.nonzero(self.counts > 0, as_tuple=False).squeeze(-1)
+        if len(valid_images) == 0:
+            raise ValueError("None of the masks in the batch have a valid pixel to sample rays from.")
+        return valid_images
+
+    def sample_from_images(self, image_indices: TensorType["batch_size"]) -> TensorType["batch_size", 3]:
+        """Draws one valid pixel from each of the given images, returned as (image, y, x) indices.
+
+        Args:
+            image_indices: images to draw from, which must each have at least one valid pixel (see get_valid_images)
+        """
+        image_indices = image_indices.to(self.pixels.device)
+        counts = self.counts[image_indices]
+        within = torch.floor(torch.rand(len(image_indices), device=self.pixels.device) * counts).long()
+        positions = self.offsets[image_indices] + torch.minimum(within, counts - 1)
+        return self._unflatten(image_indices, positions)
+
+    def sample(
+        self, batch_size: int, image_weights: Optional[TensorType["num_images"]] = None
+    ) -> TensorType["batch_size", 3]:
+        """Draws (image, y, x) indices of valid pixels, with replacement.
+
+        Args:
+            batch_size: number of pixels to draw
+            image_weights: relative probability of drawing from each image. If None, every valid pixel is equally
+                likely to be drawn.
+        """
+        device = self.pixels.device
+        if image_weights is None:
+            positions = torch.randint(0, len(self.pixels), (batch_size,), device=device)
+            image_indices = torch.searchsorted(self.offsets, positions, right=True) - 1
+            return self._unflatten(image_indices, positions)
+        image_weights = image_weights.to(device) * (self.counts > 0)
+        return self.sample_from_images(torch.multinomial(image_weights, batch_size, replacement=True))
+
+    def _unflatten(
+        self, image_indices: TensorType["batch_size"], positions: TensorType["batch_size"]
+    ) -> TensorType["batch_size", 3]:
+        """Converts positions in the index to (image, y, x) indices."""
+        pixels = self.pixels[positions].long()
+        image_widths = self.image_widths[image_indices]
+        return torch.stack([image_indices, pixels // image_widths, pixels % image_widths], dim=-1)
+
+
+def split_rays_evenly(num_rays_per_batch: int, image_indices: TensorType["num_images"]) -> TensorType["num_rays"]:
+    """Splits the rays evenly between the given images, giving the remainder to the last image.
+
+    Args:
+        num_rays_per_batch: number of rays to split
+        image_indices: images to split the rays between
+
+    Returns:
+        The image index of each ray.
+    """
+    num_images = len(image_indices)
+    num_rays_in_batch = torch.full((num_images,), num_rays_per_batch // num_images, device=image_indices.device)
+    num_rays_in_batch[-1] += num_rays_per_batch - num_images * (num_rays_per_batch // num_images)
+    return torch.repeat_interleave(image_indices, num_rays_in_batch)
+
 
 class PixelSampler:  # pylint: disable=too-few-public-methods
     """Samples 'pixel_batch's from 'image_batch's.
@@ -29,12 +146,24 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
     Args:
         num_rays_per_batch: number of rays to sample per batch
         keep_full_image: whether or not to include a reference to the full image in returned batch
+        alpha_color: color to composite sampled uint8 pixels with an alpha channel onto
     """
 
-    def __init__(self, num_rays_per_batch: int, keep_full_image: bool = False, **kwargs) -> None:
+    def __init__(
+        self,
+        num_rays_per_batch: int,
+        keep_full_image: bool = False,
+        alpha_color: Optional[TensorType[3]] = None,
+        **kwargs,
+    ) -> None:
         self.kwargs = kwargs
         self.num_rays_per_batch = num_rays_per_batch
         self.keep_full_image = keep_full_image
+        self.alpha_color = alpha_color
+        self.image_weights: Optional[TensorType["num_cameras"]] = None
+        # The mask index is rebuilt whenever the dataloader hands us a new batch of masks.
+        self._mask_index_key: Optional[Union[torch.Tensor, List[torch.Tensor]]] = None
+        self._mask_index: Optional[Union[MaskPixelIndex, List[MaskPixelIndex]]] = None
 
     def set_num_rays_per_batch(self, num_rays_per_batch: int):
         """Set the number of rays to sample per batch.
@@ -44,6 +173,44 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
         """
         self.num_rays_per_batch = num_rays_per_batch
 
+    def set_image_weights(self, image_weights: Optional[TensorType["num_cameras"]]):
+        """Set the relative probability of sampling rays from each image. None samples all pixels uniformly.
+
+        Args:
+            image_weights: non-negative weight per camera, indexed by the absolute camera index
+        """
+        self.image_weights = image_weights
+
+    def get_mask_index(
+        self, mask: Union[torch.Tensor, List[torch.Tensor]], packed_batch: Optional[Dict] = None
+    ) -> Union[MaskPixelIndex, List[MaskPixelIndex]]:
+        """Returns the index of valid pixels of the mask, or of each mask in a list of masks, building it only
+        the first time a new mask is seen.
+
+        Args:
+            mask: batch of masks, packed masks, or list of masks of different shapes
+            packed_batch: batch holding the image table of packed masks
+        """
+        if self._mask_index_key is not mask:
+            if isinstance(mask, list):
+                self._mask_index = [MaskPixelIndex.from_mask(m.unsqueeze(0)) for m in mask]
+            elif packed_batch is not None:
+                self._mask_index = MaskPixelIndex.from_packed_mask(
+                    mask, packed_batch["image_offsets"], packed_batch["image_heights"], packed_batch["image_widths"]
+                )
+            else:
+                self._mask_index = MaskPixelIndex.from_mask(mask)
+            self._mask_index_key = mask
+        assert self._mask_index is not None
+        return self._mask_index
+
+    def _get_batch_image_weights(self, batch: Dict) -> Optional[TensorType["num_images"]]:
+        """Returns the weights of the images in the batch, if image weights have been set."""
+        if self.image_weights is None:
+            return None
+        image_idx = batch["image_idx"]
+        return self.image_weights.to(image_idx.device)[image_idx]
+
     def sample_method(  # pylint: disable=no-self-use
         self,
         batch_size: int,
@@ -52,6 +219,7 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
         image_width: int,
         mask: Optional[TensorType] = None,
         device: Union[torch.device, str] = "cpu",
+        image_weights: Optional[TensorType["num_images"]] = None,
     ) -> TensorType["batch_size", 3]:
         """
         Naive pixel sampler, uniformly samples across all possible pixels of all possible images.
@@ -60,11 +228,18 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
             batch_size: number of samples in a batch
             num_images: number of images to sample over
             mask: mask of possible pixels in an image to sample from.
+            image_weights: relative probability of sampling from each image.
         """
-        if mask:
-            nonzero_indices = torch.nonzero(mask[..., 0], as_tuple=False)
-            chosen_indices = random.sample(range(len(nonzero_indices)), k=batch_size)
-            indices = nonzero_indices[chosen_indices]
+        if mask is not None:
+            mask_index = self.get_mask_index(mask)
+            assert isinstance(mask_index, MaskPixelIndex)
+            indices = mask_index.sample(batch_size, image_weights=image_weights).to(device)
+        elif image_weights is not None:
+            image_indices = torch.multinomial(image_weights.to(device), batch_size, replacement=True)
+            pixel_indices = torch.floor(
+                torch.rand((batch_size, 2), device=device) * torch.tensor([image_height, image_width], device=device)
+            ).long()
+            indices = torch.cat([image_indices[:, None], pixel_indices], dim=-1)
         else:
             indices = torch.floor(
                 torch.rand((batch_size, 3), device=device)
@@ -78,6 +253,7 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
         Operates on a batch of images and samples pixels to use for generating rays.
         Returns a collated batch which is input to the Graph.
         It will sample only within the valid 'mask' if it's specified.
+        uint8 images are converted to float only for the sampled pixels.
 
         Args:
             batch: batch of images to sample from
@@ -88,17 +264,34 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
         device = batch["image"].device
         num_images, image_height, image_width, _ = batch["image"].shape
 
-        if "mask" in batch:
-            indices = self.sample_method(
-                num_rays_per_batch, num_images, image_height, image_width, mask=batch["mask"], device=device
-            )
-        else:
-            indices = self.sample_method(num_rays_per_batch, num_images, image_height, image_width, device=device)
+        indices = self.sample_method(
+            num_rays_per_batch,
+            num_images,
+            image_height,
+            image_width,
+            mask=batch.get("mask"),
+            device=device,
+            image_weights=self._get_batch_image_weights(batch),
+        )
+        return self._collate_indices(batch, indices, num_rays_per_batch, keep_full_image=keep_full_image)
+
+    def _collate_indices(
+        self, batch: Dict, indices: TensorType["num_rays", 3], num_rays_per_batch: int, keep_full_image: bool = False
+    ) -> Dict:
+        """Gathers the sampled pixels of a batch of images of the same shape.
 
+        Args:
+            batch: batch of images that was sampled from
+            indices: sampled (image, y, x) indices into the batch
+            num_rays_per_batch: number of rays sampled
+            keep_full_image: whether or not to include a reference to the full image in returned batch
+        """
         c, y, x = (i.flatten() for i in torch.split(indices, 1, dim=-1))
         collated_batch = {
             key: value[c, y, x] for key, value in batch.items() if key != "image_idx" and value is not None
         }
+        if collated_batch["image"].dtype == torch.uint8:
+            collated_batch["image"] = uint8_image_to_float(collated_batch["image"], self.alpha_color)
 
         assert collated_batch["image"].shape == (num_rays_per_batch, 3), collated_batch["image"].shape
 
@@ -134,17 +327,18 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
         all_images = []
 
         if "mask" in batch:
-            num_rays_in_batch = num_rays_per_batch // num_images
-            for i in range(num_images):
-
-                image_height, image_width, _ = batch["image"][i].shape
-
-                if i == num_images - 1:
-                    num_rays_in_batch = num_rays_per_batch - (num_images - 1) * num_rays_in_batch
-
-                indices = self.sample_method(
-                    num_rays_in_batch, 1, image_height, image_width, mask=batch["mask"][i], device=device
-                )
+            mask_index = self.get_mask_index(batch["mask"])
+            assert isinstance(mask_index, list)
+            # Images whose mask has no valid pixel don't get any rays
+            valid_images = [i for i in range(num_images) if mask_index[i].counts.item() > 0]
+            if not valid_images:
+                raise ValueError("None of the masks in the batch have a valid pixel to sample rays from.")
+            num_rays_in_batch = num_rays_per_batch // len(valid_images)
+            for i in valid_images:
+                if i == valid_images[-1]:
+                    num_rays_in_batch = num_rays_per_batch - (len(valid_images) - 1) * num_rays_in_batch
+
+                indices = mask_index[i].sample(num_rays_in_batch).to(device)
                 indices[:, 0] = i
                 all_indices.append(indices)
                 all_images.append(batch["image"][i][indices[:, 1], indices[:, 2]])
@@ -170,6 +364,8 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
         }
 
         collated_batch["image"] = torch.cat(all_images, dim=0)
+        if collated_batch["image"].dtype == torch.uint8:
+            collated_batch["image"] = uint8_image_to_float(collated_batch["image"], self.alpha_color)
 
         assert collated_batch["image"].shape == (num_rays_per_batch, 3), collated_batch["image"].shape
 
@@ -182,6 +378,74 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
 
         return collated_batch
 
+    def collate_image_dataset_batch_packed(self, batch: Dict, num_rays_per_batch: int, keep_full_image: bool = False):
+        """
+        Does the same as collate_image_dataset_batch_list, but for images of different shapes that have been packed
+        into one buffer of pixels, with a table of the offset, height and width of each image (see
+        variable_res_collate). All rays are gathered at once, so the cost doesn't grow with the number of images.
+
+        Args:
+            batch: batch of packed images to sample from
+            num_rays_per_batch: number of rays to sample per batch
+            keep_full_image: whether or not to include a reference to the full image in returned batch
+        """
+        device = batch["image"].device
+        image_offsets = batch["image_offsets"].to(device)
+        image_heights = batch["image_heights"].to(device)
+        image_widths = batch["image_widths"].to(device)
+        num_images = len(image_offsets)
+
+        image_weights = self._get_batch_image_weights(batch)
+        mask_index = None
+        if "mask" in batch:
+            mask_index = self.get_mask_index(batch["mask"], packed_batch=batch)
+            assert isinstance(mask_index, MaskPixelIndex)
+            # Images whose mask has no valid pixel don't get any rays
+            valid_images = mask_index.get_valid_images().to(device)
+            if image_weights is not None:
+                image_weights = image_weights.to(device) * (mask_index.counts.to(device) > 0)
+        else:
+            valid_images = torch.arange(num_images, device=device)
+
+        if image_weights is not None:
+            image_indices = torch.multinomial(image_weights.to(device), num_rays_per_batch, replacement=True)
+        else:
+            image_indices = split_rays_evenly(num_rays_per_batch, valid_images)
+
+        if mask_index is not None:
+            indices = mask_index.sample_from_images(image_indices).to(device)
+        else:
+            pixel_rand = torch.rand((num_rays_per_batch, 2), device=device)
+            y = torch.floor(pixel_rand[:, 0] * image_heights[image_indices]).long()
+            x = torch.floor(pixel_rand[:, 1] * image_widths[image_indices]).long()
+            indices = torch.stack([image_indices, y, x], dim=-1)
+
+        c, y, x = (i.flatten() for i in torch.split(indices, 1, dim=-1))
+        pixel_indices = image_offsets[c] + y * image_widths[c] + x
+        packed_keys = ("image", "mask")
+        table_keys = ("image_idx", "image_offsets", "image_heights", "image_widths")
+        collated_batch = {
+            key: value[pixel_indices] if key in packed_keys else value[c, y, x]
+            for key, value in batch.items()
+            if key not in table_keys and value is not None
+        }
+        if collated_batch["image"].dtype == torch.uint8:
+            collated_batch["image"] = uint8_image_to_float(collated_batch["image"], self.alpha_color)
+
+        assert collated_batch["image"].shape == (num_rays_per_batch, 3), collated_batch["image"].shape
+
+        # Needed to correct the random indices to their actual camera idx locations.
+        indices[:, 0] = batch["image_idx"].to(device)[c]
+        collated_batch["indices"] = indices  # with the abs camera indices
+
+        if keep_full_image:
+            collated_batch["full_image"] = [
+                batch["image"][start : start + height * width].view(height, width, -1)
+                for start, height, width in zip(image_offsets.tolist(), image_heights.tolist(), image_widths.tolist())
+            ]
+
+        return collated_batch
+
     def sample(self, image_batch: Dict):
         """Sample an image batch and return a pixel batch.
 
@@ -193,6 +457,10 @@ class PixelSampler:  # pylint: disable=too-few-public-methods
             pixel_batch = self.collate_image_dataset_batch_list(
                 image_batch, self.num_rays_per_batch, keep_full_image=self.keep_full_image
             )
+        elif "image_offsets" in image_batch:
+            pixel_batch = self.collate_image_dataset_batch_packed(
+                image_batch, self.num_rays_per_batch, keep_full_image=self.keep_full_image
+            )
         elif isinstance(image_batch["image"], torch.Tensor):
             pixel_batch = self.collate_image_dataset_batch(
                 image_batch, self.num_rays_per_batch, keep_full_image=self.keep_full_image
@@ -220,21 +488,28 @@ class EquirectangularPixelSampler(PixelSampler):  # pylint: disable=too-few-publ
         image_width: int,
         mask: Optional[TensorType] = None,
         device: Union[torch.device, str] = "cpu",
+        image_weights: Optional[TensorType["num_images"]] = None,
     ) -> TensorType["batch_size", 3]:
 
-        if mask:
+        if mask is not None:
             # Note: if there is a mask, sampling reduces back to uniform sampling, which gives more
             # sampling weight to the poles of the image than the equators.
             # TODO(kevinddchen): implement the correct mask-sampling method.
 
-            indices = super().sample_method(batch_size, num_images, image_height, image_width, mask=mask, device=device)
+            indices = super().sample_method(
+                batch_size, num_images, image_height, image_width, mask=mask, device=device, image_weights=image_weights
+            )
         else:
 
             # We sample theta uniformly in [0, 2*pi]
             # We sample phi in [0, pi] according to the PDF f(phi) = sin(phi) / 2.
             # This is done by inverse transform sampling.
             # http://corysimon.github.io/articles/uniformdistn-on-sphere/
-            num_images_rand = torch.rand(batch_size, device=device)
+            if image_weights is None:
+                num_images_rand = torch.rand(batch_size, device=device)
+            else:
+                image_indices = torch.multinomial(image_weights.to(device), batch_size, replacement=True)
+                num_images_rand = (image_indices + 0.5) / num_images
             phi_rand = torch.acos(1 - 2 * torch.rand(batch_size, device=device)) / torch.pi
             theta_rand = torch.rand(batch_size, device=device)
             indices = torch.floor(
@@ -243,3 +518,122 @@ class EquirectangularPixelSampler(PixelSampler):  # pylint: disable=too-few-publ
             ).long()
 
         return indices
+
+
+class ImportancePixelSampler(PixelSampler):  # pylint: disable=too-few-public-methods
+    """Samples 'pixel_batch's from 'image_batch's, focusing on the regions of each image with the highest error.
+
+    A low resolution map of the recent per-ray error of every image is kept, fed back through update_error_map.
+    Cells of the map are drawn proportionally to their error, mixed with a uniform floor so that every pixel keeps
+    being visited, and pixels are drawn uniformly within the cells. The returned batch holds "loss_weights", the
+    ratio between the uniform probability of each pixel and its sampling probability, with which a weighted loss is
+    an unbiased estimate of the uniformly sampled loss. Masked batches and images of different shapes are sampled
+    uniformly.
+
+    Args:
+        num_rays_per_batch: number of rays to sample per batch
+        keep_full_image: whether or not to include a reference to the full image in returned batch
+        alpha_color: color to composite sampled uint8 pixels with an alpha channel onto
+        num_cameras: number of cameras in the dataset, the error maps are indexed by the absolute camera index
+        cell_size: size in pixels of the cells of the error maps
+        uniform_fraction: fraction of the sampling probability spread uniformly over all pixels
+        error_decay: weight of the previous error of a cell when updating it with new errors
+    """
+
+    def __init__(
+        self,
+        num_rays_per_batch: int,
+        keep_full_image: bool = False,
+        alpha_color: Optional[TensorType[3]] = None,
+        num_cameras: int = 1,
+        cell_size: int = 16,
+        uniform_fraction: float = 0.25,
+        error_decay: float = 0.9,
+        **kwargs,
+    ) -> None:
+        super().__init__(num_rays_per_batch, keep_full_image=keep_full_image, alpha_color=alpha_color, **kwargs)
+        assert 0.0 < uniform_fraction <= 1.0, "A uniform floor is needed to keep the loss weights bounded."
+        self.num_cameras = num_cameras
+        self.cell_size = cell_size
+        self.uniform_fraction = uniform_fraction
+        self.error_decay = error_decay
+        self.error_map: Optional[TensorType["num_cameras", "grid_height", "grid_width"]] = None
+        self.cell_heights: Optional[TensorType["grid_height"]] = None
+        self.cell_widths: Optional[TensorType["grid_width"]] = None
+
+    def _init_error_map(self, image_height: int, image_width: int, device: Union[torch.device, str]) -> None:
+        """Creates the error maps, starting from a constant error so that sampling is initially uniform."""
+        grid_height = math.ceil(image_height / self.cell_size)
+        grid_width = math.ceil(image_width / self.cell_size)
+        self.error_map = torch.ones((self.num_cameras, grid_height, grid_width), device=device)
+        # Cells on the bottom and right borders may be cut off by the image
+        cell_starts_y = torch.arange(grid_height, device=device) * self.cell_size
+        cell_starts_x = torch.arange(grid_width, device=device) * self.cell_size
+        self.cell_heights = torch.clamp(image_height - cell_starts_y, max=self.cell_size)
+        self.cell_widths = torch.clamp(image_width - cell_starts_x, max=self.cell_size)
+
+    @torch.no_grad()
+    def update_error_map(self, indices: TensorType["num_rays", 3], errors: TensorType["num_rays"]) -> None:
+        """Blends the errors of the last batch of rays into the error maps.
+
+        Args:
+            indices: absolute camera, row and column indices of the rays
+            errors: error of each ray, such as its squared rgb error
+        """
+        if self.error_map is None:
+            return
+        _, grid_height, grid_width = self.error_map.shape
+        indices = indices.to(self.error_map.device)
+        cells = (
+            indices[:, 0] * grid_height * grid_width
+            + (indices[:, 1] // self.cell_size) * grid_width
+            + indices[:, 2] // self.cell_size
+        )
+        cells, inverse = torch.unique(cells, return_inverse=True)
+        errors = errors.detach().float().to(self.error_map.device)
+        error_sums = torch.zeros(len(cells), device=errors.device).index_add_(0, inverse, errors)
+        mean_errors = error_sums / torch.bincount(inverse, minlength=len(cells))
+        error_map = self.error_map.view(-1)
+        error_map[cells] = self.error_decay * error_map[cells] + (1.0 - self.error_decay) * mean_errors
+
+    def collate_image_dataset_batch(self, batch: Dict, num_rays_per_batch: int, keep_full_image: bool = False):
+        if "mask" in batch:
+            return super().collate_image_dataset_batch(batch, num_rays_per_batch, keep_full_image=keep_full_image)
+
+        num_images, image_height, image_width, _ = batch["image"].shape
+        image_idx = batch["image_idx"]
+        if self.error_map is None:
+            self._init_error_map(image_height, image_width, image_idx.device)
+        assert self.error_map is not None and self.cell_heights is not None and self.cell_widths is not None
+        device = self.error_map.device
+        _, grid_height, grid_width = self.error_map.shape
+
+        # Mix the error proportional distribution over cells with the uniform distribution over pixels. The maps hold
+        # the mean error of the rays in each cell, so the error of a cell scales with the number of pixels it covers.
+        cell_num_pixels = self.cell_heights[:, None] * self.cell_widths[None, :]
+        num_pixels = num_images * image_height * image_width
+        errors = self.error_map[image_idx.to(device)] * cell_num_pixels
+        probs = (1.0 - self.uniform_fraction) * errors / torch.clamp(errors.sum(), min=1e-12)
+        probs = (probs + self.uniform_fraction * cell_num_pixels / num_pixels).view(-1)
+        probs = probs / probs.sum()
+
+        # torch.multinomial is limited to 2^24 categories, so the image of each ray is drawn first, and then the cell
+        # within that image, by inverting the cumulative distribution of the cells of each image. The cumulative
+        # distribution of image i is offset by i so that the cells of all images are searched at once.
+        image_cell_probs = probs.view(num_images, grid_height * grid_width)
+        c = torch.multinomial(image_cell_probs.sum(dim=-1), num_rays_per_batch, replacement=True)
+        cdf = torch.cumsum(image_cell_probs.double(), dim=-1)
+        cdf = cdf / cdf[:, -1:] + torch.arange(num_images, device=device, dtype=torch.float64)[:, None]
+        u = c + torch.rand(num_rays_per_batch, device=device, dtype=torch.float64)
+        cells = torch.searchsorted(cdf.view(-1), u, right=True)
+        cells = torch.minimum(cells, (c + 1) * grid_height * grid_width - 1)
+        cell_y = (cells // grid_width) % grid_height
+        cell_x = cells % grid_width
+        pixel_rand = torch.rand((num_rays_per_batch, 2), device=device)
+        y = cell_y * self.cell_size + torch.floor(pixel_rand[:, 0] * self.cell_heights[cell_y]).long()
+        x = cell_x * self.cell_size + torch.floor(pixel_rand[:, 1] * self.cell_widths[cell_x]).long()
+        indices = torch.stack([c, y, x], dim=-1).to(batch["image"].device)
+
+        collated_batch = self._collate_indices(batch, indices, num_rays_per_batch, keep_full_image=keep_full_image)
+        collated_batch["loss_weights"] = cell_num_pixels[cell_y, cell_x] / (num_pixels * probs[cells])
+        return collated_batch
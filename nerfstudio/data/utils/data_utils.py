@@ -14,11 +14,12 @@
 
 """Utility functions to allow easy re-use of common operations across dataloaders"""
 from pathlib import Path
-from typing import List, Tuple, Union
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 import torch
 from PIL import Image
+from torchtyping import TensorType
 
 
 def get_image_mask_tensor_from_path(filepath: Path, scale_factor: float = 1.0) -> torch.Tensor:
@@ -34,6 +35,21 @@ def get_image_mask_tensor_from_path(filepath: Path, scale_factor: float = 1.0) -
     return mask_tensor
 
 
+def uint8_image_to_float(
+    image: TensorType[..., "num_channels"], alpha_color: Optional[TensorType[3]] = None
+) -> TensorType[..., 3]:
+    """
+    Utility function to normalize uint8 pixels to [0, 1] and composite them onto the alpha color, if there is one.
+    Works on full images as well as on gathered pixels.
+    """
+    image = image.float() / 255.0
+    if alpha_color is not None and image.shape[-1] == 4:
+        image = image[..., :3] * image[..., -1:] + alpha_color.to(image) * (1.0 - image[..., -1:])
+    else:
+        image = image[..., :3]
+    return image
+
+
 def get_semantics_and_mask_tensors_from_path(
     filepath: Path, mask_indices: Union[List, torch.Tensor], scale_factor: float = 1.0
 ) -> Tuple[torch.Tensor, torch.Tensor]:
@@ -27,6 +27,7 @@ import torch
 from rich.progress import Console, track
 from torch.utils.data import Dataset
 from torch.utils.data.dataloader import DataLoader
+from typing_extensions import Literal
 
 from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.cameras.rays import RayBundle
@@ -47,6 +48,10 @@ class CacheDataloader(DataLoader):
         num_times_to_repeat_images: How often to collate new images. -1 to never pick new images.
         device: Device to perform computation.
         collate_fn: The function we will use to collate our training data
+        image_type: Type to cache the images as. uint8 images are kept uncomposited and moved to the device, the
+            pixel sampler converts the sampled pixels to float.
+        prefetch_images: When resampling images, load the next set of images (and copy it to the device) in a
+            background thread while the current set is in use. This holds up to two sets of images in memory.
     """
 
     def __init__(
@@ -56,6 +61,8 @@ class CacheDataloader(DataLoader):
         num_times_to_repeat_images: int = -1,
         device: Union[torch.device, str] = "cpu",
         collate_fn=nerfstudio_collate,
+        image_type: Literal["float32", "uint8"] = "float32",
+        prefetch_images: bool = False,
         **kwargs,
     ):
         self.dataset = dataset
@@ -65,11 +72,26 @@ class CacheDataloader(DataLoader):
         self.num_images_to_sample_from = len(self.dataset) if self.cache_all_images else num_images_to_sample_from
         self.device = device
         self.collate_fn = collate_fn
+        self.image_type = image_type
         self.num_workers = kwargs.get("num_workers", 0)
 
         self.num_repeated = self.num_times_to_repeat_images  # starting value
         self.first_time = True
 
+        self.prefetch_images = prefetch_images and not self.cache_all_images and self.num_times_to_repeat_images != -1
+        self.prefetch_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.prefetch_future: Optional[concurrent.futures.Future] = None
+        self.copy_stream = None
+        if self.prefetch_images:
+            self.prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            if torch.device(self.device).type == "cuda":
+                self.copy_stream = torch.cuda.Stream(device=self.device)
+
+        image_cache = getattr(self.dataset, "image_cache", None)
+        if image_cache is not None:
+            # Build the image cache up front, its progress bar can't be shown inside the one for loading batches
+            image_cache.open()
+
         self.cached_collated_batch = None
         if self.cache_all_images:
             CONSOLE.print(f"Caching all {len(self.dataset)} images.")
@@ -89,10 +111,16 @@ class CacheDataloader(DataLoader):
             )
 
     def __getitem__(self, idx):
+        if self.image_type == "uint8":
+            return self.dataset.get_data(idx, image_type="uint8")
         return self.dataset.__getitem__(idx)
 
-    def _get_batch_list(self):
-        """Returns a list of batches from the dataset attribute."""
+    def _get_batch_list(self, show_progress: bool = True):
+        """Returns a list of batches from the dataset attribute.
+
+        Args:
+            show_progress: Whether to show a progress bar while loading.
+        """
 
         indices = random.sample(range(len(self.dataset)), k=self.num_images_to_sample_from)
         batch_list = []
@@ -104,21 +132,86 @@ class CacheDataloader(DataLoader):
 
         with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
             for idx in indices:
-                res = executor.submit(self.dataset.__getitem__, idx)
+                res = executor.submit(self.__getitem__, idx)
                 results.append(res)
 
-            for res in track(results, description="Loading data batch", transient=True):
+            if show_progress:
+                results = track(results, description="Loading data batch", transient=True)
+            for res in results:
                 batch_list.append(res.result())
 
         return batch_list
 
-    def _get_collated_batch(self):
-        """Returns a collated batch."""
-        batch_list = self._get_batch_list()
+    def _get_collated_batch(self, show_progress: bool = True):
+        """Returns a collated batch.
+
+        Args:
+            show_progress: Whether to show a progress bar while loading.
+        """
+        batch_list = self._get_batch_list(show_progress=show_progress)
         collated_batch = self.collate_fn(batch_list)
-        collated_batch = get_dict_to_torch(collated_batch, device=self.device, exclude=["image"])
+        # uint8 images are a quarter of the size of float images, so they are kept on the device as well
+        exclude = [] if self.image_type == "uint8" else ["image"]
+        collated_batch = get_dict_to_torch(collated_batch, device=self.device, exclude=exclude)
         return collated_batch
 
+    def _prefetch_collated_batch(self):
+        """Returns a collated batch, loaded from the prefetch thread. The copy to the device is enqueued on a
+        separate CUDA stream, which the consumer waits on before using the batch."""
+        if self.copy_stream is None:
+            return self._get_collated_batch(show_progress=False)
+        with torch.cuda.stream(self.copy_stream):
+            return self._get_collated_batch(show_progress=False)
+
+    def _wait_for_copy_stream(self, collated_batch):
+        """Makes the current stream wait for the copies enqueued on the copy stream, and marks the tensors of the
+        batch as used by the current stream so their memory isn't reused by the copy stream while still in use.
+
+        Args:
+            collated_batch: Batch that was copied to the device on the copy stream.
+        """
+        current_stream = torch.cuda.current_stream(self.device)
+        current_stream.wait_stream(self.copy_stream)
+        tensors = list(collated_batch.values())
+        while tensors:
+            value = tensors.pop()
+            if isinstance(value, torch.Tensor):
+                if value.is_cuda:
+                    value.record_stream(current_stream)
+            elif isinstance(value, dict):
+                tensors.extend(value.values())
+            elif isinstance(value, (list, tuple)):
+                tensors.extend(value)
+
+    def _get_next_collated_batch(self):
+        """Returns the next collated batch, and starts prefetching the one after it if prefetching is enabled."""
+        if not self.prefetch_images:
+            return self._get_collated_batch()
+        assert self.prefetch_executor is not None
+        if self.prefetch_future is None:
+            collated_batch = self._get_collated_batch()
+        else:
+            # Only blocks if the prefetch thread hasn't finished loading yet.
+            collated_batch = self.prefetch_future.result()
+            if self.copy_stream is not None:
+                self._wait_for_copy_stream(collated_batch)
+        self.prefetch_future = self.prefetch_executor.submit(self._prefetch_collated_batch)
+        return collated_batch
+
+    def close(self):
+        """Shuts down the prefetch thread, dropping the batch it is loading."""
+        if self.prefetch_future is not None:
+            self.prefetch_future.cancel()
+            self.prefetch_future = None
+        if self.prefetch_executor is not None:
+            self.prefetch_executor.shutdown(wait=False)
+            self.prefetch_executor = None
+
+    def __del__(self):
+        # The attributes are missing if the constructor raised before setting them
+        if hasattr(self, "prefetch_executor"):
+            self.close()
+
     def __iter__(self):
         while True:
             if self.cache_all_images:
@@ -128,7 +221,7 @@ class CacheDataloader(DataLoader):
             ):
                 # trigger a reset
                 self.num_repeated = 0
-                collated_batch = self._get_collated_batch()
+                collated_batch = self._get_next_collated_batch()
                 # possibly save a cached item
                 self.cached_collated_batch = collated_batch if self.num_times_to_repeat_images != 0 else None
                 self.first_time = False
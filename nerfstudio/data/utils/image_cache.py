@@ -0,0 +1,159 @@
+# Copyright 2022 The Nerfstudio Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Persistent on-disk cache of decoded images.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Deque, Iterator, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+from rich.progress import Console, track
+
+CONSOLE = Console(width=120)
+
+CACHE_VERSION = 1
+
+
+class DecodedImageCache:
+    """Memory-mapped store of decoded uint8 images.
+
+    The first time an image is requested, every image of the dataset is decoded with ``load_fn`` and written
+    back to back into a single raw file, along with a small json index holding the offset and shape of each
+    image. The name of the files is a hash of the image filenames, their modification times and the scale
+    factor, so touching an image or changing the downscale factor results in a fresh cache. Subsequent runs
+    only map the file and hand out views into it, without decoding or copying anything. The file is mapped
+    copy-on-write, so the views are writable but modifying them never changes the cache.
+
+    Args:
+        cache_dir: Directory to write the cache files to.
+        image_filenames: Filenames of the images, in dataset order.
+        scale_factor: Scale factor applied to the images before they are cached.
+        load_fn: Function that decodes the image at the given index into a (H, W, C) uint8 array.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        image_filenames: List[Path],
+        scale_factor: float,
+        load_fn: Callable[[int], npt.NDArray[np.uint8]],
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.image_filenames = image_filenames
+        self.scale_factor = scale_factor
+        self.load_fn = load_fn
+        self.cache_key = self._get_cache_key()
+        self.data_path = self.cache_dir / f"{self.cache_key}.bin"
+        self.index_path = self.cache_dir / f"{self.cache_key}.json"
+
+        self._lock = threading.Lock()
+        self._buffer: Optional[np.memmap] = None
+        self._offsets: List[int] = []
+        self._shapes: List[List[int]] = []
+
+    def __len__(self) -> int:
+        return len(self.image_filenames)
+
+    def __getitem__(self, image_idx: int) -> npt.NDArray[np.uint8]:
+        """Returns a copy-on-write view of the cached image of shape (H, W, C).
+
+        Args:
+            image_idx: The image index in the dataset.
+        """
+        if self._buffer is None:
+            self.open()
+        assert self._buffer is not None
+        shape = self._shapes[image_idx]
+        start = self._offsets[image_idx]
+        return self._buffer[start : start + int(np.prod(shape))].reshape(shape)
+
+    def _get_cache_key(self) -> str:
+        """Hashes the filenames, modification times and scale factor into the cache file name."""
+        hasher = hashlib.sha1()
+        hasher.update(f"v{CACHE_VERSION}:{self.scale_factor}\n".encode("utf-8"))
+        for filename in self.image_filenames:
+            filename = Path(filename).resolve()
+            hasher.update(f"{filename}:{os.stat(filename).st_mtime_ns}\n".encode("utf-8"))
+        return hasher.hexdigest()
+
+    def open(self) -> None:
+        """Maps the cache file into memory, building it first if it does not exist yet."""
+        with self._lock:
+            if self._buffer is not None:
+                return
+            if not (self.data_path.exists() and self.index_path.exists()):
+                self._build()
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self._offsets = index["offsets"]
+            self._shapes = index["shapes"]
+            self._buffer = np.memmap(self.data_path, dtype=np.uint8, mode="c", shape=(index["num_bytes"],))
+            CONSOLE.print(f"Mapped {len(self)} decoded images from {self.data_path}")
+
+    def _decode_in_order(
+        self, executor: concurrent.futures.Executor, window_size: int
+    ) -> Iterator[npt.NDArray[np.uint8]]:
+        """Decodes the images in dataset order, with at most window_size decodes in flight, so that the decoded
+        images never pile up in memory when writing them out is slower than decoding them.
+
+        Args:
+            executor: Executor to decode the images on.
+            window_size: Largest number of images decoded ahead of the one being written.
+        """
+        pending: Deque[concurrent.futures.Future] = collections.deque()
+        for image_idx in range(len(self)):
+            if len(pending) >= window_size:
+                yield pending.popleft().result()
+            pending.append(executor.submit(self.load_fn, image_idx))
+        while pending:
+            yield pending.popleft().result()
+
+    def _build(self) -> None:
+        """Decodes every image and streams it into the cache file."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        num_threads = max(min(8, multiprocessing.cpu_count() - 1), 1)
+        offsets = []
+        shapes = []
+        num_bytes = 0
+
+        # Write to temporary files first so that an interrupted run never leaves a partial cache behind.
+        tmp_data_path = self.data_path.with_suffix(".bin.tmp")
+        tmp_index_path = self.index_path.with_suffix(".json.tmp")
+        with open(tmp_data_path, "wb") as f, concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+            images = self._decode_in_order(executor, window_size=2 * num_threads)
+            for image in track(images, total=len(self), description="Caching decoded images", transient=True):
+                image = np.ascontiguousarray(image, dtype=np.uint8)
+                offsets.append(num_bytes)
+                shapes.append(list(image.shape))
+                num_bytes += image.nbytes
+                f.write(image.tobytes())
+
+        index = {"version": CACHE_VERSION, "num_bytes": num_bytes, "offsets": offsets, "shapes": shapes}
+        with open(tmp_index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_data_path, self.data_path)
+        os.replace(tmp_index_path, self.index_path)
+        CONSOLE.print(f"Wrote {num_bytes / 1e9:.2f} GB of decoded images to {self.data_path}")
@@ -20,9 +20,11 @@ Export utils such as structs, point cloud generation, and rendering code.
 
 from __future__ import annotations
 
+import math
 import sys
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 import open3d as o3d
@@ -82,93 +84,247 @@ def get_mesh_from_filename(filename: str, target_num_faces: Optional[int] = None
     return get_mesh_from_pymeshlab_mesh(mesh)
 
 
-def generate_point_cloud(
+def deduplicate_voxels(
+    points: TensorType["num_points", 3], voxel_size: float, voxel_keys: TensorType["num_voxels"]
+) -> Tuple[TensorType["num_points"], TensorType["num_new_voxels"]]:
+    """Keeps a single point per voxel of a grid, across batches of points.
+
+    The voxels are identified by keys packing 21 bits of their integer coordinates along each axis, so the points
+    more than 2^20 voxels away from the origin share the voxels at the border of the grid.
+
+    Args:
+        points: Batch of points.
+        voxel_size: Size of the voxels.
+        voxel_keys: Sorted keys of the voxels holding the points of the previous batches.
+
+    Returns:
+        Mask of the first point of every voxel not holding a previous point, and the updated sorted keys.
+    """
+    offset = 1 << 20
+    voxels = torch.floor(points / voxel_size).long().clamp(-offset, offset - 1) + offset
+    keys = (voxels[:, 0] << 42) | (voxels[:, 1] << 21) | voxels[:, 2]
+    unique_keys, inverse = torch.unique(keys, return_inverse=True)
+    point_indices = torch.arange(len(keys), device=keys.device)
+    first_points = torch.full_like(unique_keys, len(keys)).scatter_reduce(0, inverse, point_indices, reduce="amin")
+
+    # voxel_keys is sorted, so the voxels holding previous points are found by binary search
+    found = torch.searchsorted(voxel_keys, unique_keys).clamp(max=max(len(voxel_keys) - 1, 0))
+    is_new = torch.ones_like(unique_keys, dtype=torch.bool)
+    if len(voxel_keys) > 0:
+        is_new = voxel_keys[found] != unique_keys
+    mask = torch.zeros_like(keys, dtype=torch.bool)
+    mask[first_points[is_new]] = True
+    voxel_keys = torch.sort(torch.cat([voxel_keys, unique_keys[is_new]])).values
+    return mask, voxel_keys
+
+
+def sample_point_cloud(
     pipeline: Pipeline,
     num_points: int = 1000000,
-    remove_outliers: bool = True,
-    estimate_normals: bool = False,
     rgb_output_name: str = "rgb",
     depth_output_name: str = "depth",
     normal_output_name: Optional[str] = None,
+    accumulation_output_name: str = "accumulation",
+    min_accumulation: float = 0.5,
+    voxel_size: Optional[float] = None,
     use_bounding_box: bool = True,
     bounding_box_min: Tuple[float, float, float] = (-1.0, -1.0, -1.0),
     bounding_box_max: Tuple[float, float, float] = (1.0, 1.0, 1.0),
-    std_ratio: float = 10.0,
-) -> o3d.geometry.PointCloud:
-    """Generate a point cloud from a nerf.
+    num_rays_per_batch: int = 32768,
+) -> Iterator[Tuple[TensorType["num_points", 3], TensorType["num_points", 3], Optional[TensorType["num_points", 3]]]]:
+    """Samples points on the surfaces of a nerf by rendering the depth of rays of the training cameras.
+
+    Every training image is split into cells, sized so that one ray per cell adds up to about num_points rays. The
+    cells are sampled in passes, each rendering one randomly placed ray in every cell, so that the rays of a pass
+    cover all the images evenly. A cell whose ray has an accumulation below min_accumulation, i.e. that looks at
+    the background, is not sampled in the next passes. If voxel_size is set, a single point is kept per voxel, so
+    that the density of the point cloud does not depend on how many cameras see a region. The sampling ends when
+    num_points points are found, or when a pass finds new points for less than 1% of its rays.
 
     Args:
         pipeline: Pipeline to evaluate with.
-        num_points: Number of points to generate. May result in less if outlier removal is used.
-        remove_outliers: Whether to remove outliers.
-        estimate_normals: Whether to estimate normals.
+        num_points: Number of points to generate.
         rgb_output_name: Name of the RGB output.
         depth_output_name: Name of the depth output.
         normal_output_name: Name of the normal output.
+        accumulation_output_name: Name of the accumulation output. No ray is discarded if the model lacks it.
+        min_accumulation: Smallest accumulation of a ray whose point is kept.
+        voxel_size: Size of the voxels holding a single point. Every point is kept if None.
         use_bounding_box: Whether to use a bounding box to sample points.
         bounding_box_min: Minimum of the bounding box.
         bounding_box_max: Maximum of the bounding box.
-        std_ratio: Threshold based on STD of the average distances across the point cloud to remove outliers.
+        num_rays_per_batch: Number of rays rendered at once.
 
-    Returns:
-        Point cloud.
+    Yields:
+        Batches of points, with their colors and their normals if normal_output_name is set.
     """
 
     # pylint: disable=too-many-statements
 
+    device = pipeline.device
+    if use_bounding_box:
+        comp_l = torch.tensor(bounding_box_min, device=device)
+        comp_m = torch.tensor(bounding_box_max, device=device)
+        assert torch.all(
+            comp_l < comp_m
+        ), f"Bounding box min {bounding_box_min} must be smaller than max {bounding_box_max}"
+
+    # split the training images into cells
+    cameras = pipeline.datamanager.train_dataset.cameras.to(device)
+    image_sizes = torch.cat([cameras.height, cameras.width], dim=-1).long()  # [num_cameras, 2]
+    num_pixels = int(torch.prod(image_sizes, dim=-1).sum())
+    cell_size = max(int(math.sqrt(num_pixels / num_points)), 1)
+    num_cells_per_side = torch.div(image_sizes + cell_size - 1, cell_size, rounding_mode="floor")
+    num_cells = torch.prod(num_cells_per_side, dim=-1)
+    cell_cameras = torch.repeat_interleave(torch.arange(len(num_cells), device=device), num_cells)
+    cell_offsets = torch.arange(len(cell_cameras), device=device) - torch.repeat_interleave(
+        torch.cumsum(num_cells, dim=0) - num_cells, num_cells
+    )
+    cells_w = num_cells_per_side[cell_cameras, 1]
+    cell_origins = (
+        torch.stack([torch.div(cell_offsets, cells_w, rounding_mode="floor"), cell_offsets % cells_w], dim=-1)
+        * cell_size
+    )
+    cell_extents = torch.clamp(image_sizes[cell_cameras] - cell_origins, max=cell_size)
+
     progress = Progress(
         TextColumn(":cloud: Computing Point Cloud :cloud:"),
         BarColumn(),
         TaskProgressColumn(show_speed=True),
         TimeRemainingColumn(elapsed_when_finished=True, compact=True),
     )
-    points = []
-    rgbs = []
-    normals = []
+    voxel_keys = torch.zeros((0,), dtype=torch.long, device=device)
+    active_cells = torch.arange(len(cell_cameras), device=device)
+    num_generated = 0
     with progress as progress_bar:
         task = progress_bar.add_task("Generating Point Cloud", total=num_points)
-        while not progress_bar.finished:
-            with torch.no_grad():
-                ray_bundle, _ = pipeline.datamanager.next_train(0)
-                outputs = pipeline.model(ray_bundle)
-            if rgb_output_name not in outputs:
-                CONSOLE.rule("Error", style="red")
-                CONSOLE.print(f"Could not find {rgb_output_name} in the model outputs", justify="center")
-                CONSOLE.print(f"Please set --rgb_output_name to one of: {outputs.keys()}", justify="center")
-                sys.exit(1)
-            if depth_output_name not in outputs:
-                CONSOLE.rule("Error", style="red")
-                CONSOLE.print(f"Could not find {depth_output_name} in the model outputs", justify="center")
-                CONSOLE.print(f"Please set --depth_output_name to one of: {outputs.keys()}", justify="center")
-                sys.exit(1)
-            rgb = outputs[rgb_output_name]
-            depth = outputs[depth_output_name]
-            if normal_output_name is not None:
-                if normal_output_name not in outputs:
+        while num_generated < num_points and len(active_cells) > 0:
+            active_cells = active_cells[torch.randperm(len(active_cells), device=device)]
+            covered_cells = torch.ones_like(active_cells, dtype=torch.bool)
+            num_generated_in_pass = 0
+            for start in range(0, len(active_cells), num_rays_per_batch):
+                cells = active_cells[start : start + num_rays_per_batch]
+                coords = cell_origins[cells] + torch.rand((len(cells), 2), device=device) * cell_extents[cells]
+                ray_bundle = cameras.generate_rays(camera_indices=cell_cameras[cells, None], coords=coords)
+                with torch.no_grad():
+                    outputs = pipeline.model(ray_bundle)
+                if rgb_output_name not in outputs:
                     CONSOLE.rule("Error", style="red")
-                    CONSOLE.print(f"Could not find {normal_output_name} in the model outputs", justify="center")
-                    CONSOLE.print(f"Please set --normal_output_name to one of: {outputs.keys()}", justify="center")
+                    CONSOLE.print(f"Could not find {rgb_output_name} in the model outputs", justify="center")
+                    CONSOLE.print(f"Please set --rgb_output_name to one of: {outputs.keys()}", justify="center")
                     sys.exit(1)
-                normal = outputs[normal_output_name]
-            point = ray_bundle.origins + ray_bundle.directions * depth
-
-            if use_bounding_box:
-                comp_l = torch.tensor(bounding_box_min, device=point.device)
-                comp_m = torch.tensor(bounding_box_max, device=point.device)
-                assert torch.all(
-                    comp_l < comp_m
-                ), f"Bounding box min {bounding_box_min} must be smaller than max {bounding_box_max}"
-                mask = torch.all(torch.concat([point > comp_l, point < comp_m], dim=-1), dim=-1)
-                point = point[mask]
-                rgb = rgb[mask]
+                if depth_output_name not in outputs:
+                    CONSOLE.rule("Error", style="red")
+                    CONSOLE.print(f"Could not find {depth_output_name} in the model outputs", justify="center")
+                    CONSOLE.print(f"Please set --depth_output_name to one of: {outputs.keys()}", justify="center")
+                    sys.exit(1)
+                rgb = outputs[rgb_output_name]
+                depth = outputs[depth_output_name]
+                normal = None
                 if normal_output_name is not None:
-                    normal = normal[mask]
+                    if normal_output_name not in outputs:
+                        CONSOLE.rule("Error", style="red")
+                        CONSOLE.print(f"Could not find {normal_output_name} in the model outputs", justify="center")
+                        CONSOLE.print(f"Please set --normal_output_name to one of: {outputs.keys()}", justify="center")
+                        sys.exit(1)
+                    normal = outputs[normal_output_name]
+                point = ray_bundle.origins + ray_bundle.directions * depth
+
+                mask = torch.ones_like(depth[:, 0], dtype=torch.bool)
+                if accumulation_output_name in outputs:
+                    mask = outputs[accumulation_output_name][:, 0] >= min_accumulation
+                    covered_cells[start : start + num_rays_per_batch] = mask
+                if use_bounding_box:
+                    mask &= torch.all(torch.concat([point > comp_l, point < comp_m], dim=-1), dim=-1)
+                if voxel_size is not None:
+                    new_voxels, voxel_keys = deduplicate_voxels(point[mask], voxel_size, voxel_keys)
+                    mask[mask.clone()] = new_voxels
+                # drop the points past num_points
+                mask &= torch.cumsum(mask, dim=0) <= num_points - num_generated
+
+                num_new_points = int(mask.sum())
+                num_generated += num_new_points
+                num_generated_in_pass += num_new_points
+                progress.advance(task, num_new_points)
+                if num_new_points > 0:
+                    yield point[mask], rgb[mask], normal[mask] if normal is not None else None
+                if num_generated >= num_points:
+                    break
+
+            # once the voxels are nearly all filled, the passes are not worth their rays anymore
+            if num_generated_in_pass < 0.01 * len(active_cells):
+                break
+            active_cells = active_cells[covered_cells]
+
+    if num_generated < num_points:
+        CONSOLE.print(
+            f"[bold yellow]Only found {num_generated} of {num_points} points, "
+            "as the surfaces seen by the cameras are already covered by points"
+        )
+
+
+def generate_point_cloud(
+    pipeline: Pipeline,
+    num_points: int = 1000000,
+    remove_outliers: bool = True,
+    estimate_normals: bool = False,
+    rgb_output_name: str = "rgb",
+    depth_output_name: str = "depth",
+    normal_output_name: Optional[str] = None,
+    use_bounding_box: bool = True,
+    bounding_box_min: Tuple[float, float, float] = (-1.0, -1.0, -1.0),
+    bounding_box_max: Tuple[float, float, float] = (1.0, 1.0, 1.0),
+    std_ratio: float = 10.0,
+    accumulation_output_name: str = "accumulation",
+    min_accumulation: float = 0.5,
+    voxel_size: Optional[float] = None,
+    num_rays_per_batch: int = 32768,
+) -> o3d.geometry.PointCloud:
+    """Generate a point cloud from a nerf.
+
+    The points are sampled by sample_point_cloud.
 
-            points.append(point)
-            rgbs.append(rgb)
-            if normal_output_name is not None:
-                normals.append(normal)
-            progress.advance(task, point.shape[0])
+    Args:
+        pipeline: Pipeline to evaluate with.
+        num_points: Number of points to generate. May result in less if outlier removal is used.
+        remove_outliers: Whether to remove outliers.
+        estimate_normals: Whether to estimate normals.
+        rgb_output_name: Name of the RGB output.
+        depth_output_name: Name of the depth output.
+        normal_output_name: Name of the normal output.
+        use_bounding_box: Whether to use a bounding box to sample points.
+        bounding_box_min: Minimum of the bounding box.
+        bounding_box_max: Maximum of the bounding box.
+        std_ratio: Threshold based on STD of the average distances across the point cloud to remove outliers.
+        accumulation_output_name: Name of the accumulation output.
+        min_accumulation: Smallest accumulation of a ray whose point is kept.
+        voxel_size: Size of the voxels holding a single point. Every point is kept if None.
+        num_rays_per_batch: Number of rays rendered at once.
+
+    Returns:
+        Point cloud.
+    """
+    points = []
+    rgbs = []
+    normals = []
+    for point, rgb, normal in sample_point_cloud(
+        pipeline,
+        num_points=num_points,
+        rgb_output_name=rgb_output_name,
+        depth_output_name=depth_output_name,
+        normal_output_name=normal_output_name,
+        accumulation_output_name=accumulation_output_name,
+        min_accumulation=min_accumulation,
+        voxel_size=voxel_size,
+        use_bounding_box=use_bounding_box,
+        bounding_box_min=bounding_box_min,
+        bounding_box_max=bounding_box_max,
+        num_rays_per_batch=num_rays_per_batch,
+    ):
+        points.append(point)
+        rgbs.append(rgb)
+        if normal is not None:
+            normals.append(normal)
     points = torch.cat(points, dim=0)
     rgbs = torch.cat(rgbs, dim=0)
 
@@ -203,15 +359,73 @@ def generate_point_cloud(
     return pcd
 
 
-def render_trajectory(
+def _get_point_cloud_ply_header(has_normals: bool, num_points: int = 0) -> bytes:
+    """Returns the header of a binary PLY point cloud, with a fixed width number of points."""
+    properties = ["x", "y", "z"] + (["nx", "ny", "nz"] if has_normals else [])
+    header = [
+        "ply",
+        "format binary_little_endian 1.0",
+        "comment Generated with nerfstudio",
+        f"element vertex {num_points:010d}",
+        *[f"property float {name}" for name in properties],
+        "property uchar red",
+        "property uchar green",
+        "property uchar blue",
+        "end_header",
+    ]
+    return "".join(line + "\n" for line in header).encode("ascii")
+
+
+def write_point_cloud_ply(
+    filename: Union[str, Path],
+    point_batches: Iterable[
+        Tuple[TensorType["num_points", 3], TensorType["num_points", 3], Optional[TensorType["num_points", 3]]]
+    ],
+) -> int:
+    """Writes batches of points to a binary PLY file as they come, without holding the point cloud in memory.
+
+    Args:
+        filename: The PLY file to write.
+        point_batches: Batches of points, with their colors in [0, 1] and optionally their normals.
+
+    Returns:
+        The number of points written.
+    """
+    num_points = 0
+    has_normals = None
+    with open(filename, "wb") as file:
+        for points, rgbs, normals in point_batches:
+            if has_normals is None:
+                has_normals = normals is not None
+                file.write(_get_point_cloud_ply_header(has_normals))
+            data = np.empty(
+                len(points),
+                dtype=[("position", "<f4", 3)] + [("normal", "<f4", 3)] * has_normals + [("color", "u1", 3)],
+            )
+            data["position"] = points.float().cpu().numpy()
+            if has_normals:
+                data["normal"] = normals.float().cpu().numpy()
+            data["color"] = torch.round(rgbs.clamp(0, 1) * 255).byte().cpu().numpy()
+            file.write(data.tobytes())
+            num_points += len(points)
+
+        # the number of points is only known once they are all written
+        file.seek(0)
+        file.write(_get_point_cloud_ply_header(bool(has_normals), num_points))
+    return num_points
+
+
+def render_trajectory_frames(
     pipeline: Pipeline,
     cameras: Cameras,
     rgb_output_name: str,
     depth_output_name: str,
     rendered_resolution_scaling_factor: float = 1.0,
     disable_distortion: bool = False,
-) -> Tuple[List[np.ndarray], List[np.ndarray]]:
-    """Helper function to create a video of a trajectory.
+) -> Iterator[Tuple[int, TensorType["height", "width", 3], TensorType["height", "width", 1]]]:
+    """Renders the rgb and depth images of a trajectory one camera at a time.
+
+    The images are left on the device of the pipeline, and only the frames the caller keeps stay in memory.
 
     Args:
         pipeline: Pipeline to evaluate with.
@@ -221,11 +435,9 @@ def render_trajectory(
         rendered_resolution_scaling_factor: Scaling factor to apply to the camera image resolution.
         disable_distortion: Whether to disable distortion.
 
-    Returns:
-        List of rgb images, list of depth images.
+    Yields:
+        Index of the camera, rgb image, depth image.
     """
-    images = []
-    depths = []
     cameras.rescale_output_resolution(rendered_resolution_scaling_factor)
 
     progress = Progress(
@@ -252,6 +464,40 @@ def render_trajectory(
                 CONSOLE.print(f"Could not find {depth_output_name} in the model outputs", justify="center")
                 CONSOLE.print(f"Please set --depth_output_name to one of: {outputs.keys()}", justify="center")
                 sys.exit(1)
-            images.append(outputs[rgb_output_name].cpu().numpy())
-            depths.append(outputs[depth_output_name].cpu().numpy())
+            yield camera_idx, outputs[rgb_output_name], outputs[depth_output_name]
+
+
+def render_trajectory(
+    pipeline: Pipeline,
+    cameras: Cameras,
+    rgb_output_name: str,
+    depth_output_name: str,
+    rendered_resolution_scaling_factor: float = 1.0,
+    disable_distortion: bool = False,
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Helper function to create a video of a trajectory.
+
+    Args:
+        pipeline: Pipeline to evaluate with.
+        cameras: Cameras to render.
+        rgb_output_name: Name of the RGB output.
+        depth_output_name: Name of the depth output.
+        rendered_resolution_scaling_factor: Scaling factor to apply to the camera image resolution.
+        disable_distortion: Whether to disable distortion.
+
+    Returns:
+        List of rgb images, list of depth images.
+    """
+    images = []
+    depths = []
+    for _, image, depth in render_trajectory_frames(
+        pipeline,
+        cameras,
+        rgb_output_name,
+        depth_output_name,
+        rendered_resolution_scaling_factor=rendered_resolution_scaling_factor,
+        disable_distortion=disable_distortion,
+    ):
+        images.append(image.cpu().numpy())
+        depths.append(depth.cpu().numpy())
     return images, depths
@@ -0,0 +1,312 @@
+# Copyright 2022 The Nerfstudio Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Marching cubes on sparse grids, and mesh extraction from density fields.
+"""
+
+# pylint: disable=no-member
+
+from __future__ import annotations
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import torch
+from rich.console import Console
+from skimage import measure
+from torchtyping import TensorType
+
+from nerfstudio.exporter.exporter_utils import Mesh
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+
+CONSOLE = Console(width=120)
+
+CELL_CORNERS = list(itertools.product((0, 1), repeat=3))
+
+
+class BlockMarchingCubes:
+    """Runs marching cubes on the blocks of a sparse grid, and stitches the surfaces of neighbouring blocks.
+
+    Every block holds the values at the corners of block_size^3 cells, which is block_size + 1 corners along each axis
+    as the blocks are padded with the first corners of the following blocks. The blocks passed at once are stacked
+    along the first axis and meshed by a single call to marching cubes, after which the faces of the cells straddling
+    two stacked blocks are dropped. The vertices shared by neighbouring blocks are merged when the mesh is assembled.
+
+    Args:
+        block_size: Number of cells of a block along each axis.
+        level: Iso-level of the surface.
+    """
+
+    def __init__(self, block_size: int = 8, level: float = 0.0) -> None:
+        self.block_size = block_size
+        self.level = level
+        self.device = torch.device("cpu")
+        self._vertex_keys: List[torch.Tensor] = []
+        self._vertex_coords: List[torch.Tensor] = []
+        self._vertex_normals: List[torch.Tensor] = []
+        self._vertex_colors: List[torch.Tensor] = []
+        self._faces: List[torch.Tensor] = []
+        self._num_vertices = 0
+
+    def add_blocks(
+        self,
+        values: TensorType["num_blocks", "padded_size", "padded_size", "padded_size"],
+        block_origins: TensorType["num_blocks", 3],
+        valid_corners: Optional[TensorType["num_blocks", "padded_size", "padded_size", "padded_size"]] = None,
+        colors: Optional[TensorType["num_blocks", "padded_size", "padded_size", "padded_size", 3]] = None,
+    ) -> None:
+        """Meshes a chunk of blocks.
+
+        Args:
+            values: Values at the corners of the cells of the padded blocks.
+            block_origins: Grid coordinates of the first corner of the blocks.
+            valid_corners: Whether the value at each corner is known. Only the cells whose corners are all known are
+                meshed. All values are known if None.
+            colors: Colors at the corners of the cells of the padded blocks, given to the closest vertices.
+        """
+        block_size = self.block_size
+        padded_size = block_size + 1
+        self.device = values.device
+        if valid_corners is None:
+            valid_corners = torch.ones_like(values, dtype=torch.bool)
+
+        # a cell is meshed if all of its corners are known
+        valid_cells = torch.ones_like(valid_corners[:, :-1, :-1, :-1])
+        for x, y, z in CELL_CORNERS:
+            valid_cells &= valid_corners[:, x : x + block_size, y : y + block_size, z : z + block_size]
+        has_surface = torch.any(valid_cells.flatten(1), dim=-1)
+        has_surface &= torch.any((valid_corners & (values > self.level)).flatten(1), dim=-1)
+        has_surface &= torch.any((valid_corners & (values < self.level)).flatten(1), dim=-1)
+        if not torch.any(has_surface):
+            return
+        values, block_origins, valid_cells = values[has_surface], block_origins[has_surface], valid_cells[has_surface]
+        values = torch.where(valid_corners[has_surface], values, torch.full_like(values, self.level + 1.0))
+
+        # run marching cubes on CPU, with the blocks stacked along the first axis
+        vertices, faces, normals, _ = measure.marching_cubes(
+            values.view(-1, padded_size, padded_size).cpu().numpy(), level=self.level, allow_degenerate=False
+        )
+        vertices = torch.from_numpy(vertices.astype(np.float64)).to(self.device)
+        faces = torch.from_numpy(faces.astype(np.int64)).to(self.device)
+        normals = torch.from_numpy(normals.copy()).to(self.device)
+
+        # drop the cells between stacked blocks and the cells with unknown corners
+        cells = torch.floor(torch.mean(vertices[faces], dim=1)).long()
+        face_blocks = torch.div(cells[:, 0], padded_size, rounding_mode="floor")
+        cells[:, 0] -= face_blocks * padded_size
+        valid_faces = torch.all(cells < block_size, dim=-1)
+        cells = cells.clamp(max=block_size - 1)
+        valid_faces &= valid_cells[face_blocks, cells[:, 0], cells[:, 1], cells[:, 2]]
+        used_vertices, faces = torch.unique(faces[valid_faces], return_inverse=True)
+        vertices, normals = vertices[used_vertices], normals[used_vertices]
+        vertex_blocks = torch.div(vertices[:, 0], padded_size, rounding_mode="floor").long()
+        vertices[:, 0] -= vertex_blocks * padded_size
+
+        # every vertex lies on the edge between two corners, or on a corner, which identifies it across blocks
+        rounded_vertices = torch.round(vertices)
+        on_corner = torch.abs(vertices - rounded_vertices) < 1e-3
+        lower_corners = torch.where(on_corner, rounded_vertices, torch.floor(vertices)).long()
+        edge_axes = torch.argmin(on_corner.long(), dim=-1)
+        edge_axes[torch.all(on_corner, dim=-1)] = 3
+        vertex_origins = block_origins[vertex_blocks]
+        self._vertex_keys.append(torch.cat([vertex_origins + lower_corners, edge_axes[:, None]], dim=-1))
+        self._vertex_coords.append(vertex_origins + vertices)
+        self._vertex_normals.append(normals)
+        if colors is not None:
+            color_corners = rounded_vertices.long()
+            self._vertex_colors.append(
+                colors[has_surface][vertex_blocks, color_corners[:, 0], color_corners[:, 1], color_corners[:, 2]]
+            )
+        self._faces.append(faces + self._num_vertices)
+        self._num_vertices += len(vertices)
+
+    def get_mesh(
+        self,
+    ) -> Tuple[
+        TensorType["num_verts", 3],
+        TensorType["num_faces", 3],
+        TensorType["num_verts", 3],
+        Optional[TensorType["num_verts", 3]],
+    ]:
+        """Returns the vertices in grid coordinates, the faces, the normals and the colors of the stitched mesh."""
+        if not self._faces:
+            empty = torch.zeros((0, 3), device=self.device)
+            return empty, empty.long(), empty, None
+
+        # merge the vertices shared by neighbouring blocks
+        vertex_keys, vertex_ids = torch.unique(torch.cat(self._vertex_keys), dim=0, return_inverse=True)
+        num_vertices = len(vertex_keys)
+        counts = torch.bincount(vertex_ids, minlength=num_vertices)[:, None]
+        vertices = torch.zeros((num_vertices, 3), dtype=torch.float64, device=self.device)
+        vertices = vertices.index_add_(0, vertex_ids, torch.cat(self._vertex_coords)) / counts
+        normals = torch.zeros((num_vertices, 3), device=self.device)
+        normals = normals.index_add_(0, vertex_ids, torch.cat(self._vertex_normals))
+        normals = normals / torch.linalg.norm(normals, dim=-1, keepdim=True).clamp(min=1e-8)
+        colors = None
+        if self._vertex_colors:
+            colors = torch.zeros((num_vertices, 3), device=self.device)
+            colors = colors.index_add_(0, vertex_ids, torch.cat(self._vertex_colors)) / counts
+
+        # faces on corners with a value of exactly the level collapse once their vertices are merged
+        faces = vertex_ids[torch.cat(self._faces)]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+        return vertices.float(), faces, normals, colors
+
+
+def evaluate_density(
+    density_fn: Callable[[TensorType["bs":..., 3]], TensorType["bs":..., 1]],
+    positions: TensorType["num_points", 3],
+    num_points_per_chunk: int = 1 << 18,
+    num_cpu_workers: int = 1,
+) -> TensorType["num_points"]:
+    """Evaluates a density function in chunks.
+
+    On the CPU the chunks can be spread over a pool of threads, between which the torch threads are split evenly.
+
+    Args:
+        density_fn: Function returning the density at world positions.
+        positions: World positions to evaluate the density at.
+        num_points_per_chunk: Number of positions evaluated at once.
+        num_cpu_workers: Number of chunks evaluated in parallel on the CPU.
+    """
+
+    def evaluate_chunk(chunk: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return density_fn(chunk)[..., 0].float()
+
+    chunks = torch.split(positions, num_points_per_chunk)
+    if positions.device.type != "cpu" or num_cpu_workers <= 1:
+        return torch.cat([evaluate_chunk(chunk) for chunk in chunks])
+    num_threads = torch.get_num_threads()
+    try:
+        with ThreadPoolExecutor(
+            max_workers=num_cpu_workers,
+            initializer=torch.set_num_threads,
+            initargs=(max(num_threads // num_cpu_workers, 1),),
+        ) as executor:
+            return torch.cat(list(executor.map(evaluate_chunk, chunks)))
+    finally:
+        # The thread count is process wide with some parallel backends
+        torch.set_num_threads(num_threads)
+
+
+def generate_mesh_from_density(
+    density_fn: Callable[[TensorType["bs":..., 3]], TensorType["bs":..., 1]],
+    aabb: TensorType[2, 3],
+    spatial_distortion: Optional[SceneContraction] = None,
+    isosurface_threshold: float = 10.0,
+    resolution: int = 64,
+    num_refinement_levels: int = 3,
+    block_size: int = 8,
+    num_points_per_chunk: int = 1 << 18,
+    num_cpu_workers: int = 1,
+) -> Mesh:
+    """Extracts the surface where a density field reaches a threshold, refining the grid only near the surface.
+
+    The density is first evaluated at the corners of a coarse grid. The cells whose corners lie on both sides of the
+    threshold, and their neighbours, are then split in eight, and the density is evaluated at the corners of the new
+    cells, num_refinement_levels times. Marching cubes finally runs on the blocks of the finest cells. Features that
+    do not straddle the corners of any coarse cell are missed, so the coarse grid should resolve the smallest parts
+    of the scene.
+
+    Args:
+        density_fn: Function returning the density at world positions.
+        aabb: Bounds of the grid. Unused if spatial_distortion is set.
+        spatial_distortion: Scene contraction of the density field. The grid spans the contracted space if set.
+        isosurface_threshold: Density of the surface.
+        resolution: Number of cells of the coarse grid along each axis.
+        num_refinement_levels: Number of times the cells near the surface are split.
+        block_size: Number of cells of the blocks passed to marching cubes along each axis.
+        num_points_per_chunk: Number of positions the density is evaluated at at once.
+        num_cpu_workers: Number of chunks evaluated in parallel on the CPU.
+
+    Returns:
+        The mesh, with vertices in world coordinates.
+    """
+    device = aabb.device
+
+    def get_world_positions(grid_positions: TensorType["bs":..., 3]) -> TensorType["bs":..., 3]:
+        """Maps positions in the [0, 1] coordinates of the grid to world positions."""
+        if spatial_distortion is not None:
+            return spatial_distortion.inverse(grid_positions * 4.0 - 2.0)
+        return aabb[0] + grid_positions * (aabb[1] - aabb[0])
+
+    corner_offsets = torch.tensor(CELL_CORNERS, device=device)
+    neighbour_offsets = torch.tensor(list(itertools.product((-1, 0, 1), repeat=3)), device=device)
+    cells = torch.stack(torch.meshgrid([torch.arange(resolution, device=device)] * 3, indexing="ij"), dim=-1)
+    cells = cells.view(-1, 3)
+    num_evaluated = 0
+    for level in range(num_refinement_levels + 1):
+        # evaluate the signed distance to the threshold, positive outside, at the corners of the cells
+        corners = (cells[:, None, :] + corner_offsets).view(-1, 3)
+        corners, cell_corners = torch.unique(corners, dim=0, return_inverse=True)
+        densities = evaluate_density(
+            density_fn,
+            get_world_positions(corners / resolution),
+            num_points_per_chunk=num_points_per_chunk,
+            num_cpu_workers=num_cpu_workers,
+        )
+        corner_values = isosurface_threshold - densities
+        num_evaluated += len(corners)
+        CONSOLE.print(f"Level {level}: evaluated the density at {len(corners)} corners of {len(cells)} cells")
+        if level == num_refinement_levels:
+            break
+
+        # split the cells on the surface and their neighbours
+        cell_values = corner_values[cell_corners.view(-1, 8)]
+        on_surface = torch.any(cell_values > 0, dim=-1) & torch.any(cell_values <= 0, dim=-1)
+        cells = (cells[on_surface][:, None, :] + neighbour_offsets).view(-1, 3)
+        cells = torch.unique(cells[torch.all((cells >= 0) & (cells < resolution), dim=-1)], dim=0)
+        cells = (cells[:, None, :] * 2 + corner_offsets).view(-1, 3)
+        resolution *= 2
+
+    num_dense = (resolution + 1) ** 3
+    CONSOLE.print(f"Evaluated the density at {num_evaluated} points, {num_evaluated / num_dense:.2%} of a dense grid")
+
+    # gather the padded blocks of the finest cells and mesh them
+    num_corners_per_axis = resolution + 1
+    corner_keys = (corners[:, 0] * num_corners_per_axis + corners[:, 1]) * num_corners_per_axis + corners[:, 2]
+    blocks = torch.unique(torch.div(cells, block_size, rounding_mode="floor"), dim=0)
+    local_corners = torch.arange(block_size + 1, device=device)
+    local_corners = torch.stack(torch.meshgrid([local_corners] * 3, indexing="ij"), dim=-1)
+    marching_cubes = BlockMarchingCubes(block_size=block_size)
+    num_blocks_per_chunk = 256
+    for start in range(0, len(blocks), num_blocks_per_chunk):
+        block_origins = blocks[start : start + num_blocks_per_chunk] * block_size
+        block_corners = block_origins[:, None, None, None, :] + local_corners
+        block_corner_keys = (
+            block_corners[..., 0] * num_corners_per_axis + block_corners[..., 1]
+        ) * num_corners_per_axis + block_corners[..., 2]
+        # corner_keys are sorted, as torch.unique sorts the corners
+        corner_indices = torch.searchsorted(corner_keys, block_corner_keys).clamp(max=len(corner_keys) - 1)
+        marching_cubes.add_blocks(
+            corner_values[corner_indices],
+            block_origins,
+            valid_corners=corner_keys[corner_indices] == block_corner_keys,
+        )
+    vertices, faces, _, _ = marching_cubes.get_mesh()
+    vertices = get_world_positions(vertices / resolution)
+
+    # the normals are computed in world space, as the grid may be contracted
+    triangles = vertices[faces]
+    face_normals = torch.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0], dim=-1)
+    normals = torch.zeros_like(vertices)
+    for i in range(3):
+        normals.index_add_(0, faces[:, i], face_normals)
+    normals = normals / torch.linalg.norm(normals, dim=-1, keepdim=True).clamp(min=1e-8)
+
+    return Mesh(vertices=vertices, faces=faces, normals=normals)
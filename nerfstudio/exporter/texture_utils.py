@@ -20,9 +20,11 @@ Texture utils.
 
 from __future__ import annotations
 
+import json
 import math
+import struct
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import IO, Optional, Tuple
 
 import mediapy as media
 import numpy as np
@@ -35,7 +37,6 @@ from typing_extensions import Literal
 from nerfstudio.cameras.rays import RayBundle
 from nerfstudio.exporter.exporter_utils import Mesh
 from nerfstudio.pipelines.base_pipeline import Pipeline
-from nerfstudio.utils.rich_utils import get_progress
 
 CONSOLE = Console(width=120)
 
@@ -207,19 +208,113 @@ def unwrap_mesh_per_uv_triangle(
     return texture_coordinates, origins, directions
 
 
+def rasterize_uv_triangles(
+    texture_coordinates: TensorType["num_faces", 3, 2],
+    num_pixels_w: int,
+    num_pixels_h: int,
+    num_padding_pixels: int = 2,
+    num_pixels_per_chunk: int = 1 << 20,
+) -> Tuple[TensorType["num_pixels_h", "num_pixels_w"], TensorType["num_pixels_h", "num_pixels_w", 3]]:
+    """Finds the triangle covering every pixel of a texture image, and the barycentric coordinates of the pixel.
+
+    Every triangle is only tested against the pixels of its bounding box in the texture, grown by num_padding_pixels
+    so that the pixels just outside of the triangles, which bilinear interpolation reads, are assigned as well. A
+    pixel goes to the triangle it is closest to, measured by the sum of the absolute barycentric coordinates, which
+    is 1 within a triangle. The triangles are processed in chunks of at most num_pixels_per_chunk tested pixels, so
+    the time and memory grow with the area covered by the triangles rather than with the number of triangles times
+    the number of pixels. The pixels far from every triangle are assigned to the center of the first triangle.
+
+    Args:
+        texture_coordinates: Texture coordinates of the corners of every face, in [0, 1].
+        num_pixels_w: Width of the texture image.
+        num_pixels_h: Height of the texture image.
+        num_padding_pixels: Number of pixels by which the bounding boxes of the triangles are grown.
+        num_pixels_per_chunk: Number of pixels tested at once, summed over the triangles of a chunk.
+
+    Returns:
+        triangle_indices: Index of the triangle of every pixel.
+        barycentric_coordinates: Barycentric coordinates of the center of every pixel in its triangle.
+    """
+    device = texture_coordinates.device
+    num_faces = texture_coordinates.shape[0]
+    num_pixels = num_pixels_w * num_pixels_h
+    image_size = torch.tensor([num_pixels_w, num_pixels_h], device=device)
+
+    # bounding boxes of the triangles in pixels, whose centers are at integer coordinates
+    pixel_coordinates = texture_coordinates * image_size - 0.5
+    box_min = torch.floor(pixel_coordinates.min(dim=1).values - num_padding_pixels).long()
+    box_max = torch.ceil(pixel_coordinates.max(dim=1).values + num_padding_pixels).long()
+    box_min = torch.maximum(box_min, torch.zeros_like(box_min))
+    box_max = torch.minimum(box_max, image_size - 1)
+    box_size = (box_max - box_min + 1).clamp(min=0)
+    box_pixels = box_size[:, 0] * box_size[:, 1]
+    box_pixels_end = torch.cumsum(box_pixels, dim=0)
+
+    best_distances = torch.full((num_pixels,), torch.finfo(torch.float32).max, device=device)
+    triangle_indices = torch.zeros((num_pixels,), dtype=torch.long, device=device)
+    barycentric_coordinates = torch.full((num_pixels, 3), 1.0 / 3.0, device=device)
+    pair_indices = torch.zeros((num_pixels,), dtype=torch.long, device=device)
+    start = 0
+    while start < num_faces:
+        # the chunk holds at least one triangle, however large
+        chunk_start_pixels = box_pixels_end[start] - box_pixels[start]
+        end = int(torch.searchsorted(box_pixels_end, chunk_start_pixels + num_pixels_per_chunk, right=True))
+        end = max(end, start + 1)
+
+        # pair every triangle of the chunk with the pixels of its bounding box
+        faces = torch.arange(start, end, device=device)
+        face_indices = torch.repeat_interleave(faces, box_pixels[start:end])
+        pixel_offsets = torch.arange(len(face_indices), device=device) - torch.repeat_interleave(
+            box_pixels_end[start:end] - box_pixels[start:end] - chunk_start_pixels, box_pixels[start:end]
+        )
+        box_width = box_size[face_indices, 0]
+        x = box_min[face_indices, 0] + pixel_offsets % box_width
+        y = box_min[face_indices, 1] + torch.div(pixel_offsets, box_width, rounding_mode="floor")
+        pixel_indices = y * num_pixels_w + x
+        p = (torch.stack([x, y], dim=-1) + 0.5) / image_size
+
+        # compute barycentric coordinates
+        v0 = texture_coordinates[face_indices, 0]
+        v1 = texture_coordinates[face_indices, 1]
+        v2 = texture_coordinates[face_indices, 2]
+        area = get_parallelogram_area(v2, v0, v1)  # 2x face area.
+        w0 = get_parallelogram_area(p, v1, v2) / area
+        w1 = get_parallelogram_area(p, v2, v0) / area
+        w2 = get_parallelogram_area(p, v0, v1) / area
+        distances = torch.abs(w0) + torch.abs(w1) + torch.abs(w2)
+
+        # keep the closest triangle of every pixel, if closer than those of the previous chunks
+        chunk_distances = best_distances.scatter_reduce(0, pixel_indices, distances, reduce="amin")
+        closer = (distances == chunk_distances[pixel_indices]) & (distances < best_distances[pixel_indices])
+        closer_pairs = torch.nonzero(closer)[:, 0]
+        closer_pixels = pixel_indices[closer_pairs]
+        # a pixel may be equally close to several triangles, of which one is picked consistently
+        pair_indices[closer_pixels] = closer_pairs
+        closer_pairs = pair_indices[closer_pixels]
+        triangle_indices[closer_pixels] = face_indices[closer_pairs]
+        barycentric_coordinates[closer_pixels] = torch.stack([w0, w1, w2], dim=-1)[closer_pairs]
+        best_distances = chunk_distances
+        start = end
+
+    return (
+        triangle_indices.view(num_pixels_h, num_pixels_w),
+        barycentric_coordinates.view(num_pixels_h, num_pixels_w, 3),
+    )
+
+
 def unwrap_mesh_with_xatlas(
     vertices: TensorType["num_verts", 3],
     faces: TensorType["num_faces", 3, torch.long],
     vertex_normals: TensorType["num_verts", 3],
     num_pixels_per_side=1024,
-    num_faces_per_barycentric_chunk=10,
+    num_padding_pixels=2,
 ) -> Tuple[
     TensorType["num_faces", 3, 2],
     TensorType["num_pixels", "num_pixels", 3],
     TensorType["num_pixels", "num_pixels", "num_pixels"],
 ]:
     """Unwrap a mesh using xatlas. We use xatlas to unwrap the mesh with UV coordinates.
-    Then we rasterize the mesh with a square pattern. We interpolate the XYZ and normal
+    Then we rasterize the mesh in the texture image. We interpolate the XYZ and normal
     values for every pixel in the texture image. We return the texture coordinates, the
     origins, and the directions for every pixel.
 
@@ -228,7 +323,7 @@ def unwrap_mesh_with_xatlas(
         faces: Tensor of mesh faces.
         vertex_normals: Tensor of mesh vertex normals.
         num_pixels_per_side: Number of pixels per side of the texture image. We use a square.
-        num_faces_per_barycentric_chunk: Number of faces to use for barycentric chunk computation.
+        num_padding_pixels: Number of pixels around the faces in the texture image that are also rendered.
 
     Returns:
         texture_coordinates: Tensor of texture coordinates for every face.
@@ -236,86 +331,29 @@ def unwrap_mesh_with_xatlas(
         directions: Tensor of directions for every pixel.
     """
 
-    # pylint: disable=unused-variable
-    # pylint: disable=too-many-statements
-
     device = vertices.device
 
     # unwrap the mesh
     vertices_np = vertices.cpu().numpy()
     faces_np = faces.cpu().numpy()
     vertex_normals_np = vertex_normals.cpu().cpu().numpy()
-    vmapping, indices, uvs = xatlas.parametrize(  # pylint: disable=c-extension-no-member
+    _, indices, uvs = xatlas.parametrize(  # pylint: disable=c-extension-no-member
         vertices_np, faces_np, vertex_normals_np
     )
 
-    # vertices texture coordinates
-    vertices_tc = torch.from_numpy(uvs.astype(np.float32)).to(device)
-
-    # render uv maps
-    vertices_tc = vertices_tc * 2.0 - 1.0  # uvs to range [-1, 1]
-    vertices_tc = torch.cat(
-        (vertices_tc, torch.zeros_like(vertices_tc[..., :1]), torch.ones_like(vertices_tc[..., :1])), dim=-1
-    )  # [num_verts, 4]
-
     texture_coordinates = torch.from_numpy(uvs[indices]).to(device)  # (num_faces, 3, 2)
 
     # Now find the triangle indices for every pixel and the barycentric coordinates
     # which can be used to interpolate the XYZ and normal values to then query with NeRF
-    uv_coords, _ = get_texture_image(num_pixels_per_side, num_pixels_per_side, device)
-    uv_coords_shape = uv_coords.shape
-    p = uv_coords.reshape(1, -1, 2)  # (1, N, 2)
-    num_vertices = p.shape[1]
-    num_faces = texture_coordinates.shape[0]
-    triangle_distances = torch.ones_like(p[..., 0]) * torch.finfo(torch.float32).max  # (1, N)
-    triangle_indices = torch.zeros_like(p[..., 0]).long()  # (1, N)
-    triangle_w0 = torch.zeros_like(p[..., 0])  # (1, N)
-    triangle_w1 = torch.zeros_like(p[..., 0])  # (1, N)
-    triangle_w2 = torch.zeros_like(p[..., 0])  # (1, N)
-    arange_list = torch.arange(num_vertices, device=device)
-    progress = get_progress("Chunking faces for rasterization")
-    with progress:
-        for i in progress.track(range(num_faces // num_faces_per_barycentric_chunk)):
-            s = i * num_faces_per_barycentric_chunk
-            e = min((i + 1) * num_faces_per_barycentric_chunk, num_faces)
-            v0 = texture_coordinates[s:e, 0:1, :]  # (F, 1, 2)
-            v1 = texture_coordinates[s:e, 1:2, :]  # (F, 1, 2)
-            v2 = texture_coordinates[s:e, 2:3, :]  # (F, 1, 2)
-            # NOTE: could try clockwise vs counter clockwise
-            area = get_parallelogram_area(v2, v0, v1)  # 2x face area.
-            w0 = get_parallelogram_area(p, v1, v2) / area  # (num_faces_per_barycentric_chunk, N)
-            w1 = get_parallelogram_area(p, v2, v0) / area
-            w2 = get_parallelogram_area(p, v0, v1) / area
-            # get distance from center of triangle
-            dist_to_center = torch.abs(w0) + torch.abs(w1) + torch.abs(w2)
-            d_values, d_indices = torch.min(dist_to_center, dim=0, keepdim=True)
-            d_indices_with_offset = d_indices + s  # add offset
-            condition = d_values < triangle_distances
-            triangle_distances = torch.where(condition, d_values, triangle_distances)
-            triangle_indices = torch.where(condition, d_indices_with_offset, triangle_indices)
-            w0_selected = w0[d_indices[0], arange_list].unsqueeze(0)  # (1, N)
-            w1_selected = w1[d_indices[0], arange_list].unsqueeze(0)  # (1, N)
-            w2_selected = w2[d_indices[0], arange_list].unsqueeze(0)  # (1, N)
-            triangle_w0 = torch.where(condition, w0_selected, triangle_w0)
-            triangle_w1 = torch.where(condition, w1_selected, triangle_w1)
-            triangle_w2 = torch.where(condition, w2_selected, triangle_w2)
-
-    nearby_vertices = vertices[faces[triangle_indices[0]]]  # (N, 3, 3)
-    nearby_normals = vertex_normals[faces[triangle_indices[0]]]  # (N, 3, 3)
+    triangle_indices, barycentric_coordinates = rasterize_uv_triangles(
+        texture_coordinates, num_pixels_per_side, num_pixels_per_side, num_padding_pixels=num_padding_pixels
+    )
 
-    origins = (
-        nearby_vertices[..., 0, :] * triangle_w0[0, :, None]
-        + nearby_vertices[..., 1, :] * triangle_w1[0, :, None]
-        + nearby_vertices[..., 2, :] * triangle_w2[0, :, None]
-    ).float()
-    directions = -(
-        nearby_normals[..., 0, :] * triangle_w0[0, :, None]
-        + nearby_normals[..., 1, :] * triangle_w1[0, :, None]
-        + nearby_normals[..., 2, :] * triangle_w2[0, :, None]
-    ).float()
+    nearby_vertices = vertices[faces[triangle_indices]]  # (num_pixels, num_pixels, 3, 3)
+    nearby_normals = vertex_normals[faces[triangle_indices]]  # (num_pixels, num_pixels, 3, 3)
 
-    origins = origins.reshape(uv_coords_shape[0], uv_coords_shape[1], 3)
-    directions = directions.reshape(uv_coords_shape[0], uv_coords_shape[1], 3)
+    origins = torch.sum(nearby_vertices * barycentric_coordinates[..., None], dim=-2).float()
+    directions = -torch.sum(nearby_normals * barycentric_coordinates[..., None], dim=-2).float()
 
     # normalize the direction vector to make it a unit vector
     directions = torch.nn.functional.normalize(directions, dim=-1)
@@ -323,6 +361,217 @@ def unwrap_mesh_with_xatlas(
     return texture_coordinates, origins, directions
 
 
+def _write_rows(file: IO[str], row_format: str, rows: np.ndarray, num_rows_per_chunk: int = 1 << 16) -> None:
+    """Writes every row of an array with the same format, formatting a whole chunk of rows at once.
+
+    Args:
+        file: The text file to write to.
+        row_format: The printf-style format of a row, with one conversion per column.
+        rows: The rows to write.
+        num_rows_per_chunk: The number of rows formatted at once.
+    """
+    for start in range(0, len(rows), num_rows_per_chunk):
+        chunk = rows[start : start + num_rows_per_chunk]
+        file.write((row_format * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def write_obj(
+    filename: Path,
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    texture_coordinates: np.ndarray,
+    vertex_normals: np.ndarray,
+    mtl_filename: str,
+) -> None:
+    """Writes a textured mesh to an OBJ file, and its material to an MTL file next to it.
+
+    Args:
+        filename: The OBJ file to write.
+        vertices: The vertices of the mesh, of shape (num_verts, 3).
+        faces: The faces of the mesh, of shape (num_faces, 3).
+        texture_coordinates: The texture coordinates of the corners of every face, of shape (num_faces, 3, 2).
+        vertex_normals: The vertex normals of the mesh, of shape (num_verts, 3).
+        mtl_filename: The name of the MTL file, which refers to a material_0.png texture image.
+    """
+    lines_mtl = [
+        "# Generated with nerfstudio",
+        "newmtl material_0",
+        "Ka 1.000 1.000 1.000",
+        "Kd 1.000 1.000 1.000",
+        "Ks 0.000 0.000 0.000",
+        "d 1.0",
+        "illum 2",
+        "Ns 1.00000000",
+        "map_Kd material_0.png",
+    ]
+    with open(filename.parent / mtl_filename, "w", encoding="utf-8") as file_mtl:
+        file_mtl.writelines(line + "\n" for line in lines_mtl)
+
+    # every corner of every face has its own texture coordinates, and shares the normal of its vertex
+    uvs = texture_coordinates.reshape(-1, 2).astype(np.float64)
+    uvs[:, 1] = 1.0 - uvs[:, 1]
+    vertex_indices = faces.astype(np.int64) + 1
+    uv_indices = np.arange(1, faces.size + 1, dtype=np.int64).reshape(-1, 3)
+    face_indices = np.stack([vertex_indices, uv_indices, vertex_indices], axis=-1).reshape(-1, 9)
+
+    with open(filename, "w", encoding="utf-8") as file_obj:
+        file_obj.write(f"# Generated with nerfstudio\nmtllib {mtl_filename}\nusemtl material_0\n")
+        _write_rows(file_obj, "v %.9g %.9g %.9g\n", vertices)
+        _write_rows(file_obj, "vt %.9g %.9g\n", uvs)
+        _write_rows(file_obj, "vn %.9g %.9g %.9g\n", vertex_normals)
+        _write_rows(file_obj, "f %d/%d/%d %d/%d/%d %d/%d/%d\n", face_indices)
+
+
+def write_ply(
+    filename: Path,
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    texture_coordinates: np.ndarray,
+    vertex_normals: np.ndarray,
+    texture_filename: str,
+) -> None:
+    """Writes a textured mesh to a binary PLY file.
+
+    The texture coordinates are stored per face corner, in a texcoord list property of the faces, and the texture
+    image is referenced by a TextureFile comment, as MeshLab does.
+
+    Args:
+        filename: The PLY file to write.
+        vertices: The vertices of the mesh, of shape (num_verts, 3).
+        faces: The faces of the mesh, of shape (num_faces, 3).
+        texture_coordinates: The texture coordinates of the corners of every face, of shape (num_faces, 3, 2).
+        vertex_normals: The vertex normals of the mesh, of shape (num_verts, 3).
+        texture_filename: The name of the texture image.
+    """
+    vertex_data = np.empty(len(vertices), dtype=[("position", "<f4", 3), ("normal", "<f4", 3)])
+    vertex_data["position"] = vertices
+    vertex_data["normal"] = vertex_normals
+    face_data = np.empty(
+        len(faces), dtype=[("num_vertices", "u1"), ("vertices", "<i4", 3), ("num_uvs", "u1"), ("uvs", "<f4", 6)]
+    )
+    face_data["num_vertices"] = 3
+    face_data["vertices"] = faces
+    face_data["num_uvs"] = 6
+    uvs = texture_coordinates.astype(np.float32)
+    uvs[..., 1] = 1.0 - uvs[..., 1]
+    face_data["uvs"] = uvs.reshape(-1, 6)
+
+    header = [
+        "ply",
+        "format binary_little_endian 1.0",
+        "comment Generated with nerfstudio",
+        f"comment TextureFile {texture_filename}",
+        f"element vertex {len(vertices)}",
+        "property float x",
+        "property float y",
+        "property float z",
+        "property float nx",
+        "property float ny",
+        "property float nz",
+        f"element face {len(faces)}",
+        "property list uchar int vertex_indices",
+        "property list uchar float texcoord",
+        "end_header",
+    ]
+    with open(filename, "wb") as file:
+        file.write("".join(line + "\n" for line in header).encode("ascii"))
+        file.write(vertex_data.tobytes())
+        file.write(face_data.tobytes())
+
+
+def write_glb(
+    filename: Path,
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    texture_coordinates: np.ndarray,
+    vertex_normals: np.ndarray,
+    texture_png: bytes,
+) -> None:
+    """Writes a textured mesh to a binary glTF file, with the texture image embedded.
+
+    glTF only has texture coordinates per vertex, so the vertices are split for every distinct texture coordinate
+    they have, i.e. along the seams of the UV unwrapping.
+
+    Args:
+        filename: The GLB file to write.
+        vertices: The vertices of the mesh, of shape (num_verts, 3).
+        faces: The faces of the mesh, of shape (num_faces, 3).
+        texture_coordinates: The texture coordinates of the corners of every face, of shape (num_faces, 3, 2).
+        vertex_normals: The vertex normals of the mesh, of shape (num_verts, 3).
+        texture_png: The texture image, encoded as PNG.
+    """
+    corners = np.empty(faces.size, dtype=[("vertex", "<i8"), ("uv", "<f4", 2)])
+    corners["vertex"] = faces.reshape(-1)
+    corners["uv"] = texture_coordinates.reshape(-1, 2)
+    # the corners are deduplicated as raw bytes, which is much faster than np.unique along an axis
+    _, first_corners, corner_indices = np.unique(
+        corners.view(np.dtype((np.void, corners.dtype.itemsize))), return_index=True, return_inverse=True
+    )
+    corners = corners[first_corners]
+    positions = vertices[corners["vertex"]].astype(np.float32)
+    buffers = [
+        positions,
+        vertex_normals[corners["vertex"]].astype(np.float32),
+        np.ascontiguousarray(corners["uv"]),
+        corner_indices.astype(np.uint32),
+        np.frombuffer(texture_png, dtype=np.uint8),
+    ]
+    targets = [34962, 34962, 34962, 34963, None]  # ARRAY_BUFFER and ELEMENT_ARRAY_BUFFER
+
+    # the buffer views are aligned to 4 bytes
+    buffer_views = []
+    binary_chunk = bytearray()
+    for data, target in zip(buffers, targets):
+        buffer_view = {"buffer": 0, "byteOffset": len(binary_chunk), "byteLength": data.nbytes}
+        if target is not None:
+            buffer_view["target"] = target
+        buffer_views.append(buffer_view)
+        binary_chunk += data.tobytes() + bytes(-data.nbytes % 4)
+
+    num_vertices = len(corners)
+    gltf = {
+        "asset": {"version": "2.0", "generator": "nerfstudio"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [
+            {"primitives": [{"attributes": {"POSITION": 0, "NORMAL": 1, "TEXCOORD_0": 2}, "indices": 3, "material": 0}]}
+        ],
+        "accessors": [
+            {
+                "bufferView": 0,
+                "componentType": 5126,
+                "count": num_vertices,
+                "type": "VEC3",
+                "min": positions.min(axis=0).tolist() if num_vertices else [0.0] * 3,
+                "max": positions.max(axis=0).tolist() if num_vertices else [0.0] * 3,
+            },
+            {"bufferView": 1, "componentType": 5126, "count": num_vertices, "type": "VEC3"},
+            {"bufferView": 2, "componentType": 5126, "count": num_vertices, "type": "VEC2"},
+            {"bufferView": 3, "componentType": 5125, "count": faces.size, "type": "SCALAR"},
+        ],
+        "bufferViews": buffer_views,
+        "buffers": [{"byteLength": len(binary_chunk)}],
+        "materials": [
+            {
+                "name": "material_0",
+                "pbrMetallicRoughness": {"baseColorTexture": {"index": 0}, "metallicFactor": 0.0},
+            }
+        ],
+        "textures": [{"source": 0}],
+        "images": [{"bufferView": 4, "mimeType": "image/png"}],
+    }
+    json_chunk = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+
+    with open(filename, "wb") as file:
+        file.write(struct.pack("<4sII", b"glTF", 2, 12 + 8 + len(json_chunk) + 8 + len(binary_chunk)))
+        file.write(struct.pack("<I4s", len(json_chunk), b"JSON"))
+        file.write(json_chunk)
+        file.write(struct.pack("<I4s", len(binary_chunk), b"BIN\x00"))
+        file.write(binary_chunk)
+
+
 def export_textured_mesh(
     mesh: Mesh,
     pipeline: Pipeline,
@@ -331,9 +580,10 @@ def export_textured_mesh(
     unwrap_method: Literal["xatlas", "custom"] = "xatlas",
     raylen_method: Literal["edge", "none"] = "edge",
     num_pixels_per_side=1024,
+    output_format: Literal["obj", "ply", "glb"] = "obj",
 ):
     """Textures a mesh using the radiance field from the Pipeline.
-    The mesh is written to an OBJ file in the output directory,
+    The mesh is written to an OBJ, PLY or GLB file in the output directory,
     along with the corresponding material and texture files.
     Operations will occur on the same device as the Pipeline.
 
@@ -345,10 +595,14 @@ def export_textured_mesh(
         unwrap_method: The method to use for unwrapping the mesh.
         offset_method: The method to use for computing the ray length to render.
         num_pixels_per_side: The number of pixels per side of the texture image.
+        output_format: The format of the mesh file. The texture is embedded in GLB files.
     """
 
     # pylint: disable=too-many-statements
 
+    if output_format not in ("obj", "ply", "glb"):
+        raise ValueError(f"Output format {output_format} not supported.")
+
     device = pipeline.device
 
     vertices = mesh.vertices.to(device)
@@ -410,79 +664,30 @@ def export_textured_mesh(
     texture_image = outputs["rgb"].cpu().numpy()
     media.write_image(str(output_dir / "material_0.png"), texture_image)
 
-    CONSOLE.print("Writing relevant OBJ information to files...")
-    # create the .mtl file
-    lines_mtl = [
-        "# Generated with nerfstudio",
-        "newmtl material_0",
-        "Ka 1.000 1.000 1.000",
-        "Kd 1.000 1.000 1.000",
-        "Ks 0.000 0.000 0.000",
-        "d 1.0",
-        "illum 2",
-        "Ns 1.00000000",
-        "map_Kd material_0.png",
-    ]
-    lines_mtl = [line + "\n" for line in lines_mtl]
-    file_mtl = open(output_dir / "material_0.mtl", "w", encoding="utf-8")  # pylint: disable=consider-using-with
-    file_mtl.writelines(lines_mtl)
-    file_mtl.close()
-
-    # create the .obj file
-    lines_obj = ["# Generated with nerfstudio", "mtllib material_0.mtl", "usemtl material_0"]
-    lines_obj = [line + "\n" for line in lines_obj]
-    file_obj = open(output_dir / "mesh.obj", "w", encoding="utf-8")  # pylint: disable=consider-using-with
-    file_obj.writelines(lines_obj)
-
-    # write the geometric vertices
     vertices = vertices.cpu().numpy()
-    progress = get_progress("Writing vertices to file", suffix="lines-per-sec")
-    with progress:
-        for i in progress.track(range(len(vertices))):
-            vertex = vertices[i]
-            line = f"v {vertex[0]} {vertex[1]} {vertex[2]}\n"
-            file_obj.write(line)
-
-    # write the texture coordinates
+    faces = faces.cpu().numpy()
     texture_coordinates = texture_coordinates.cpu().numpy()
-    with progress:
-        progress = get_progress("Writing texture coordinates to file", suffix="lines-per-sec")
-        for i in progress.track(range(len(faces))):
-            for uv in texture_coordinates[i]:
-                line = f"vt {uv[0]} {1.0 - uv[1]}\n"
-                file_obj.write(line)
-
-    # write the vertex normals
     vertex_normals = vertex_normals.cpu().numpy()
-    progress = get_progress("Writing vertex normals to file", suffix="lines-per-sec")
-    with progress:
-        for i in progress.track(range(len(vertex_normals))):
-            normal = vertex_normals[i]
-            line = f"vn {normal[0]} {normal[1]} {normal[2]}\n"
-            file_obj.write(line)
-
-    # write the faces
-    faces = faces.cpu().numpy()
-    progress = get_progress("Writing faces to file", suffix="lines-per-sec")
-    with progress:
-        for i in progress.track(range(len(faces))):
-            face = faces[i]
-            v1 = face[0] + 1
-            v2 = face[1] + 1
-            v3 = face[2] + 1
-            vt1 = i * 3 + 1
-            vt2 = i * 3 + 2
-            vt3 = i * 3 + 3
-            vn1 = v1
-            vn2 = v2
-            vn3 = v3
-            line = f"f {v1}/{vt1}/{vn1} {v2}/{vt2}/{vn2} {v3}/{vt3}/{vn3}\n"
-            file_obj.write(line)
-
-    file_obj.close()
-
-    summary_log.append(f"OBJ file saved to {output_dir / 'mesh.obj'}")
-    summary_log.append(f"MTL file saved to {output_dir / 'material_0.mtl'}")
+    if output_format == "obj":
+        CONSOLE.print("Writing relevant OBJ information to files...")
+        write_obj(output_dir / "mesh.obj", vertices, faces, texture_coordinates, vertex_normals, "material_0.mtl")
+        summary_log.append(f"OBJ file saved to {output_dir / 'mesh.obj'}")
+        summary_log.append(f"MTL file saved to {output_dir / 'material_0.mtl'}")
+    elif output_format == "ply":
+        CONSOLE.print("Writing the textured mesh to a PLY file...")
+        write_ply(output_dir / "mesh.ply", vertices, faces, texture_coordinates, vertex_normals, "material_0.png")
+        summary_log.append(f"PLY file saved to {output_dir / 'mesh.ply'}")
+    else:
+        CONSOLE.print("Writing the textured mesh to a GLB file...")
+        write_glb(
+            output_dir / "mesh.glb",
+            vertices,
+            faces,
+            texture_coordinates,
+            vertex_normals,
+            (output_dir / "material_0.png").read_bytes(),
+        )
+        summary_log.append(f"GLB file saved to {output_dir / 'mesh.glb'}")
     summary_log.append(
         f"Texture image saved to {output_dir / 'material_0.png'} "
         f"with resolution {texture_image.shape[1]}x{texture_image.shape[0]} (WxH)"
@@ -20,6 +20,7 @@ TSDF utils.
 
 from __future__ import annotations
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import List, Optional, Tuple, Union
@@ -32,7 +33,8 @@ from rich.console import Console
 from skimage import measure
 from torchtyping import TensorType
 
-from nerfstudio.exporter.exporter_utils import Mesh, render_trajectory
+from nerfstudio.exporter.exporter_utils import Mesh, render_trajectory_frames
+from nerfstudio.exporter.marching_cubes import BlockMarchingCubes
 from nerfstudio.pipelines.base_pipeline import Pipeline
 
 CONSOLE = Console(width=120)
@@ -147,17 +149,20 @@ class TSDF:
         vertex_matrix = mesh.vertices.cpu().numpy().astype("float64")
         face_matrix = mesh.faces.cpu().numpy().astype("int32")
         v_normals_matrix = mesh.normals.cpu().numpy().astype("float64")
-        v_color_matrix = mesh.colors.cpu().numpy().astype("float64")
-        # colors need an alpha channel
-        v_color_matrix = np.concatenate([v_color_matrix, np.ones((v_color_matrix.shape[0], 1))], axis=-1)
-
-        # create a new Mesh
-        m = pymeshlab.Mesh(
-            vertex_matrix=vertex_matrix,
-            face_matrix=face_matrix,
-            v_normals_matrix=v_normals_matrix,
-            v_color_matrix=v_color_matrix,
-        )
+        if mesh.colors is None:
+            m = pymeshlab.Mesh(vertex_matrix=vertex_matrix, face_matrix=face_matrix, v_normals_matrix=v_normals_matrix)
+        else:
+            v_color_matrix = mesh.colors.cpu().numpy().astype("float64")
+            # colors need an alpha channel
+            v_color_matrix = np.concatenate([v_color_matrix, np.ones((v_color_matrix.shape[0], 1))], axis=-1)
+
+            # create a new Mesh
+            m = pymeshlab.Mesh(
+                vertex_matrix=vertex_matrix,
+                face_matrix=face_matrix,
+                v_normals_matrix=v_normals_matrix,
+                v_color_matrix=v_color_matrix,
+            )
         # create a new MeshSet
         ms = pymeshlab.MeshSet()
         # add the mesh to the MeshSet
@@ -172,102 +177,434 @@ class TSDF:
         depth_images: TensorType["batch", 1, "height", "width"],
         color_images: Optional[TensorType["batch", 3, "height", "width"]] = None,
         mask_images: Optional[TensorType["batch", 1, "height", "width"]] = None,
+        num_voxels_per_tile: int = 1 << 20,
     ):
         """Integrates a batch of depth images into the TSDF.
 
+        The voxels are integrated in tiles, so that the memory used on top of the volume grows with the size of a tile
+        rather than with the size of the volume.
+
         Args:
             c2w: The camera extrinsics.
             K: The camera intrinsics.
             depth_images: The depth images to integrate.
             color_images: The color images to integrate.
             mask_images: The mask images to integrate.
+            num_voxels_per_tile: Number of voxels integrated at once.
         """
 
         if mask_images is not None:
             raise NotImplementedError("Mask images are not supported yet.")
 
-        batch_size = c2w.shape[0]
-        shape = self.voxel_coords.shape[1:]
+        voxel_world_coords = self.voxel_coords.view(3, -1)
+        values = self.values.view(-1)
+        weights = self.weights.view(-1)
+        colors = self.colors.view(-1, 3)
+        w2c = torch.inverse(c2w)
+        for start in range(0, values.shape[0], num_voxels_per_tile):
+            end = start + num_voxels_per_tile
+            integrate_voxels(
+                voxel_world_coords[:, start:end].T,
+                values[start:end],
+                weights[start:end],
+                colors[start:end] if color_images is not None else None,
+                w2c,
+                K,
+                depth_images,
+                color_images=color_images,
+                truncation=self.truncation,
+            )
 
-        # Project voxel_coords into image space...
 
-        image_size = torch.tensor(
-            [depth_images.shape[-1], depth_images.shape[-2]], device=self.device
-        )  # [width, height]
+@dataclass
+class SparseTSDF:
+    """
+    Class for creating TSDFs that only allocate the voxels near the observed surfaces.
 
-        # make voxel_coords homogeneous
-        voxel_world_coords = self.voxel_coords.view(3, -1)
-        voxel_world_coords = torch.cat(
-            [voxel_world_coords, torch.ones(1, voxel_world_coords.shape[1], device=self.device)], dim=0
+    The volume is split into blocks of block_size^3 voxels, and a block is allocated once a depth image observes a
+    surface within the truncation distance of it. New blocks are appended to storage that grows geometrically, and
+    blocks are looked up by their linear index in the grid of blocks through a separate sorted index, into which only
+    the keys of the new blocks are merged.
+    """
+
+    origin: TensorType[3]
+    """Origin of the TSDF [xmin, ymin, zmin]."""
+    voxel_size: TensorType[3]
+    """Size of each voxel in the TSDF. [x, y, z] size."""
+    volume_dims: TensorType[3]
+    """Number of voxels of the TSDF along each axis [xdim, ydim, zdim]."""
+    block_keys: TensorType["capacity"]
+    """Linear indices of the allocated blocks in the grid of blocks, in allocation order. Only the first num_blocks
+    entries are allocated."""
+    values: TensorType["capacity", "block_size", "block_size", "block_size"]
+    """TSDF values for each voxel of the allocated blocks."""
+    weights: TensorType["capacity", "block_size", "block_size", "block_size"]
+    """TSDF weights for each voxel of the allocated blocks."""
+    colors: TensorType["capacity", "block_size", "block_size", "block_size", 3]
+    """TSDF colors for each voxel of the allocated blocks."""
+    sorted_block_keys: TensorType["num_blocks"]
+    """Sorted linear indices of the allocated blocks."""
+    sorted_block_indices: TensorType["num_blocks"]
+    """Index among the allocated blocks of each of the sorted linear indices."""
+    block_size: int = 8
+    """Number of voxels of a block along each axis."""
+    truncation_margin: float = 5.0
+    """Margin for truncation."""
+    num_blocks: int = 0
+    """Number of allocated blocks."""
+
+    def to(self, device: str):
+        """Move the tensors to the specified device.
+
+        Args:
+            device: The device to move the tensors to. E.g., "cuda:0" or "cpu".
+        """
+        self.origin = self.origin.to(device)
+        self.voxel_size = self.voxel_size.to(device)
+        self.volume_dims = self.volume_dims.to(device)
+        self.block_keys = self.block_keys.to(device)
+        self.values = self.values.to(device)
+        self.weights = self.weights.to(device)
+        self.colors = self.colors.to(device)
+        self.sorted_block_keys = self.sorted_block_keys.to(device)
+        self.sorted_block_indices = self.sorted_block_indices.to(device)
+        return self
+
+    @property
+    def device(self):
+        """Returns the device that the voxels are on."""
+        return self.values.device
+
+    @property
+    def truncation(self):
+        """Returns the truncation distance."""
+        return self.voxel_size[0] * self.truncation_margin
+
+    @property
+    def grid_dims(self) -> TensorType[3]:
+        """Returns the number of blocks of the grid of blocks along each axis."""
+        return torch.div(self.volume_dims + self.block_size - 1, self.block_size, rounding_mode="floor")
+
+    @staticmethod
+    def from_aabb(aabb: TensorType[2, 3], volume_dims: TensorType[3], block_size: int = 8):
+        """Returns an empty instance of SparseTSDF from an axis-aligned bounding box and volume dimensions.
+
+        Args:
+            aabb: The axis-aligned bounding box with shape [[xmin, ymin, zmin], [xmax, ymax, zmax]].
+            volume_dims: The volume dimensions with shape [xdim, ydim, zdim].
+            block_size: Number of voxels of a block along each axis.
+        """
+        origin = aabb[0]
+        voxel_size = (aabb[1] - aabb[0]) / volume_dims
+        block_shape = [0] + [block_size] * 3
+        return SparseTSDF(
+            origin=origin,
+            voxel_size=voxel_size,
+            volume_dims=volume_dims,
+            block_keys=torch.zeros(0, dtype=torch.long),
+            values=-torch.ones(block_shape),
+            weights=torch.zeros(block_shape),
+            colors=torch.zeros(block_shape + [3]),
+            sorted_block_keys=torch.zeros(0, dtype=torch.long),
+            sorted_block_indices=torch.zeros(0, dtype=torch.long),
+            block_size=block_size,
         )
-        voxel_world_coords = voxel_world_coords.unsqueeze(0)  # [1, 4, N]
-        voxel_world_coords = voxel_world_coords.expand(batch_size, *voxel_world_coords.shape[1:])  # [batch, 4, N]
 
-        voxel_cam_coords = torch.bmm(torch.inverse(c2w), voxel_world_coords)  # [batch, 4, N]
+    def _get_block_keys(self, block_coords: TensorType[..., 3]) -> TensorType[...]:
+        """Returns the linear indices of blocks in the grid of blocks."""
+        grid_dims = self.grid_dims
+        return (block_coords[..., 0] * grid_dims[1] + block_coords[..., 1]) * grid_dims[2] + block_coords[..., 2]
+
+    def _get_block_coords(self, block_keys: TensorType[...]) -> TensorType[..., 3]:
+        """Inverse of _get_block_keys."""
+        grid_dims = self.grid_dims
+        return torch.stack(
+            [
+                torch.div(block_keys, grid_dims[1] * grid_dims[2], rounding_mode="floor"),
+                torch.div(block_keys, grid_dims[2], rounding_mode="floor") % grid_dims[1],
+                block_keys % grid_dims[2],
+            ],
+            dim=-1,
+        )
 
-        # flip the z axis
-        voxel_cam_coords[:, 2, :] = -voxel_cam_coords[:, 2, :]
-        # flip the y axis
-        voxel_cam_coords[:, 1, :] = -voxel_cam_coords[:, 1, :]
+    def find_blocks(self, block_keys: TensorType[...]) -> Tuple[TensorType[...], TensorType[...]]:
+        """Looks up blocks among the allocated blocks.
 
-        # we need the distance of the point to the camera, not the z coordinate
-        voxel_depth = torch.sqrt(torch.sum(voxel_cam_coords[:, :3, :] ** 2, dim=-2, keepdim=True))  # [batch, 1, N]
+        Args:
+            block_keys: Linear indices of the blocks in the grid of blocks.
 
-        voxel_cam_coords_z = voxel_cam_coords[:, 2:3, :]
-        voxel_cam_points = torch.bmm(K, voxel_cam_coords[:, 0:3, :] / voxel_cam_coords_z)  # [batch, 3, N]
-        voxel_pixel_coords = voxel_cam_points[:, :2, :]  # [batch, 2, N]
+        Returns:
+            The indices of the blocks among the allocated blocks, and whether they are allocated.
+        """
+        if self.num_blocks == 0:
+            return torch.zeros_like(block_keys), torch.zeros_like(block_keys, dtype=torch.bool)
+        sorted_indices = torch.searchsorted(self.sorted_block_keys, block_keys).clamp(max=self.num_blocks - 1)
+        return self.sorted_block_indices[sorted_indices], self.sorted_block_keys[sorted_indices] == block_keys
 
-        # Sample the depth images with grid sample...
+    def _reserve_blocks(self, num_blocks: int) -> None:
+        """Grows the storage of the blocks to hold at least num_blocks blocks, at least doubling its capacity so that
+        the allocated blocks are only copied a logarithmic number of times.
 
-        grid = voxel_pixel_coords.permute(0, 2, 1)  # [batch, N, 2]
-        # normalize grid to [-1, 1]
-        grid = 2.0 * grid / image_size.view(1, 1, 2) - 1.0  # [batch, N, 2]
-        grid = grid[:, None]  # [batch, 1, N, 2]
-        # depth
-        sampled_depth = F.grid_sample(
-            input=depth_images, grid=grid, mode="nearest", padding_mode="zeros", align_corners=False
-        )  # [batch, N, 1]
-        sampled_depth = sampled_depth.squeeze(2)  # [batch, 1, N]
-        # colors
-        if color_images is not None:
-            sampled_colors = F.grid_sample(
-                input=color_images, grid=grid, mode="nearest", padding_mode="zeros", align_corners=False
-            )  # [batch, N, 3]
-            sampled_colors = sampled_colors.squeeze(2)  # [batch, 3, N]
+        Args:
+            num_blocks: Number of blocks to hold.
+        """
+        capacity = self.values.shape[0]
+        if num_blocks <= capacity:
+            return
+        capacity = max(num_blocks, 2 * capacity)
 
-        dist = sampled_depth - voxel_depth  # [batch, 1, N]
-        tsdf_values = torch.clamp(dist / self.truncation, min=-1.0, max=1.0)  # [batch, 1, N]
-        valid_points = (voxel_depth > 0) & (sampled_depth > 0) & (dist > -self.truncation)  # [batch, 1, N]
+        def grow(storage: torch.Tensor, fill_value: float) -> torch.Tensor:
+            grown_storage = storage.new_full((capacity, *storage.shape[1:]), fill_value)
+            grown_storage[: self.num_blocks] = storage[: self.num_blocks]
+            return grown_storage
 
-        # Sequentially update the TSDF...
+        self.block_keys = grow(self.block_keys, -1)
+        self.values = grow(self.values, -1.0)
+        self.weights = grow(self.weights, 0.0)
+        self.colors = grow(self.colors, 0.0)
 
-        for i in range(batch_size):
+    def allocate_blocks(self, block_keys: TensorType["num_keys"]) -> None:
+        """Allocates the blocks that are not allocated yet.
 
-            valid_points_i = valid_points[i]
-            valid_points_i_shape = valid_points_i.view(*shape)  # [xdim, ydim, zdim]
+        Args:
+            block_keys: Linear indices of the blocks in the grid of blocks.
+        """
+        block_keys = torch.unique(block_keys)
+        _, allocated = self.find_blocks(block_keys)
+        new_block_keys = block_keys[~allocated]
+        num_new_blocks = len(new_block_keys)
+        if num_new_blocks == 0:
+            return
+        self._reserve_blocks(self.num_blocks + num_new_blocks)
+        new_block_indices = torch.arange(self.num_blocks, self.num_blocks + num_new_blocks, device=self.device)
+        self.block_keys[new_block_indices] = new_block_keys
+
+        # Merge the sorted new keys into the sorted index, without moving the voxels of the allocated blocks
+        num_blocks = self.num_blocks + num_new_blocks
+        new_positions = torch.searchsorted(self.sorted_block_keys, new_block_keys)
+        new_positions += torch.arange(num_new_blocks, device=self.device)
+        old_positions = torch.ones(num_blocks, dtype=torch.bool, device=self.device)
+        old_positions[new_positions] = False
+        sorted_block_keys = torch.empty(num_blocks, dtype=torch.long, device=self.device)
+        sorted_block_keys[old_positions] = self.sorted_block_keys
+        sorted_block_keys[new_positions] = new_block_keys
+        sorted_block_indices = torch.empty_like(sorted_block_keys)
+        sorted_block_indices[old_positions] = self.sorted_block_indices
+        sorted_block_indices[new_positions] = new_block_indices
+        self.sorted_block_keys = sorted_block_keys
+        self.sorted_block_indices = sorted_block_indices
+        self.num_blocks = num_blocks
+
+    def get_surface_block_keys(
+        self, c2w: TensorType[4, 4], K: TensorType[3, 3], depth_image: TensorType[1, "height", "width"]
+    ) -> TensorType["num_keys"]:
+        """Returns the linear indices of the blocks within the truncation distance of the surface seen by an image.
 
-            # the old values
-            old_tsdf_values_i = self.values[valid_points_i_shape]
-            old_weights_i = self.weights[valid_points_i_shape]
+        Args:
+            c2w: The camera extrinsics.
+            K: The camera intrinsics.
+            depth_image: The depth image.
+        """
+        height, width = depth_image.shape[-2:]
+        pixel_coords = torch.stack(
+            torch.meshgrid(
+                torch.arange(width, device=self.device), torch.arange(height, device=self.device), indexing="xy"
+            ),
+            dim=-1,
+        )  # [height, width, 2]
+        depths = depth_image[0]
+        observed = depths > 0
+        pixel_coords, depths = pixel_coords[observed] + 0.5, depths[observed]
+        # ray directions, with the y and z axes flipped as in integrate_voxels
+        directions = torch.cat([pixel_coords, torch.ones_like(pixel_coords[:, :1])], dim=-1) @ torch.inverse(K).T
+        directions = directions * directions.new_tensor([1.0, -1.0, -1.0])
+        directions = directions / torch.linalg.norm(directions, dim=-1, keepdim=True) @ c2w[:3, :3].T
+
+        # sample the rays every voxel within the truncation distance of the surface
+        step = float(self.voxel_size.min())
+        offsets = torch.arange(-float(self.truncation), float(self.truncation) + step / 2, step, device=self.device)
+        points = c2w[:3, 3] + (depths[:, None, None] + offsets[:, None]) * directions[:, None, :]  # [N, samples, 3]
+        voxel_coords = torch.floor((points - self.origin) / self.voxel_size).long().view(-1, 3)
+        inside = torch.all((voxel_coords >= 0) & (voxel_coords < self.volume_dims), dim=-1)
+        block_coords = torch.div(voxel_coords[inside], self.block_size, rounding_mode="floor")
+        return torch.unique(self._get_block_keys(block_coords))
+
+    def get_voxel_coords(self, block_indices: TensorType["num_blocks"], padding: int = 0) -> TensorType[..., 3]:
+        """Returns the coordinates of the voxels of allocated blocks in the voxel grid.
 
-            # the new values
-            # TODO: let the new weight be configurable
-            new_tsdf_values_i = tsdf_values[i][valid_points_i]
-            new_weights_i = 1.0
+        Args:
+            block_indices: Indices of the blocks among the allocated blocks.
+            padding: Number of voxels of the following blocks to include along each axis.
 
-            total_weights = old_weights_i + new_weights_i
+        Returns:
+            The voxel coordinates with shape [num_blocks, block_size + padding, block_size + padding,
+            block_size + padding, 3].
+        """
+        local_coords = torch.arange(self.block_size + padding, device=self.device)
+        local_coords = torch.stack(torch.meshgrid([local_coords] * 3, indexing="ij"), dim=-1)
+        block_coords = self._get_block_coords(self.block_keys[block_indices])
+        return block_coords[:, None, None, None, :] * self.block_size + local_coords
 
-            self.values[valid_points_i_shape] = (
-                old_tsdf_values_i * old_weights_i + new_tsdf_values_i * new_weights_i
-            ) / total_weights
-            self.weights[valid_points_i_shape] = torch.clamp(total_weights, max=1.0)
+    def integrate_tsdf(
+        self,
+        c2w: TensorType["batch", 4, 4],
+        K: TensorType["batch", 3, 3],
+        depth_images: TensorType["batch", 1, "height", "width"],
+        color_images: Optional[TensorType["batch", 3, "height", "width"]] = None,
+        mask_images: Optional[TensorType["batch", 1, "height", "width"]] = None,
+        num_blocks_per_tile: int = 2048,
+    ):
+        """Allocates the blocks near the surfaces seen by a batch of depth images and integrates the images into them.
 
-            if color_images is not None:
-                old_colors_i = self.colors[valid_points_i_shape]  # [M, 3]
-                new_colors_i = sampled_colors[i][:, valid_points_i.squeeze(0)].permute(1, 0)  # [M, 3]
-                self.colors[valid_points_i_shape] = (
-                    old_colors_i * old_weights_i[:, None] + new_colors_i * new_weights_i
-                ) / total_weights[:, None]
+        Args:
+            c2w: The camera extrinsics.
+            K: The camera intrinsics.
+            depth_images: The depth images to integrate.
+            color_images: The color images to integrate.
+            mask_images: The mask images to integrate.
+            num_blocks_per_tile: Number of blocks integrated at once.
+        """
+
+        if mask_images is not None:
+            raise NotImplementedError("Mask images are not supported yet.")
+
+        block_keys = [self.get_surface_block_keys(c2w[i], K[i], depth_images[i]) for i in range(c2w.shape[0])]
+        self.allocate_blocks(torch.cat(block_keys))
+
+        num_voxels_per_block = self.block_size**3
+        values = self.values.view(-1)
+        weights = self.weights.view(-1)
+        colors = self.colors.view(-1, 3)
+        w2c = torch.inverse(c2w)
+        for start in range(0, self.num_blocks, num_blocks_per_tile):
+            block_indices = torch.arange(start, min(start + num_blocks_per_tile, self.num_blocks), device=self.device)
+            voxel_world_coords = self.origin + self.get_voxel_coords(block_indices).view(-1, 3) * self.voxel_size
+            voxels = slice(start * num_voxels_per_block, (start + len(block_indices)) * num_voxels_per_block)
+            integrate_voxels(
+                voxel_world_coords,
+                values[voxels],
+                weights[voxels],
+                colors[voxels] if color_images is not None else None,
+                w2c,
+                K,
+                depth_images,
+                color_images=color_images,
+                truncation=self.truncation,
+            )
+
+    def get_mesh(self, num_blocks_per_chunk: int = 256) -> Mesh:
+        """Extracts a mesh using marching cubes on every block.
+
+        Each block is padded with the first voxels of the following blocks, so that the surfaces of neighbouring
+        blocks meet, and the vertices on the boundaries of the blocks are merged. Only the cells between voxels that
+        were observed are meshed, so that no surface is extracted where the volume was not allocated.
+
+        Args:
+            num_blocks_per_chunk: Number of blocks passed to marching cubes at once.
+        """
+        block_size = self.block_size
+        marching_cubes = BlockMarchingCubes(block_size=block_size)
+        for start in range(0, self.num_blocks, num_blocks_per_chunk):
+            block_indices = torch.arange(start, min(start + num_blocks_per_chunk, self.num_blocks), device=self.device)
+
+            # gather the padded blocks
+            voxel_coords = self.get_voxel_coords(block_indices, padding=1)  # [blocks, size + 1, size + 1, size + 1, 3]
+            block_keys = self._get_block_keys(torch.div(voxel_coords, block_size, rounding_mode="floor"))
+            voxel_indices, observed = self.find_blocks(block_keys)
+            local_voxel_coords = voxel_coords % block_size
+            voxel_indices = voxel_indices * block_size**3 + (
+                (local_voxel_coords[..., 0] * block_size + local_voxel_coords[..., 1]) * block_size
+                + local_voxel_coords[..., 2]
+            )
+            observed &= torch.all(voxel_coords < self.volume_dims, dim=-1)
+            observed &= self.weights.view(-1)[voxel_indices] > 0
+            marching_cubes.add_blocks(
+                self.values.view(-1)[voxel_indices].clamp(-1, 1),
+                voxel_coords[:, 0, 0, 0],
+                valid_corners=observed,
+                colors=self.colors.view(-1, 3)[voxel_indices],
+            )
+        vertices, faces, normals, colors = marching_cubes.get_mesh()
+        if colors is None:
+            colors = torch.zeros_like(vertices)
+
+        # move vertices back to world space
+        vertices = self.origin.view(1, 3) + vertices * self.voxel_size.view(1, 3)
+
+        return Mesh(vertices=vertices, faces=faces, normals=normals, colors=colors)
+
+
+def integrate_voxels(
+    voxel_world_coords: TensorType["num_voxels", 3],
+    values: TensorType["num_voxels"],
+    weights: TensorType["num_voxels"],
+    colors: Optional[TensorType["num_voxels", 3]],
+    w2c: TensorType["batch", 4, 4],
+    K: TensorType["batch", 3, 3],
+    depth_images: TensorType["batch", 1, "height", "width"],
+    color_images: Optional[TensorType["batch", 3, "height", "width"]] = None,
+    truncation: Union[float, torch.Tensor] = 0.05,
+) -> None:
+    """Integrates a batch of depth images into a set of TSDF voxels, updating their values, weights and colors in place.
+
+    Every image a voxel is visible in updates it in turn with a weight of 1, and the weights saturate at 1. The
+    result of these sequential updates is a weighted sum over the batch, with the weight of each image halved by
+    every later image the voxel is visible in, which is computed for all images at once.
+
+    Args:
+        voxel_world_coords: World coordinates of the voxels.
+        values: TSDF values of the voxels.
+        weights: TSDF weights of the voxels.
+        colors: TSDF colors of the voxels, not updated if None.
+        w2c: The world to camera transforms.
+        K: The camera intrinsics.
+        depth_images: The depth images to integrate.
+        color_images: The color images to integrate.
+        truncation: The truncation distance.
+    """
+    image_size = torch.tensor([depth_images.shape[-1], depth_images.shape[-2]], device=values.device)  # [width, height]
+
+    # Project the voxels into the images, with the y and z axes flipped
+    flip_yz = w2c.new_tensor([1.0, -1.0, -1.0])
+    voxel_cam_coords = torch.baddbmm(
+        (w2c[:, :3, 3] * flip_yz)[:, None, :],
+        voxel_world_coords.expand(w2c.shape[0], -1, -1),
+        (w2c[:, :3, :3] * flip_yz[:, None]).transpose(1, 2),
+    )  # [batch, N, 3]
+    # we need the distance of the point to the camera, not the z coordinate
+    voxel_depth = torch.linalg.norm(voxel_cam_coords, dim=-1)  # [batch, N]
+    voxel_cam_points = voxel_cam_coords / voxel_cam_coords[..., 2:3]
+    voxel_pixel_coords = torch.matmul(voxel_cam_points, K[:, :2, :].transpose(1, 2))  # [batch, N, 2]
+
+    # normalize grid to [-1, 1]
+    grid = (2.0 * voxel_pixel_coords / image_size - 1.0)[:, None]  # [batch, 1, N, 2]
+    sampled_depth = F.grid_sample(
+        input=depth_images, grid=grid, mode="nearest", padding_mode="zeros", align_corners=False
+    )  # [batch, 1, 1, N]
+    sampled_depth = sampled_depth[:, 0, 0]  # [batch, N]
+
+    dist = sampled_depth - voxel_depth  # [batch, N]
+    tsdf_values = torch.clamp(dist / truncation, min=-1.0, max=1.0)  # [batch, N]
+    valid_points = (voxel_depth > 0) & (sampled_depth > 0) & (dist > -truncation)  # [batch, N]
+
+    # Weight of each image in the sequential updates
+    valid_counts = torch.cumsum(valid_points, dim=0)
+    num_valid = valid_counts[-1]  # [N]
+    num_later_valid = num_valid - valid_counts  # [batch, N]
+    first_weight = 1.0 / (weights + 1.0)
+    image_weights = torch.where(valid_counts == 1, first_weight, first_weight.new_tensor(0.5))
+    image_weights = image_weights * torch.pow(0.5, num_later_valid) * valid_points  # [batch, N]
+    old_weight = weights * first_weight * torch.pow(0.5, num_valid - 1)
+    old_weight = torch.where(num_valid > 0, old_weight, torch.ones_like(weights))
+
+    values.copy_(values * old_weight + torch.sum(image_weights * tsdf_values, dim=0))
+    if colors is not None and color_images is not None:
+        sampled_colors = F.grid_sample(
+            input=color_images, grid=grid, mode="nearest", padding_mode="zeros", align_corners=False
+        )  # [batch, 3, 1, N]
+        sampled_colors = sampled_colors[:, :, 0]  # [batch, 3, N]
+        colors.copy_(colors * old_weight[:, None] + torch.einsum("bn,bcn->nc", image_weights, sampled_colors))
+    weights.copy_(torch.where(num_valid > 0, torch.clamp(weights + 1.0, max=1.0), weights))
 
 
 def export_tsdf_mesh(
@@ -281,6 +618,8 @@ def export_tsdf_mesh(
     use_bounding_box: bool = True,
     bounding_box_min: Tuple[float, float, float] = (-1.0, -1.0, -1.0),
     bounding_box_max: Tuple[float, float, float] = (1.0, 1.0, 1.0),
+    use_sparse_volume: bool = False,
+    block_size: int = 8,
 ):
     """Export a TSDF mesh from a pipeline.
 
@@ -295,6 +634,8 @@ def export_tsdf_mesh(
         use_bounding_box: Whether to use a bounding box for the TSDF volume.
         bounding_box_min: Minimum coordinates of the bounding box.
         bounding_box_max: Maximum coordinates of the bounding box.
+        use_sparse_volume: Whether to only allocate the blocks of the TSDF volume near the observed surfaces.
+        block_size: Number of voxels along each axis of the blocks of the sparse TSDF volume.
     """
 
     device = pipeline.device
@@ -312,40 +653,65 @@ def export_tsdf_mesh(
         volume_dims = torch.tensor(resolution)
     else:
         raise ValueError("Resolution must be an int or a list.")
-    tsdf = TSDF.from_aabb(aabb, volume_dims=volume_dims)
+    tsdf: Union[TSDF, SparseTSDF]
+    if use_sparse_volume:
+        tsdf = SparseTSDF.from_aabb(aabb, volume_dims=volume_dims, block_size=block_size)
+    else:
+        tsdf = TSDF.from_aabb(aabb, volume_dims=volume_dims)
     # move TSDF to device
     tsdf.to(device)
 
     cameras = dataparser_outputs.cameras
-    # we turn off distortion when populating the TSDF
-    color_images, depth_images = render_trajectory(
-        pipeline,
-        cameras,
-        rgb_output_name=rgb_output_name,
-        depth_output_name=depth_output_name,
-        rendered_resolution_scaling_factor=1.0 / downscale_factor,
-        disable_distortion=True,
-    )
-
-    # camera extrinsics and intrinsics
+    # camera extrinsics
     c2w: TensorType["N", 3, 4] = cameras.camera_to_worlds.to(device)
     # make c2w homogeneous
     c2w = torch.cat([c2w, torch.zeros(c2w.shape[0], 1, 4, device=device)], dim=1)
     c2w[:, 3, 3] = 1
-    K: TensorType["N", 3, 3] = cameras.get_intrinsics_matrices().to(device)
-    color_images = torch.tensor(np.array(color_images), device=device).permute(0, 3, 1, 2)  # shape (N, 3, H, W)
-    depth_images = torch.tensor(np.array(depth_images), device=device).permute(0, 3, 1, 2)  # shape (N, 1, H, W)
 
-    CONSOLE.print("Integrating the TSDF")
-    for i in range(0, len(c2w), batch_size):
+    def integrate_batch(
+        camera_indices: List[int],
+        color_images: List[TensorType["height", "width", 3]],
+        depth_images: List[TensorType["height", "width", 1]],
+    ) -> None:
+        """Integrates a batch of rendered frames into the TSDF."""
+        # the intrinsics are read once the cameras are rescaled for rendering
+        K: TensorType["N", 3, 3] = cameras.get_intrinsics_matrices()[camera_indices].to(device)
         tsdf.integrate_tsdf(
-            c2w[i : i + batch_size],
-            K[i : i + batch_size],
-            depth_images[i : i + batch_size],
-            color_images=color_images[i : i + batch_size],
+            c2w[camera_indices],
+            K,
+            torch.stack(depth_images).permute(0, 3, 1, 2),  # shape (N, 1, H, W)
+            color_images=torch.stack(color_images).permute(0, 3, 1, 2),  # shape (N, 3, H, W)
         )
 
+    # Every batch is integrated on a background thread while the next one renders, and is freed once integrated, so
+    # that at most two batches of frames are in memory at once.
+    CONSOLE.print("Integrating the TSDF")
+    camera_indices: List[int] = []
+    color_images: List[torch.Tensor] = []
+    depth_images: List[torch.Tensor] = []
+    pending_batch: Optional[Future] = None
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # we turn off distortion when populating the TSDF
+        for camera_idx, color_image, depth_image in render_trajectory_frames(
+            pipeline,
+            cameras,
+            rgb_output_name=rgb_output_name,
+            depth_output_name=depth_output_name,
+            rendered_resolution_scaling_factor=1.0 / downscale_factor,
+            disable_distortion=True,
+        ):
+            camera_indices.append(camera_idx)
+            color_images.append(color_image)
+            depth_images.append(depth_image)
+            if len(camera_indices) == batch_size or camera_idx == cameras.size - 1:
+                if pending_batch is not None:
+                    pending_batch.result()
+                pending_batch = executor.submit(integrate_batch, camera_indices, color_images, depth_images)
+                camera_indices, color_images, depth_images = [], [], []
+        if pending_batch is not None:
+            pending_batch.result()
+
     CONSOLE.print("Computing Mesh")
     mesh = tsdf.get_mesh()
     CONSOLE.print("Saving TSDF Mesh")
-    tsdf.export_mesh(mesh, filename=str(output_dir / "tsdf_mesh.ply"))
+    TSDF.export_mesh(mesh, filename=str(output_dir / "tsdf_mesh.ply"))
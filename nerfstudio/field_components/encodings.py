@@ -229,6 +229,8 @@ class HashEncoding(Encoding):
         hash_init_scale: Value to initialize hash grid.
         implementation: Implementation of hash encoding. Fallback to torch if tcnn not available.
         interpolation: Interpolation override for tcnn hashgrid. Not supported for torch unless linear.
+        chunk_size: Number of inputs encoded at once by the torch implementation, to bound its memory use. All inputs
+            are encoded at once if None.
     """
 
     def __init__(
@@ -241,6 +243,7 @@ class HashEncoding(Encoding):
         hash_init_scale: float = 0.001,
         implementation: Literal["tcnn", "torch"] = "tcnn",
         interpolation: Optional[Literal["Nearest", "Linear", "Smoothstep"]] = None,
+        chunk_size: Optional[int] = None,
     ) -> None:
 
         super().__init__(in_dim=3)
@@ -248,12 +251,15 @@ class HashEncoding(Encoding):
         self.features_per_level = features_per_level
         self.log2_hashmap_size = log2_hashmap_size
         self.hash_table_size = 2**log2_hashmap_size
+        self.chunk_size = chunk_size
 
         levels = torch.arange(num_levels)
         growth_factor = np.exp((np.log(max_res) - np.log(min_res)) / (num_levels - 1))
-        self.scalings = torch.floor(min_res * growth_factor**levels)
+        # Constants of the torch implementation, kept as buffers so that they follow the module across devices
+        self.register_buffer("scalings", torch.floor(min_res * growth_factor**levels), persistent=False)
+        self.register_buffer("hash_offset", levels * self.hash_table_size, persistent=False)
+        self.register_buffer("hash_primes", torch.tensor([1, 2654435761, 805459861]), persistent=False)
 
-        self.hash_offset = levels * self.hash_table_size
         self.hash_table = torch.rand(size=(self.hash_table_size * num_levels, features_per_level)) * 2 - 1
         self.hash_table *= hash_init_scale
         self.hash_table = nn.Parameter(self.hash_table)
@@ -290,61 +296,52 @@ class HashEncoding(Encoding):
         """Returns hash tensor using method described in Instant-NGP
 
         Args:
-            in_tensor: Tensor to be hashed
+            in_tensor: Integer grid coordinates to be hashed
         """
 
-        # min_val = torch.min(in_tensor)
-        # max_val = torch.max(in_tensor)
-        # assert min_val >= 0.0
-        # assert max_val <= 1.0
-
-        in_tensor = in_tensor * torch.tensor([1, 2654435761, 805459861]).to(in_tensor.device)
+        in_tensor = in_tensor * self.hash_primes
         x = torch.bitwise_xor(in_tensor[..., 0], in_tensor[..., 1])
         x = torch.bitwise_xor(x, in_tensor[..., 2])
         x %= self.hash_table_size
-        x += self.hash_offset.to(x.device)
+        x += self.hash_offset
         return x
 
     def pytorch_fwd(self, in_tensor: TensorType["bs":..., "input_dim"]) -> TensorType["bs":..., "output_dim"]:
         """Forward pass using pytorch. Significantly slower than TCNN implementation."""
 
         assert in_tensor.shape[-1] == 3
-        in_tensor = in_tensor[..., None, :]  # [..., 1, 3]
-        scaled = in_tensor * self.scalings.view(-1, 1).to(in_tensor.device)  # [..., L, 3]
-        scaled_c = torch.ceil(scaled).type(torch.int32)
-        scaled_f = torch.floor(scaled).type(torch.int32)
+        if self.chunk_size is None or in_tensor[..., 0].numel() <= self.chunk_size:
+            return self._pytorch_fwd(in_tensor)
+        in_tensor_flat = in_tensor.reshape(-1, 3)
+        encoded_flat = torch.cat([self._pytorch_fwd(chunk) for chunk in torch.split(in_tensor_flat, self.chunk_size)])
+        return encoded_flat.view(*in_tensor.shape[:-1], -1)
+
+    def _pytorch_fwd(self, in_tensor: TensorType["bs":..., "input_dim"]) -> TensorType["bs":..., "output_dim"]:
+        """Encodes all of the inputs at once with pytorch."""
 
+        scaled = in_tensor[..., None, :] * self.scalings.view(-1, 1)  # [..., L, 3]
+        scaled_f = torch.floor(scaled)
         offset = scaled - scaled_f
 
-        hashed_0 = self.hash_fn(scaled_c)  # [..., num_levels]
-        hashed_1 = self.hash_fn(torch.cat([scaled_c[..., 0:1], scaled_f[..., 1:2], scaled_c[..., 2:3]], dim=-1))
-        hashed_2 = self.hash_fn(torch.cat([scaled_f[..., 0:1], scaled_f[..., 1:2], scaled_c[..., 2:3]], dim=-1))
-        hashed_3 = self.hash_fn(torch.cat([scaled_f[..., 0:1], scaled_c[..., 1:2], scaled_c[..., 2:3]], dim=-1))
-        hashed_4 = self.hash_fn(torch.cat([scaled_c[..., 0:1], scaled_c[..., 1:2], scaled_f[..., 2:3]], dim=-1))
-        hashed_5 = self.hash_fn(torch.cat([scaled_c[..., 0:1], scaled_f[..., 1:2], scaled_f[..., 2:3]], dim=-1))
-        hashed_6 = self.hash_fn(scaled_f)
-        hashed_7 = self.hash_fn(torch.cat([scaled_f[..., 0:1], scaled_c[..., 1:2], scaled_f[..., 2:3]], dim=-1))
-
-        f_0 = self.hash_table[hashed_0]  # [..., num_levels, features_per_level]
-        f_1 = self.hash_table[hashed_1]
-        f_2 = self.hash_table[hashed_2]
-        f_3 = self.hash_table[hashed_3]
-        f_4 = self.hash_table[hashed_4]
-        f_5 = self.hash_table[hashed_5]
-        f_6 = self.hash_table[hashed_6]
-        f_7 = self.hash_table[hashed_7]
-
-        f_03 = f_0 * offset[..., 0:1] + f_3 * (1 - offset[..., 0:1])
-        f_12 = f_1 * offset[..., 0:1] + f_2 * (1 - offset[..., 0:1])
-        f_56 = f_5 * offset[..., 0:1] + f_6 * (1 - offset[..., 0:1])
-        f_47 = f_4 * offset[..., 0:1] + f_7 * (1 - offset[..., 0:1])
-
-        f0312 = f_03 * offset[..., 1:2] + f_12 * (1 - offset[..., 1:2])
-        f4756 = f_47 * offset[..., 1:2] + f_56 * (1 - offset[..., 1:2])
-
-        encoded_value = f0312 * offset[..., 2:3] + f4756 * (
-            1 - offset[..., 2:3]
-        )  # [..., num_levels, features_per_level]
+        # The hash is a xor of one term per axis, so the terms of the floor and ceiling along each axis are computed
+        # once and combined into the hashes of the 8 corners of the cell
+        grid_coords = torch.stack([scaled_f.long(), torch.ceil(scaled).long()], dim=-1)  # [..., L, 3, 2]
+        terms = grid_coords * self.hash_primes.view(3, 1)
+        hashed = torch.bitwise_xor(terms[..., 0, :, None, None], terms[..., 1, None, :, None])
+        hashed = torch.bitwise_xor(hashed, terms[..., 2, None, None, :]).flatten(-3)  # [..., L, 8]
+        # The hash table size is a power of two, for which the bitwise and is the same as the modulo
+        hashed = torch.bitwise_and(hashed, self.hash_table_size - 1) + self.hash_offset.view(-1, 1)
+        if torch.is_grad_enabled() and self.hash_table.requires_grad:
+            features = self.hash_table[hashed]  # [..., L, 8, features_per_level]
+        else:
+            # Faster to gather than indexing, but slower to backpropagate through on the CPU
+            features = F.embedding(hashed, self.hash_table)
+
+        # Trilinear interpolation weights of the corners, in the same order
+        axis_weights = torch.stack([1 - offset, offset], dim=-1)  # [..., L, 3, 2]
+        weights = axis_weights[..., 0, :, None, None] * axis_weights[..., 1, None, :, None]
+        weights = (weights * axis_weights[..., 2, None, None, :]).flatten(-3)  # [..., L, 8]
+        encoded_value = torch.matmul(weights[..., None, :], features)[..., 0, :]  # [..., L, features_per_level]
 
         return torch.flatten(encoded_value, start_dim=-2, end_dim=-1)  # [..., num_levels * features_per_level]
 
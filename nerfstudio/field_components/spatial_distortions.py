@@ -86,3 +86,19 @@ class SceneContraction(SpatialDistortion):
             return Gaussians(mean=means, cov=cov)
 
         return contract(positions)
+
+    def inverse(self, positions: TensorType["bs":..., 3]) -> TensorType["bs":..., 3]:
+        """Maps contracted positions back to the unbounded space.
+
+        The contraction maps a point at distance d > 1 from the origin to a distance of 2 - 1 / d, so the points on the
+        boundary of the contracted space, which come from infinitely far away, are clamped to a large distance.
+
+        Args:
+            positions: Contracted positions, within a distance of 2 from the origin.
+
+        Returns:
+            Positions in the unbounded space.
+        """
+        mag = torch.linalg.norm(positions, ord=self.order, dim=-1, keepdim=True)
+        mag = torch.clamp(mag, max=2.0 - 1e-4)
+        return torch.where(mag < 1, positions, positions / (mag * (2.0 - mag)))
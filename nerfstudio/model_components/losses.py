@@ -16,6 +16,8 @@
 Collection of Losses.
 """
 
+from typing import Optional
+
 import torch
 from torch import nn
 from torchtyping import TensorType
@@ -194,3 +196,24 @@ def pred_normal_loss(
 ):
     """Loss between normals calculated from density and normals from prediction network."""
     return (weights[..., 0] * (1.0 - torch.sum(normals * pred_normals, dim=-1))).sum(dim=-1)
+
+
+def weighted_rgb_loss(
+    image: TensorType["num_rays", 3],
+    rgb: TensorType["num_rays", 3],
+    loss_weights: Optional[TensorType["num_rays"]] = None,
+) -> TensorType[()]:
+    """Mean squared error between the ground truth and rendered colors of a batch of rays.
+
+    Pixel samplers that don't draw pixels uniformly, like the ImportancePixelSampler, return a "loss_weights" entry
+    in the batch which keeps the loss unbiased. Without weights this is the same as MSELoss.
+
+    Args:
+        image: Ground truth colors.
+        rgb: Rendered colors.
+        loss_weights: Optional weight of each ray.
+    """
+    squared_errors = (image - rgb) ** 2
+    if loss_weights is not None:
+        squared_errors = loss_weights.to(squared_errors.device)[:, None] * squared_errors
+    return torch.mean(squared_errors)
@@ -0,0 +1,176 @@
+# Copyright 2022 The Nerfstudio Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Occupancy grids baked from trained density fields.
+"""
+
+from typing import Callable, List, Optional
+
+import torch
+from torch import nn
+from torchtyping import TensorType
+
+from nerfstudio.field_components.spatial_distortions import (
+    SceneContraction,
+    SpatialDistortion,
+)
+
+
+class BakedOccupancyGrid(nn.Module):
+    """Bitfield of the cells of a grid that hold some density, baked from the density fields of a trained model.
+
+    The grid covers the contracted space when a scene contraction is used, and the aabb otherwise. Before it is
+    baked the grid is empty and every cell counts as occupied. The bitfield is saved with the model, checkpoints
+    saved before the grid was baked load as an unbaked grid.
+
+    Args:
+        aabb: parameters of scene aabb bounds
+        resolution: number of cells along each axis of the grid
+        spatial_distortion: spatial distortion module of the density fields
+    """
+
+    def __init__(
+        self,
+        aabb: TensorType[2, 3],
+        resolution: int = 128,
+        spatial_distortion: Optional[SpatialDistortion] = None,
+    ) -> None:
+        super().__init__()
+        assert spatial_distortion is None or isinstance(
+            spatial_distortion, SceneContraction
+        ), "Only scene contractions can be baked into an occupancy grid."
+        self.resolution = resolution
+        self.spatial_distortion = spatial_distortion
+        self.register_buffer("aabb", aabb.clone(), persistent=False)
+        self.register_buffer("bitfield", torch.zeros(0, dtype=torch.uint8))
+
+    @property
+    def is_baked(self) -> bool:
+        """Whether the grid was baked."""
+        return self.bitfield.numel() > 0
+
+    def _load_from_state_dict(
+        self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs
+    ):
+        # The size of the bitfield depends on whether the saved grid was baked
+        key = prefix + "bitfield"
+        if key in state_dict:
+            self.register_buffer("bitfield", torch.empty_like(state_dict[key], device=self.bitfield.device))
+        super()._load_from_state_dict(
+            state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs
+        )
+        if key in missing_keys:
+            missing_keys.remove(key)
+
+    def get_normalized_positions(self, positions: TensorType["bs":..., 3]) -> TensorType["bs":..., 3]:
+        """Returns the positions in the [0, 1] coordinates of the grid.
+
+        Args:
+            positions: World positions.
+        """
+        if self.spatial_distortion is not None:
+            return (self.spatial_distortion(positions) + 2.0) / 4.0
+        return (positions - self.aabb[0]) / (self.aabb[1] - self.aabb[0])
+
+    def get_world_positions(self, normalized_positions: TensorType["bs":..., 3]) -> TensorType["bs":..., 3]:
+        """Inverse of get_normalized_positions.
+
+        Args:
+            normalized_positions: Positions in the [0, 1] coordinates of the grid.
+        """
+        if self.spatial_distortion is None:
+            return self.aabb[0] + normalized_positions * (self.aabb[1] - self.aabb[0])
+        assert isinstance(self.spatial_distortion, SceneContraction)
+        return self.spatial_distortion.inverse(normalized_positions * 4.0 - 2.0)
+
+    @torch.no_grad()
+    def bake(
+        self,
+        density_fns: List[Callable[[TensorType["bs":..., 3]], TensorType["bs":..., 1]]],
+        density_threshold: float = 0.01,
+        num_samples_per_cell: int = 8,
+        num_cells_per_chunk: int = 1 << 16,
+    ) -> None:
+        """Marks the cells in which any of the density functions reaches the threshold as occupied.
+
+        Each cell is probed at random points, and the occupied cells are dilated by one cell so that thin structures
+        falling between the probes are not lost.
+
+        Args:
+            density_fns: Functions returning the density at world positions.
+            density_threshold: Smallest density of an occupied cell.
+            num_samples_per_cell: Number of points to probe in each cell.
+            num_cells_per_chunk: Number of cells to probe at once.
+        """
+        device = self.aabb.device
+        res = self.resolution
+        num_cells = res**3
+        occupied = torch.zeros(num_cells, dtype=torch.bool, device=device)
+        for start in range(0, num_cells, num_cells_per_chunk):
+            cell_indices = torch.arange(start, min(start + num_cells_per_chunk, num_cells), device=device)
+            cells = torch.stack([cell_indices // (res * res), (cell_indices // res) % res, cell_indices % res], -1)
+            jitter = torch.rand((len(cell_indices), num_samples_per_cell, 3), device=device)
+            positions = self.get_world_positions((cells[:, None, :] + jitter) / res)
+            for density_fn in density_fns:
+                densities = density_fn(positions)[..., 0]
+                occupied[start : start + len(cell_indices)] |= torch.any(densities >= density_threshold, dim=-1)
+
+        occupied = occupied.view(1, 1, res, res, res).float()
+        occupied = torch.nn.functional.max_pool3d(occupied, kernel_size=3, stride=1, padding=1).view(-1) > 0
+        # Pack 8 cells into every byte
+        occupied = torch.nn.functional.pad(occupied.to(torch.uint8), (0, -num_cells % 8)).view(-1, 8)
+        bit_values = 2 ** torch.arange(8, device=device, dtype=torch.uint8)
+        self.register_buffer("bitfield", torch.sum(occupied * bit_values, dim=-1, dtype=torch.uint8))
+
+    def get_occupancy(self, positions: TensorType["bs":..., 3]) -> TensorType["bs":...]:
+        """Returns whether the positions lie in occupied cells. Positions outside of the grid count as occupied.
+
+        Args:
+            positions: World positions.
+        """
+        if not self.is_baked:
+            return torch.ones_like(positions[..., 0], dtype=torch.bool)
+        normalized_positions = self.get_normalized_positions(positions)
+        inside = torch.all((normalized_positions >= 0.0) & (normalized_positions <= 1.0), dim=-1)
+        cells = torch.clamp((normalized_positions * self.resolution).long(), 0, self.resolution - 1)
+        cell_indices = (cells[..., 0] * self.resolution + cells[..., 1]) * self.resolution + cells[..., 2]
+        bits = (self.bitfield[cell_indices // 8] >> (cell_indices % 8).to(torch.uint8)) & 1
+        return (bits > 0) | ~inside
+
+    def forward(self, positions: TensorType["bs":..., 3]) -> TensorType["bs":...]:
+        """Returns whether the positions lie in occupied cells, see get_occupancy.
+
+        Args:
+            positions: World positions.
+        """
+        return self.get_occupancy(positions)
+
+    def mask_density_fn(
+        self, density_fn: Callable[[TensorType["bs":..., 3]], TensorType["bs":..., 1]]
+    ) -> Callable[[TensorType["bs":..., 3]], TensorType["bs":..., 1]]:
+        """Wraps a density function so that it is only evaluated in the occupied cells, and is 0 everywhere else.
+
+        Args:
+            density_fn: Function returning the density at world positions.
+        """
+
+        def masked_density_fn(positions: TensorType["bs":..., 3]) -> TensorType["bs":..., 1]:
+            occupied = self.get_occupancy(positions)
+            densities = torch.zeros((*positions.shape[:-1], 1), device=positions.device)
+            if torch.any(occupied):
+                densities[occupied] = density_fn(positions[occupied]).to(densities)
+            return densities
+
+        return masked_density_fn
@@ -15,12 +15,20 @@
 """
 Ray generator.
 """
+import torch
+from rich.progress import Console
 from torch import nn
 from torchtyping import TensorType
 
 from nerfstudio.cameras.camera_optimizers import CameraOptimizer
 from nerfstudio.cameras.cameras import Cameras
 from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.utils import poses as pose_utils
+
+CONSOLE = Console(width=120)
+
+MAX_DIRECTION_LUT_PIXELS = 2**26
+"""Largest number of pixels (summed over intrinsics groups) to precompute directions for, about 1GB."""
 
 
 class RayGenerator(nn.Module):
@@ -30,13 +38,77 @@ class RayGenerator(nn.Module):
     Args:
         cameras: Camera objects containing camera info.
         pose_optimizer: pose optimization module, for optimizing noisy camera intrisics/extrinsics.
+        use_direction_lut: Precompute the undistorted camera space direction and pixel area of every pixel, once
+            for each group of cameras sharing the same intrinsics, so that generating rays is a lookup and a
+            rotation. Falls back to Cameras.generate_rays if the tables would be too large.
     """
 
-    def __init__(self, cameras: Cameras, pose_optimizer: CameraOptimizer) -> None:
+    def __init__(self, cameras: Cameras, pose_optimizer: CameraOptimizer, use_direction_lut: bool = False) -> None:
         super().__init__()
         self.cameras = cameras
         self.pose_optimizer = pose_optimizer
         self.image_coords = nn.Parameter(cameras.get_image_coords(), requires_grad=False)
+        self.use_direction_lut = use_direction_lut
+        if self.use_direction_lut:
+            self.use_direction_lut = self._build_direction_lut()
+
+    def _build_direction_lut(self) -> bool:
+        """Builds the direction and pixel area tables. Returns whether the tables were built."""
+        cameras = self.cameras.flatten()
+        distortion_params = (
+            cameras.distortion_params
+            if cameras.distortion_params is not None
+            else torch.zeros((len(cameras), 6), device=cameras.device)
+        )
+        intrinsics = torch.cat(
+            [
+                cameras.fx,
+                cameras.fy,
+                cameras.cx,
+                cameras.cy,
+                cameras.height.float(),
+                cameras.width.float(),
+                cameras.camera_type.float(),
+                distortion_params,
+            ],
+            dim=-1,
+        )
+        unique_intrinsics, camera_groups = torch.unique(intrinsics, dim=0, return_inverse=True)
+        num_groups = len(unique_intrinsics)
+        max_height = int(cameras.height.max())
+        max_width = int(cameras.width.max())
+        if num_groups * max_height * max_width > MAX_DIRECTION_LUT_PIXELS:
+            CONSOLE.print(
+                f"[bold yellow]Warning: {num_groups} groups of camera intrinsics is too many to precompute ray "
+                "directions for, generating rays on the fly instead."
+            )
+            return False
+
+        # Rays of a camera at the origin, looking down -z, are its camera space directions.
+        group_cameras = Cameras(
+            camera_to_worlds=torch.eye(4, device=cameras.device)[None, :3, :4].repeat(num_groups, 1, 1),
+            fx=unique_intrinsics[:, 0:1],
+            fy=unique_intrinsics[:, 1:2],
+            cx=unique_intrinsics[:, 2:3],
+            cy=unique_intrinsics[:, 3:4],
+            height=unique_intrinsics[:, 4:5].long(),
+            width=unique_intrinsics[:, 5:6].long(),
+            camera_type=unique_intrinsics[:, 6:7].long(),
+            distortion_params=unique_intrinsics[:, 7:] if cameras.distortion_params is not None else None,
+        )
+        directions = torch.zeros((num_groups, max_height, max_width, 3), device=cameras.device)
+        pixel_area = torch.zeros((num_groups, max_height, max_width, 1), device=cameras.device)
+        for group in range(num_groups):
+            ray_bundle = group_cameras.generate_rays(camera_indices=group, keep_shape=True)
+            height, width = ray_bundle.shape[:2]
+            directions[group, :height, :width] = ray_bundle.directions
+            pixel_area[group, :height, :width] = ray_bundle.pixel_area
+
+        # Not persistent, so that checkpoints are the same with and without the tables.
+        self.register_buffer("camera_groups", camera_groups, persistent=False)
+        self.register_buffer("direction_lut", directions, persistent=False)
+        self.register_buffer("pixel_area_lut", pixel_area, persistent=False)
+        return True
 
     def forward(self, ray_indices: TensorType["num_rays", 3]) -> RayBundle:
         """Index into the cameras to generate the rays.
@@ -51,6 +123,19 @@ class RayGenerator(nn.Module):
 
         camera_opt_to_camera = self.pose_optimizer(c)
 
+        if self.use_direction_lut:
+            c, y, x = c.to(self.direction_lut.device), y.to(self.direction_lut.device), x.to(self.direction_lut.device)
+            group = self.camera_groups[c]
+            c2w = pose_utils.multiply(self.cameras.camera_to_worlds[c], camera_opt_to_camera)
+            directions = torch.sum(self.direction_lut[group, y, x][..., None, :] * c2w[..., :3, :3], dim=-1)
+            return RayBundle(
+                origins=c2w[..., :3, 3],
+                directions=directions,
+                pixel_area=self.pixel_area_lut[group, y, x],
+                camera_indices=c.unsqueeze(-1),
+                times=self.cameras.times[c] if self.cameras.times is not None else None,
+            )
+
         ray_bundle = self.cameras.generate_rays(
             camera_indices=c.unsqueeze(-1),
             coords=coords,
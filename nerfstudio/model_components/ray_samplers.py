@@ -28,6 +28,41 @@ from torchtyping import TensorType
 from nerfstudio.cameras.rays import Frustums, RayBundle, RaySamples
 
 
+def pack_ray_samples(
+    ray_samples: RaySamples, mask: TensorType["num_rays", "num_samples"]
+) -> Tuple[RaySamples, TensorType["num_rays", 2], TensorType["total_samples"]]:
+    """Packs the selected samples of every ray into a flat RaySamples.
+
+    Args:
+        ray_samples: Samples of shape (num_rays, num_samples).
+        mask: Samples to keep.
+
+    Returns:
+        a tuple of (ray_samples, packed_info, ray_indices), as returned by the VolumetricSampler.
+        The packed_info holds the index of the first sample and the number of samples of each ray.
+        The ray_indices contains the indices of the rays that each sample belongs to.
+    """
+    num_samples_per_ray = mask.sum(dim=-1)
+    packed_info = torch.stack([torch.cumsum(num_samples_per_ray, dim=0) - num_samples_per_ray, num_samples_per_ray], -1)
+    ray_indices = torch.nonzero(mask)[:, 0]
+    return ray_samples[mask], packed_info, ray_indices
+
+
+def unpack_sample_values(
+    values: TensorType["total_samples", "dim"], mask: TensorType["num_rays", "num_samples"]
+) -> TensorType["num_rays", "num_samples", "dim"]:
+    """Scatters the values of samples packed by pack_ray_samples back to their place, with zeros for dropped samples.
+
+    Args:
+        values: Values of the packed samples.
+        mask: Mask the samples were packed with.
+
+    Returns:
+        Values of shape (num_rays, num_samples, dim).
+    """
+    return values.new_zeros((*mask.shape, values.shape[-1])).masked_scatter(mask[..., None], values)
+
+
 class Sampler(nn.Module):
     """Generate Samples
 
@@ -502,7 +537,7 @@ class ProposalNetworkSampler(Sampler):
 
     def __init__(
         self,
-        num_proposal_samples_per_ray: Tuple[int] = (64,),
+        num_proposal_samples_per_ray: Tuple[int, ...] = (64,),
         num_nerf_samples_per_ray: int = 32,
         num_proposal_network_iterations: int = 2,
         single_jitter: bool = False,
@@ -575,3 +610,62 @@ class ProposalNetworkSampler(Sampler):
 
         assert ray_samples is not None
         return ray_samples, weights_list, ray_samples_list
+
+    @torch.no_grad()
+    def get_sample_mask(
+        self,
+        ray_samples: RaySamples,
+        weights_list: List[TensorType[..., 1]],
+        ray_samples_list: List[RaySamples],
+        min_proposal_weight: float = 0.0,
+        min_transmittance: float = 0.0,
+    ) -> TensorType["num_rays", "num_samples"]:
+        """Selects the samples worth querying the field for according to the last proposal network, to be packed
+        with pack_ray_samples.
+
+        A sample is dropped if it lies in a proposal bin with a weight below min_proposal_weight, or if the
+        transmittance of the proposal network at the start of the bin before the one it starts in is below
+        min_transmittance, which terminates the ray. The last sample before the termination of every ray is always
+        kept, so that every ray has a sample to take its background from.
+
+        Terminating a ray only drops its trailing samples, so a render of values in [0, 1] changes by at most the
+        transmittance of the field at the start of the first dropped sample, which is the weight of the dropped
+        samples. This is below min_transmittance as long as the proposal density doesn't overestimate the attenuation
+        of the field before that sample. Skipping back one bin only partly covers the overestimate of the bin a
+        surface is hit in when the bin after it is thin, in which case the error can exceed min_transmittance.
+
+        Args:
+            ray_samples: Samples returned by the sampler.
+            weights_list: Weights of each proposal network iteration returned by the sampler.
+            ray_samples_list: Samples of each proposal network iteration returned by the sampler.
+            min_proposal_weight: Smallest proposal weight of the samples to keep.
+            min_transmittance: Smallest proposal transmittance of the samples to keep.
+
+        Returns:
+            Mask of the samples to keep.
+        """
+        assert ray_samples.spacing_starts is not None and ray_samples.spacing_ends is not None
+        proposal_ray_samples = ray_samples_list[self.num_proposal_network_iterations - 1]
+        proposal_weights = weights_list[self.num_proposal_network_iterations - 1][..., 0]
+        assert proposal_ray_samples.spacing_ends is not None
+        proposal_spacing_ends = proposal_ray_samples.spacing_ends[..., 0].contiguous()
+        spacing_mids = ((ray_samples.spacing_starts + ray_samples.spacing_ends) / 2.0)[..., 0]
+        bin_indices = torch.searchsorted(proposal_spacing_ends, spacing_mids.contiguous(), side="right")
+        bin_indices = torch.clamp(bin_indices, max=proposal_weights.shape[-1] - 1)
+        # A sample can span several proposal bins, so its visibility is judged from the bin it starts in.
+        start_bin_indices = torch.searchsorted(
+            proposal_spacing_ends, ray_samples.spacing_starts[..., 0].contiguous(), side="right"
+        )
+        start_bin_indices = torch.clamp(start_bin_indices, max=proposal_weights.shape[-1] - 1)
+
+        # Transmittance at the start of the bin before the one the sample starts in, which keeps rays going through
+        # the bin they hit a surface in, where the piecewise constant proposal density overestimates the attenuation.
+        # The transmittance only decreases along the ray, so the visible samples are a prefix of each ray.
+        transmittance = 1.0 - (torch.cumsum(proposal_weights, dim=-1) - proposal_weights)
+        transmittance = torch.nn.functional.pad(transmittance[..., :-1], (1, 0), value=1.0)
+        visible = torch.gather(transmittance, -1, start_bin_indices) >= min_transmittance
+        visible[..., 0] = True
+        mask = visible & (torch.gather(proposal_weights, -1, bin_indices) >= min_proposal_weight)
+        last_visible = torch.sum(visible, dim=-1, keepdim=True) - 1
+        mask.scatter_(-1, last_visible, True)
+        return mask
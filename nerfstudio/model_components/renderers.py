@@ -27,16 +27,48 @@ Example:
 
 """
 import math
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 
-import nerfacc
 import torch
 from torch import nn
+from torch.autograd import Function
+from torch.cuda.amp import custom_bwd, custom_fwd
 from torchtyping import TensorType
 from typing_extensions import Literal
 
 from nerfstudio.cameras.rays import RaySamples
-from nerfstudio.utils.math import components_from_spherical_harmonics
+from nerfstudio.utils.math import (
+    components_from_spherical_harmonics,
+    packed_to_padded,
+)
+
+
+def accumulate_along_rays(
+    weights: TensorType["num_samples", 1],
+    ray_indices: TensorType["num_samples"],
+    values: Optional[TensorType["num_samples", "dim"]] = None,
+    num_rays: Optional[int] = None,
+) -> TensorType["num_rays", "dim"]:
+    """Sums the weighted values of packed samples along each ray.
+
+    Same as nerfacc.accumulate_along_rays, but also runs on the CPU.
+
+    Args:
+        weights: Weights of the samples.
+        ray_indices: Ray index of each sample.
+        values: Values to accumulate. If None, the weights themselves are accumulated.
+        num_rays: Number of rays. If None, it is inferred from the ray indices.
+
+    Returns:
+        Accumulated values of each ray.
+    """
+    src = weights
+    if values is not None:
+        src = src * values
+    if num_rays is None:
+        num_rays = int(ray_indices.max()) + 1 if ray_indices.numel() > 0 else 0
+    outputs = torch.zeros((num_rays, src.shape[-1]), dtype=src.dtype, device=src.device)
+    return outputs.index_add(0, ray_indices.long(), src)
 
 
 class RGBRenderer(nn.Module):
@@ -58,7 +90,7 @@ class RGBRenderer(nn.Module):
         background_color: Union[Literal["random", "last_sample"], TensorType[3]] = "random",
         ray_indices: Optional[TensorType["num_samples"]] = None,
         num_rays: Optional[int] = None,
-    ) -> TensorType["bs":..., 3]:
+    ) -> TensorType[..., 3]:
         """Composite samples along ray and render color image
 
         Args:
@@ -73,21 +105,50 @@ class RGBRenderer(nn.Module):
         """
         if ray_indices is not None and num_rays is not None:
             # Necessary for packed samples from volumetric ray sampler
-            if background_color == "last_sample":
-                raise NotImplementedError("Background color 'last_sample' not implemented for packed samples.")
-            comp_rgb = nerfacc.accumulate_along_rays(weights, ray_indices, rgb, num_rays)
-            accumulated_weight = nerfacc.accumulate_along_rays(weights, ray_indices, None, num_rays)
+            comp_rgb = accumulate_along_rays(weights, ray_indices, rgb, num_rays)
+            accumulated_weight = accumulate_along_rays(weights, ray_indices, None, num_rays)
         else:
             comp_rgb = torch.sum(weights * rgb, dim=-2)
             accumulated_weight = torch.sum(weights, dim=-2)
 
+        return cls.blend_background(comp_rgb, accumulated_weight, rgb, background_color, ray_indices, num_rays)
+
+    @classmethod
+    def blend_background(
+        cls,
+        comp_rgb: TensorType[..., 3],
+        accumulated_weight: TensorType[..., 1],
+        rgb: TensorType[..., 3],
+        background_color: Union[Literal["random", "last_sample"], TensorType[3]] = "random",
+        ray_indices: Optional[TensorType["num_samples"]] = None,
+        num_rays: Optional[int] = None,
+    ) -> TensorType[..., 3]:
+        """Fills the transparent part of composited rays with the background color
+
+        Args:
+            comp_rgb: Composited rgb of each ray
+            accumulated_weight: Accumulated weight of each ray
+            rgb: RGB for each sample
+            background_color: Background color as RGB.
+            ray_indices: Ray index for each sample, used when samples are packed.
+            num_rays: Number of rays, used when samples are packed.
+
+        Returns:
+            Outputs rgb values.
+        """
         if background_color == "last_sample":
-            background_color = rgb[..., -1, :]
+            if ray_indices is not None and num_rays is not None:
+                # The samples of each ray are contiguous, so its last sample ends its run of ray indices
+                num_samples_per_ray = torch.bincount(ray_indices, minlength=num_rays)
+                last_samples = torch.clamp(torch.cumsum(num_samples_per_ray, dim=0) - 1, min=0)
+                background_color = rgb[last_samples] * (num_samples_per_ray > 0)[:, None]
+            else:
+                background_color = rgb[..., -1, :]
         if background_color == "random":
             background_color = torch.rand_like(comp_rgb).to(rgb.device)
 
         assert isinstance(background_color, torch.Tensor)
-        comp_rgb = comp_rgb + background_color.to(weights.device) * (1.0 - accumulated_weight)
+        comp_rgb = comp_rgb + background_color.to(comp_rgb.device) * (1.0 - accumulated_weight)
 
         return comp_rgb
 
@@ -97,7 +158,7 @@ class RGBRenderer(nn.Module):
         weights: TensorType["bs":..., "num_samples", 1],
         ray_indices: Optional[TensorType["num_samples"]] = None,
         num_rays: Optional[int] = None,
-    ) -> TensorType["bs":..., 3]:
+    ) -> TensorType[..., 3]:
         """Composite samples along ray and render color image
 
         Args:
@@ -177,7 +238,7 @@ class AccumulationRenderer(nn.Module):
         weights: TensorType["bs":..., "num_samples", 1],
         ray_indices: Optional[TensorType["num_samples"]] = None,
         num_rays: Optional[int] = None,
-    ) -> TensorType["bs":..., 1]:
+    ) -> TensorType[..., 1]:
         """Composite samples along ray and calculate accumulation.
 
         Args:
@@ -191,7 +252,7 @@ class AccumulationRenderer(nn.Module):
 
         if ray_indices is not None and num_rays is not None:
             # Necessary for packed samples from volumetric ray sampler
-            accumulation = nerfacc.accumulate_along_rays(weights, ray_indices, None, num_rays)
+            accumulation = accumulate_along_rays(weights, ray_indices, None, num_rays)
         else:
             accumulation = torch.sum(weights, dim=-2)
         return accumulation
@@ -235,7 +296,16 @@ class DepthRenderer(nn.Module):
             steps = (ray_samples.frustums.starts + ray_samples.frustums.ends) / 2
 
             if ray_indices is not None and num_rays is not None:
-                raise NotImplementedError("Median depth calculation is not implemented for packed samples.")
+                # Scatter the packed samples into zero padded rays, the padding never moves the median
+                padded_weights, _ = packed_to_padded(weights.reshape(-1, 1), ray_indices, num_rays)
+                padded_steps, _ = packed_to_padded(steps, ray_indices, num_rays)
+                cumulative_weights = torch.cumsum(padded_weights[..., 0], dim=-1)  # [num_rays, max_num_samples]
+                split = torch.ones((num_rays, 1), device=weights.device) * 0.5  # [num_rays, 1]
+                median_index = torch.searchsorted(cumulative_weights, split, side="left")  # [num_rays, 1]
+                num_samples_per_ray = torch.bincount(ray_indices, minlength=num_rays)[:, None]
+                median_index = torch.clamp(torch.minimum(median_index, num_samples_per_ray - 1), min=0)
+                median_depth = torch.gather(padded_steps[..., 0], dim=-1, index=median_index)  # [num_rays, 1]
+                return median_depth
             cumulative_weights = torch.cumsum(weights[..., 0], dim=-1)  # [..., num_samples]
             split = torch.ones((*weights.shape[:-2], 1), device=weights.device) * 0.5  # [..., 1]
             median_index = torch.searchsorted(cumulative_weights, split, side="left")  # [..., 1]
@@ -248,8 +318,8 @@ class DepthRenderer(nn.Module):
 
             if ray_indices is not None and num_rays is not None:
                 # Necessary for packed samples from volumetric ray sampler
-                depth = nerfacc.accumulate_along_rays(weights, ray_indices, steps, num_rays)
-                accumulation = nerfacc.accumulate_along_rays(weights, ray_indices, None, num_rays)
+                depth = accumulate_along_rays(weights, ray_indices, steps, num_rays)
+                accumulation = accumulate_along_rays(weights, ray_indices, None, num_rays)
                 depth = depth / (accumulation + eps)
             else:
                 depth = torch.sum(weights * steps, dim=-2) / (torch.sum(weights, -2) + eps)
@@ -261,6 +331,104 @@ class DepthRenderer(nn.Module):
         raise NotImplementedError(f"Method {self.method} not implemented")
 
 
+class _CompositeRGBDepthAccumulation(Function):  # pylint: disable=abstract-method
+    """Composites the rgb, the depth and the accumulation of samples along rays in one op.
+
+    The weighted sums are batched matrix products, so no per sample product is materialized, and only the inputs
+    are saved for backward. The depth is only composited, and returned, when steps are given.
+    """
+
+    @staticmethod
+    @custom_fwd(cast_inputs=torch.float32)
+    def forward(ctx, weights, rgb, steps):  # pylint: disable=arguments-differ
+        ctx.save_for_backward(weights, rgb, steps)
+        weights_t = weights.transpose(-1, -2)  # [..., 1, num_samples]
+        comp_rgb = torch.matmul(weights_t, rgb)[..., 0, :]
+        comp_depth = None if steps is None else torch.matmul(weights_t, steps)[..., 0, :]
+        accumulation = torch.sum(weights, dim=-2)
+        return comp_rgb, comp_depth, accumulation
+
+    @staticmethod
+    @custom_bwd
+    def backward(ctx, grad_rgb, grad_depth, grad_accumulation):  # pylint: disable=arguments-differ
+        weights, rgb, steps = ctx.saved_tensors
+        grad_weights = torch.matmul(rgb, grad_rgb[..., :, None]) + grad_accumulation[..., None, :]
+        grad_steps = None
+        if steps is not None:
+            grad_weights = grad_weights + steps * grad_depth[..., None, :]
+            grad_steps = weights * grad_depth[..., None, :] if ctx.needs_input_grad[2] else None
+        grad_rgb = weights * grad_rgb[..., None, :] if ctx.needs_input_grad[1] else None
+        return grad_weights, grad_rgb, grad_steps
+
+
+class CompositeRenderer(nn.Module):
+    """Renders rgb, depth and accumulation together, sharing a single composite of the samples.
+
+    Gives the same outputs as an RGBRenderer, a DepthRenderer and an AccumulationRenderer.
+
+    Args:
+        background_color: Background color as RGB. Uses random colors if None.
+        depth_method: Depth calculation method, see DepthRenderer.
+    """
+
+    def __init__(
+        self,
+        background_color: Union[Literal["random", "last_sample"], TensorType[3]] = "random",
+        depth_method: Literal["median", "expected"] = "median",
+    ) -> None:
+        super().__init__()
+        self.background_color = background_color
+        self.depth_method = depth_method
+        self.renderer_depth = DepthRenderer(method=depth_method)
+
+    def forward(
+        self,
+        rgb: TensorType["bs":..., "num_samples", 3],
+        weights: TensorType["bs":..., "num_samples", 1],
+        ray_samples: RaySamples,
+        ray_indices: Optional[TensorType["num_samples"]] = None,
+        num_rays: Optional[int] = None,
+    ) -> Tuple[TensorType[..., 3], TensorType[..., 1], TensorType[..., 1]]:
+        """Composite samples along ray and render color, depth and accumulation
+
+        Args:
+            rgb: RGB for each sample
+            weights: Weights for each sample
+            ray_samples: Set of ray samples.
+            ray_indices: Ray index for each sample, used when samples are packed.
+            num_rays: Number of rays, used when samples are packed.
+
+        Returns:
+            Outputs of rgb, depth and accumulation values.
+        """
+        # The median depth is found from the weights alone, so the depth is only composited for the expected depth
+        steps = None
+        if self.depth_method == "expected":
+            steps = (ray_samples.frustums.starts + ray_samples.frustums.ends) / 2
+
+        if ray_indices is not None and num_rays is not None:
+            # Necessary for packed samples from volumetric ray sampler
+            ones = torch.ones_like(weights)
+            values = torch.cat([rgb, ones] if steps is None else [rgb, ones, steps], dim=-1)
+            composite = accumulate_along_rays(weights, ray_indices, values, num_rays)
+            comp_rgb, accumulation, comp_depth = composite[..., :3], composite[..., 3:4], composite[..., 4:]
+        else:
+            comp_rgb, comp_depth, accumulation = _CompositeRGBDepthAccumulation.apply(weights, rgb, steps)
+
+        comp_rgb = RGBRenderer.blend_background(
+            comp_rgb, accumulation, rgb, self.background_color, ray_indices, num_rays
+        )
+        if not self.training:
+            torch.clamp_(comp_rgb, min=0.0, max=1.0)
+
+        if steps is not None:
+            depth = torch.clip(comp_depth / (accumulation + 1e-10), steps.min(), steps.max())
+        else:
+            depth = self.renderer_depth(weights, ray_samples, ray_indices=ray_indices, num_rays=num_rays)
+
+        return comp_rgb, depth, accumulation
+
+
 class UncertaintyRenderer(nn.Module):
     """Calculate uncertainty along the ray."""
 
@@ -303,7 +471,18 @@ class NormalsRenderer(nn.Module):
         cls,
         normals: TensorType["bs":..., "num_samples", 3],
         weights: TensorType["bs":..., "num_samples", 1],
-    ) -> TensorType["bs":..., 3]:
-        """Calculate normals along the ray."""
+        ray_indices: Optional[TensorType["num_samples"]] = None,
+        num_rays: Optional[int] = None,
+    ) -> TensorType[..., 3]:
+        """Calculate normals along the ray.
+
+        Args:
+            normals: Normals for each sample.
+            weights: Weights of each sample.
+            ray_indices: Ray index for each sample, used when samples are packed.
+            num_rays: Number of rays, used when samples are packed.
+        """
+        if ray_indices is not None and num_rays is not None:
+            return accumulate_along_rays(weights, ray_indices, normals, num_rays)
         n = torch.sum(weights * normals, dim=-2)
         return n
@@ -19,7 +19,7 @@ Base Model implementation which takes in RayBundles
 from __future__ import annotations
 
 from abc import abstractmethod
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple, Type
 
@@ -50,6 +50,19 @@ class ModelConfig(InstantiateConfig):
     """parameters to instantiate density field with"""
     eval_num_rays_per_chunk: int = 4096
     """specifies number of rays per chunk during eval"""
+    eval_adaptive_chunk_size: bool = False
+    """whether to resize the eval chunks to fit the free GPU memory, starting from eval_num_rays_per_chunk"""
+    eval_max_num_rays_per_chunk: int = 1 << 20
+    """upper bound on the number of rays per chunk during eval when the chunk size is adaptive"""
+    eval_memory_fraction: float = 0.8
+    """fraction of the free GPU memory that an adaptive eval chunk may use"""
+    eval_num_cpu_workers: int = 1
+    """number of chunks rendered in parallel during eval on the CPU, the torch threads are split between them"""
+    eval_cpu_bf16: bool = False
+    """whether to render in bfloat16 autocast during eval on the CPU"""
+    eval_min_pinned_output_bytes: int = 1 << 20
+    """outputs copied to the CPU during eval are only allocated in pinned memory from this size on, as page locking
+    small buffers costs more than the asynchronous copy saves"""
 
 
 class Model(nn.Module):
@@ -159,31 +172,129 @@ class Model(nn.Module):
         """
 
     @torch.no_grad()
-    def get_outputs_for_camera_ray_bundle(self, camera_ray_bundle: RayBundle) -> Dict[str, torch.Tensor]:
+    def get_outputs_for_camera_ray_bundle(
+        self, camera_ray_bundle: RayBundle, outputs_to_cpu: bool = False
+    ) -> Dict[str, torch.Tensor]:
         """Takes in camera parameters and computes the output of the model.
 
+        The rays are rendered in chunks, and each output is allocated once for the whole image when the first chunk
+        is rendered, with every chunk written into it in place.
+
         Args:
             camera_ray_bundle: ray bundle to calculate outputs over
+            outputs_to_cpu: whether to return the outputs on the CPU. Chunks rendered on the GPU are then copied
+                asynchronously to pinned host memory while the next chunk is rendered.
         """
         num_rays_per_chunk = self.config.eval_num_rays_per_chunk
         image_height, image_width = camera_ray_bundle.origins.shape[:2]
         num_rays = len(camera_ray_bundle)
-        outputs_lists = defaultdict(list)
-        for i in range(0, num_rays, num_rays_per_chunk):
-            start_idx = i
-            end_idx = i + num_rays_per_chunk
-            ray_bundle = camera_ray_bundle.get_row_major_sliced_ray_bundle(start_idx, end_idx)
-            outputs = self.forward(ray_bundle=ray_bundle)
-            for output_name, output in outputs.items():  # type: ignore
-                outputs_lists[output_name].append(output)
-        outputs = {}
-        for output_name, outputs_list in outputs_lists.items():
-            if not torch.is_tensor(outputs_list[0]):
-                # TODO: handle lists of tensors as well
-                continue
-            outputs[output_name] = torch.cat(outputs_list).view(image_height, image_width, -1)  # type: ignore
+        camera_ray_bundle = camera_ray_bundle.flatten()
+        on_cuda = self.device.type == "cuda"
+        if not on_cuda and (self.config.eval_num_cpu_workers > 1 or self.config.eval_cpu_bf16):
+            outputs = self._get_outputs_on_cpu_workers(camera_ray_bundle)
+            return {output_name: output.view(image_height, image_width, -1) for output_name, output in outputs.items()}
+        adaptive_chunk_size = self.config.eval_adaptive_chunk_size and on_cuda
+        outputs: Dict[str, torch.Tensor] = {}
+        start_idx = 0
+        while start_idx < num_rays:
+            end_idx = min(start_idx + num_rays_per_chunk, num_rays)
+            ray_bundle = camera_ray_bundle[start_idx:end_idx]
+            if adaptive_chunk_size:
+                torch.cuda.reset_peak_memory_stats(self.device)
+                memory_before = torch.cuda.memory_allocated(self.device)
+                try:
+                    chunk_outputs = self.forward(ray_bundle=ray_bundle)
+                except RuntimeError as error:
+                    if "out of memory" not in str(error) or num_rays_per_chunk == 1:
+                        raise
+                    # Retry the same rays with a smaller chunk
+                    torch.cuda.empty_cache()
+                    num_rays_per_chunk = max(num_rays_per_chunk // 2, 1)
+                    continue
+            else:
+                chunk_outputs = self.forward(ray_bundle=ray_bundle)
+            for output_name, output in chunk_outputs.items():  # type: ignore
+                if not torch.is_tensor(output):
+                    # TODO: handle lists of tensors as well
+                    continue
+                if output_name not in outputs:
+                    # Pinned buffers come from torch's caching host allocator, so the memory freed by the outputs of
+                    # previous calls is reused rather than page locked again.
+                    output_shape = (num_rays, *output.shape[1:])
+                    num_bytes = num_rays * output[0].numel() * output.element_size()
+                    pin_memory = outputs_to_cpu and output.is_cuda
+                    pin_memory = pin_memory and num_bytes >= self.config.eval_min_pinned_output_bytes
+                    outputs[output_name] = torch.empty(
+                        output_shape,
+                        dtype=output.dtype,
+                        device="cpu" if outputs_to_cpu else output.device,
+                        pin_memory=pin_memory,
+                    )
+                output_buffer = outputs[output_name]
+                output_buffer[start_idx:end_idx].copy_(output, non_blocking=output_buffer.is_pinned())
+            if adaptive_chunk_size:
+                bytes_per_ray = (torch.cuda.max_memory_allocated(self.device) - memory_before) / (end_idx - start_idx)
+                num_rays_per_chunk = self._get_adaptive_num_rays_per_chunk(bytes_per_ray)
+            start_idx = end_idx
+        if outputs_to_cpu and on_cuda:
+            # Wait for the copies to pinned memory to land before handing the outputs out
+            torch.cuda.current_stream(self.device).synchronize()
+        return {output_name: output.view(image_height, image_width, -1) for output_name, output in outputs.items()}
+
+    def _get_outputs_on_cpu_workers(self, camera_ray_bundle: RayBundle) -> Dict[str, torch.Tensor]:
+        """Renders the chunks of a flattened ray bundle on a pool of CPU threads that share the model read-only.
+
+        The torch threads are split evenly between the workers so that the chunks rendered in parallel do not
+        oversubscribe the cores. Every worker renders in inference mode, and in bfloat16 autocast if enabled, in which
+        case the floating point outputs are returned in float32.
+
+        Args:
+            camera_ray_bundle: flattened ray bundle to calculate outputs over
+        """
+        num_rays = len(camera_ray_bundle)
+        num_workers = max(min(self.config.eval_num_cpu_workers, num_rays), 1)
+        # Every worker gets at least one chunk
+        num_rays_per_chunk = min(self.config.eval_num_rays_per_chunk, -(-num_rays // num_workers))
+        num_threads = torch.get_num_threads()
+        num_threads_per_worker = max(num_threads // num_workers, 1)
+
+        def render_chunk(start_idx: int) -> Dict[str, torch.Tensor]:
+            ray_bundle = camera_ray_bundle[start_idx : start_idx + num_rays_per_chunk]
+            with torch.inference_mode(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=self.config.eval_cpu_bf16):
+                return self.forward(ray_bundle=ray_bundle)
+
+        outputs: Dict[str, torch.Tensor] = {}
+        start_indices = range(0, num_rays, num_rays_per_chunk)
+        try:
+            with ThreadPoolExecutor(
+                max_workers=num_workers, initializer=torch.set_num_threads, initargs=(num_threads_per_worker,)
+            ) as executor:
+                # Chunks are written in order as they come back, while the workers render the next ones
+                for start_idx, chunk_outputs in zip(start_indices, executor.map(render_chunk, start_indices)):
+                    for output_name, output in chunk_outputs.items():
+                        if not torch.is_tensor(output):
+                            continue
+                        if output_name not in outputs:
+                            dtype = torch.float32 if output.dtype == torch.bfloat16 else output.dtype
+                            outputs[output_name] = torch.empty((num_rays, *output.shape[1:]), dtype=dtype)
+                        outputs[output_name][start_idx : start_idx + len(output)].copy_(output)
+        finally:
+            # The thread count is process wide with some parallel backends
+            torch.set_num_threads(num_threads)
         return outputs
 
+    def _get_adaptive_num_rays_per_chunk(self, bytes_per_ray: float) -> int:
+        """Returns the number of rays per chunk that fits in the free GPU memory.
+
+        Args:
+            bytes_per_ray: Peak memory used per ray by the last chunk, on top of what was allocated before it.
+        """
+        free_memory, _ = torch.cuda.mem_get_info(self.device)
+        # Memory cached by the allocator but not in use is free for us as well
+        free_memory += torch.cuda.memory_reserved(self.device) - torch.cuda.memory_allocated(self.device)
+        num_rays_per_chunk = int(free_memory * self.config.eval_memory_fraction / max(bytes_per_ray, 1.0))
+        return min(max(num_rays_per_chunk, 1), self.config.eval_max_num_rays_per_chunk)
+
     @abstractmethod
     def get_image_metrics_and_images(
         self, outputs: Dict[str, torch.Tensor], batch: Dict[str, torch.Tensor]
@@ -38,7 +38,7 @@ from nerfstudio.engine.callbacks import (
 )
 from nerfstudio.field_components.field_heads import FieldHeadNames
 from nerfstudio.fields.instant_ngp_field import TCNNInstantNGPField
-from nerfstudio.model_components.losses import MSELoss
+from nerfstudio.model_components.losses import weighted_rgb_loss
 from nerfstudio.model_components.ray_samplers import VolumetricSampler
 from nerfstudio.model_components.renderers import (
     AccumulationRenderer,
@@ -132,7 +132,6 @@ class NGPModel(Model):
         self.renderer_depth = DepthRenderer(method="expected")
 
         # losses
-        self.rgb_loss = MSELoss()
 
         # metrics
         self.psnr = PeakSignalNoiseRatio(data_range=1.0)
@@ -219,7 +218,8 @@ class NGPModel(Model):
     def get_loss_dict(self, outputs, batch, metrics_dict=None):
         image = batch["image"].to(self.device)
         mask = outputs["alive_ray_mask"]
-        rgb_loss = self.rgb_loss(image[mask], outputs["rgb"][mask])
+        loss_weights = batch["loss_weights"].to(self.device)[mask] if "loss_weights" in batch else None
+        rgb_loss = weighted_rgb_loss(image[mask], outputs["rgb"][mask], loss_weights)
         loss_dict = {"rgb_loss": rgb_loss}
         return loss_dict
 
@@ -40,18 +40,22 @@ from nerfstudio.field_components.spatial_distortions import SceneContraction
 from nerfstudio.fields.density_fields import HashMLPDensityField
 from nerfstudio.fields.nerfacto_field import TCNNNerfactoField
 from nerfstudio.model_components.losses import (
-    MSELoss,
     distortion_loss,
     interlevel_loss,
     orientation_loss,
     pred_normal_loss,
+    weighted_rgb_loss,
+)
+from nerfstudio.model_components.occupancy_grids import BakedOccupancyGrid
+from nerfstudio.model_components.ray_samplers import (
+    ProposalNetworkSampler,
+    pack_ray_samples,
+    unpack_sample_values,
 )
-from nerfstudio.model_components.ray_samplers import ProposalNetworkSampler
 from nerfstudio.model_components.renderers import (
-    AccumulationRenderer,
+    CompositeRenderer,
     DepthRenderer,
     NormalsRenderer,
-    RGBRenderer,
 )
 from nerfstudio.model_components.scene_colliders import NearFarCollider
 from nerfstudio.models.base_model import Model, ModelConfig
@@ -114,6 +118,15 @@ class NerfactoModelConfig(ModelConfig):
     """Whether use single jitter or not for the proposal networks."""
     predict_normals: bool = False
     """Whether to predict normals or not."""
+    min_proposal_weight: float = 0.0
+    """NeRF samples in a bin of the last proposal network with a lower weight are dropped before querying the field,
+    and the remaining samples are rendered packed. Disabled if 0."""
+    inference_min_transmittance: float = 0.0
+    """At inference only, NeRF samples behind the point where the transmittance estimated by the last proposal
+    network drops below this are dropped before querying the field, terminating the rays early. Disabled if 0."""
+    occupancy_grid_resolution: int = 128
+    """Resolution of the occupancy grid baked from the proposal networks with ns-bake-occupancy. Once it is baked, the
+    proposal networks are only queried in occupied cells at inference."""
 
 
 class NerfactoModel(Model):
@@ -164,6 +177,10 @@ class NerfactoModel(Model):
                 self.proposal_networks.append(network)
             self.density_fns.extend([network.density_fn for network in self.proposal_networks])
 
+        self.occupancy_grid = BakedOccupancyGrid(
+            self.scene_box.aabb, resolution=self.config.occupancy_grid_resolution, spatial_distortion=scene_contraction
+        )
+
         # Samplers
         update_schedule = lambda step: np.clip(
             np.interp(step, [0, self.config.proposal_warmup], [0, self.config.proposal_update_every]),
@@ -182,13 +199,11 @@ class NerfactoModel(Model):
         self.collider = NearFarCollider(near_plane=self.config.near_plane, far_plane=self.config.far_plane)
 
         # renderers
-        self.renderer_rgb = RGBRenderer(background_color=self.config.background_color)
-        self.renderer_accumulation = AccumulationRenderer()
+        self.renderer_composite = CompositeRenderer(background_color=self.config.background_color)
         self.renderer_depth = DepthRenderer()
         self.renderer_normals = NormalsRenderer()
 
         # losses
-        self.rgb_loss = MSELoss()
 
         # metrics
         self.psnr = PeakSignalNoiseRatio(data_range=1.0)
@@ -233,25 +248,52 @@ class NerfactoModel(Model):
         return callbacks
 
     def get_outputs(self, ray_bundle: RayBundle):
-        ray_samples, weights_list, ray_samples_list = self.proposal_sampler(ray_bundle, density_fns=self.density_fns)
-        field_outputs = self.field(ray_samples, compute_normals=self.config.predict_normals)
-        weights = ray_samples.get_weights(field_outputs[FieldHeadNames.DENSITY])
-        weights_list.append(weights)
+        density_fns = self.density_fns
+        if not self.training and self.occupancy_grid.is_baked:
+            density_fns = [self.occupancy_grid.mask_density_fn(density_fn) for density_fn in density_fns]
+        ray_samples, weights_list, ray_samples_list = self.proposal_sampler(ray_bundle, density_fns=density_fns)
         ray_samples_list.append(ray_samples)
+        min_transmittance = 0.0 if self.training else self.config.inference_min_transmittance
+        packed = self.config.min_proposal_weight > 0.0 or min_transmittance > 0.0
+        if packed:
+            # Only query the field on the samples the proposal networks consider occupied and visible
+            sample_mask = self.proposal_sampler.get_sample_mask(
+                ray_samples,
+                weights_list,
+                ray_samples_list,
+                min_proposal_weight=self.config.min_proposal_weight,
+                min_transmittance=min_transmittance,
+            )
+            ray_samples, packed_info, ray_indices = pack_ray_samples(ray_samples, sample_mask)
+            render_kwargs = {"ray_indices": ray_indices, "num_rays": len(ray_bundle)}
+        else:
+            render_kwargs = {}
+        field_outputs = self.field(ray_samples, compute_normals=self.config.predict_normals)
+        if packed:
+            weights = ray_samples.get_weights_packed(field_outputs[FieldHeadNames.DENSITY], **render_kwargs)
+            # The losses work on all samples of each ray, where the dropped samples have no weight
+            weights_list.append(unpack_sample_values(weights, sample_mask))
+        else:
+            weights = ray_samples.get_weights(field_outputs[FieldHeadNames.DENSITY])
+            weights_list.append(weights)
 
-        rgb = self.renderer_rgb(rgb=field_outputs[FieldHeadNames.RGB], weights=weights)
-        depth = self.renderer_depth(weights=weights, ray_samples=ray_samples)
-        accumulation = self.renderer_accumulation(weights=weights)
+        rgb, depth, accumulation = self.renderer_composite(
+            rgb=field_outputs[FieldHeadNames.RGB], weights=weights, ray_samples=ray_samples, **render_kwargs
+        )
 
         outputs = {
             "rgb": rgb,
             "accumulation": accumulation,
             "depth": depth,
         }
+        if packed:
+            outputs["num_samples_per_ray"] = packed_info[:, 1:]
 
         if self.config.predict_normals:
-            outputs["normals"] = self.renderer_normals(normals=field_outputs[FieldHeadNames.NORMALS], weights=weights)
-            outputs["pred_normals"] = self.renderer_normals(field_outputs[FieldHeadNames.PRED_NORMALS], weights=weights)
+            normals = field_outputs[FieldHeadNames.NORMALS]
+            pred_normals = field_outputs[FieldHeadNames.PRED_NORMALS]
+            outputs["normals"] = self.renderer_normals(normals=normals, weights=weights, **render_kwargs)
+            outputs["pred_normals"] = self.renderer_normals(pred_normals, weights=weights, **render_kwargs)
 
         # These use a lot of GPU memory, so we avoid storing them for eval.
         if self.training:
@@ -259,15 +301,13 @@ class NerfactoModel(Model):
             outputs["ray_samples_list"] = ray_samples_list
 
         if self.training and self.config.predict_normals:
-            outputs["rendered_orientation_loss"] = orientation_loss(
-                weights.detach(), field_outputs[FieldHeadNames.NORMALS], ray_bundle.directions
-            )
+            if packed:
+                weights = weights_list[-1]
+                normals = unpack_sample_values(normals, sample_mask)
+                pred_normals = unpack_sample_values(pred_normals, sample_mask)
+            outputs["rendered_orientation_loss"] = orientation_loss(weights.detach(), normals, ray_bundle.directions)
 
-            outputs["rendered_pred_normal_loss"] = pred_normal_loss(
-                weights.detach(),
-                field_outputs[FieldHeadNames.NORMALS].detach(),
-                field_outputs[FieldHeadNames.PRED_NORMALS],
-            )
+            outputs["rendered_pred_normal_loss"] = pred_normal_loss(weights.detach(), normals.detach(), pred_normals)
 
         for i in range(self.config.num_proposal_iterations):
             outputs[f"prop_depth_{i}"] = self.renderer_depth(weights=weights_list[i], ray_samples=ray_samples_list[i])
@@ -285,7 +325,7 @@ class NerfactoModel(Model):
     def get_loss_dict(self, outputs, batch, metrics_dict=None):
         loss_dict = {}
         image = batch["image"].to(self.device)
-        loss_dict["rgb_loss"] = self.rgb_loss(image, outputs["rgb"])
+        loss_dict["rgb_loss"] = weighted_rgb_loss(image, outputs["rgb"], batch.get("loss_weights"))
         if self.training:
             loss_dict["interlevel_loss"] = self.config.interlevel_loss_mult * interlevel_loss(
                 outputs["weights_list"], outputs["ray_samples_list"]
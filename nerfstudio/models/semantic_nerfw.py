@@ -39,7 +39,7 @@ from nerfstudio.field_components.field_heads import FieldHeadNames
 from nerfstudio.field_components.spatial_distortions import SceneContraction
 from nerfstudio.fields.density_fields import HashMLPDensityField
 from nerfstudio.fields.nerfacto_field import TCNNNerfactoField
-from nerfstudio.model_components.losses import MSELoss, distortion_loss, interlevel_loss
+from nerfstudio.model_components.losses import distortion_loss, interlevel_loss, weighted_rgb_loss
 from nerfstudio.model_components.ray_samplers import ProposalNetworkSampler
 from nerfstudio.model_components.renderers import (
     AccumulationRenderer,
@@ -131,7 +131,6 @@ class SemanticNerfWModel(Model):
         self.renderer_semantics = SemanticRenderer()
 
         # losses
-        self.rgb_loss = MSELoss()
         self.cross_entropy_loss = torch.nn.CrossEntropyLoss(reduction="mean")
 
         # metrics
@@ -238,9 +237,12 @@ class SemanticNerfWModel(Model):
             betas = outputs["uncertainty"]
             loss_dict["uncertainty_loss"] = 3 + torch.log(betas).mean()
             loss_dict["density_loss"] = 0.01 * outputs["density_transient"].mean()
-            loss_dict["rgb_loss"] = (((image - outputs["rgb"]) ** 2).sum(-1) / (betas[..., 0] ** 2)).mean()
+            rgb_loss = ((image - outputs["rgb"]) ** 2).sum(-1) / (betas[..., 0] ** 2)
+            if "loss_weights" in batch:
+                rgb_loss = batch["loss_weights"].to(self.device) * rgb_loss
+            loss_dict["rgb_loss"] = rgb_loss.mean()
         else:
-            loss_dict["rgb_loss"] = self.rgb_loss(image, outputs["rgb"])
+            loss_dict["rgb_loss"] = weighted_rgb_loss(image, outputs["rgb"], batch.get("loss_weights"))
 
         # semantic loss
         loss_dict["semantics_loss"] = self.cross_entropy_loss(outputs["semantics"], batch["semantics"][..., 0].long())
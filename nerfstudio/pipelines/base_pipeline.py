@@ -43,6 +43,7 @@ from nerfstudio.data.datamanagers.base_datamanager import (
     VanillaDataManager,
     VanillaDataManagerConfig,
 )
+from nerfstudio.data.pixel_samplers import ImportancePixelSampler
 from nerfstudio.engine.callbacks import TrainingCallback, TrainingCallbackAttributes
 from nerfstudio.models.base_model import Model, ModelConfig
 from nerfstudio.utils import profiler
@@ -255,6 +256,13 @@ class VanillaPipeline(Pipeline):
         model_outputs = self.model(ray_bundle)
         metrics_dict = self.model.get_metrics_dict(model_outputs, batch)
 
+        train_pixel_sampler = getattr(self.datamanager, "train_pixel_sampler", None)
+        if isinstance(train_pixel_sampler, ImportancePixelSampler):
+            # Feed the per-ray rgb error back to the sampler
+            rgb = model_outputs["rgb"] if "rgb" in model_outputs else model_outputs["rgb_fine"]
+            errors = torch.mean((rgb.detach() - batch["image"].to(rgb.device)) ** 2, dim=-1)
+            train_pixel_sampler.update_error_map(batch["indices"], errors)
+
         camera_opt_param_group = self.config.datamanager.camera_optimizer.param_group
         if camera_opt_param_group in self.datamanager.get_param_groups():
             # Report the camera optimization metrics
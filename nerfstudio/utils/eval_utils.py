@@ -69,6 +69,7 @@ def eval_setup(
     config_path: Path,
     eval_num_rays_per_chunk: Optional[int] = None,
     test_mode: Literal["test", "val", "inference"] = "test",
+    device: Optional[str] = None,
 ) -> Tuple[ExperimentConfig, Pipeline, Path]:
     """Shared setup for loading a saved pipeline for evaluation.
 
@@ -79,7 +80,7 @@ def eval_setup(
             'val': loads train/val datasets into memory
             'test': loads train/test datset into memory
             'inference': does not load any dataset into memory
-
+        device: Device to load the pipeline on. Uses the GPU if one is available when None.
 
     Returns:
         Loaded config, pipeline module, and corresponding checkpoint.
@@ -97,8 +98,9 @@ def eval_setup(
     config.pipeline.datamanager.eval_image_indices = None
 
     # setup pipeline (which includes the DataManager)
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    pipeline = config.pipeline.setup(device=device, test_mode=test_mode)
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    pipeline = config.pipeline.setup(device=torch.device(device), test_mode=test_mode)
     assert isinstance(pipeline, Pipeline)
     pipeline.eval()
 
@@ -15,8 +15,11 @@
 """ Math Helper Functions """
 
 from dataclasses import dataclass
+from typing import Tuple
 
 import torch
+from torch.autograd import Function
+from torch.cuda.amp import custom_bwd, custom_fwd
 from torchtyping import TensorType
 
 
@@ -191,3 +194,71 @@ def expected_sin(x_means: torch.Tensor, x_vars: torch.Tensor) -> torch.Tensor:
     """
 
     return torch.exp(-0.5 * x_vars) * torch.sin(x_means)
+
+
+def packed_to_padded(
+    values: TensorType["num_samples", "dim"], ray_indices: TensorType["num_samples"], num_rays: int
+) -> Tuple[TensorType["num_rays", "max_num_samples", "dim"], TensorType["num_samples"]]:
+    """Scatters the values of packed samples into a zero padded tensor with one row per ray.
+
+    Args:
+        values: Values of the packed samples.
+        ray_indices: Ray index of each sample. The samples of a ray must be contiguous and in order along the ray.
+        num_rays: Number of rays.
+
+    Returns:
+        The padded values, and the position of each sample along its ray, which indexes it in the padded values.
+    """
+    num_samples_per_ray = torch.bincount(ray_indices, minlength=num_rays)
+    ray_starts = torch.cumsum(num_samples_per_ray, dim=0) - num_samples_per_ray
+    sample_offsets = torch.arange(len(ray_indices), device=ray_indices.device) - ray_starts[ray_indices]
+    max_num_samples = int(num_samples_per_ray.max()) if num_rays > 0 else 0
+    padded_values = values.new_zeros((num_rays, max_num_samples, values.shape[-1]))
+    padded_values = padded_values.index_put((ray_indices, sample_offsets), values)
+    return padded_values, sample_offsets
+
+
+class _VolumeRenderingWeights(Function):  # pylint: disable=abstract-method
+    """Volume rendering weights computed from the optical depth of the samples, in one op.
+
+    Only the optical depths are saved for backward. The transmittance is recomputed in backward instead of storing
+    the alphas, the accumulated optical depth and the transmittance of every sample.
+    """
+
+    @staticmethod
+    def _transmittance(delta_density: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the transmittance before and after each sample."""
+        transmittance_after = torch.exp(-torch.cumsum(delta_density, dim=-2))
+        transmittance = torch.nn.functional.pad(transmittance_after[..., :-1, :], (0, 0, 1, 0), value=1.0)
+        return transmittance, transmittance_after
+
+    @staticmethod
+    @custom_fwd(cast_inputs=torch.float32)
+    def forward(ctx, delta_density: torch.Tensor) -> torch.Tensor:  # pylint: disable=arguments-differ
+        ctx.save_for_backward(delta_density)
+        transmittance, _ = _VolumeRenderingWeights._transmittance(delta_density)
+        return transmittance * -torch.expm1(-delta_density)
+
+    @staticmethod
+    @custom_bwd
+    def backward(ctx, grad_weights: torch.Tensor) -> torch.Tensor:  # pylint: disable=arguments-differ
+        (delta_density,) = ctx.saved_tensors
+        transmittance, transmittance_after = _VolumeRenderingWeights._transmittance(delta_density)
+        weighted_grads = grad_weights * transmittance * -torch.expm1(-delta_density)
+        # The optical depth of a sample attenuates all of the samples behind it
+        grads_behind = torch.cumsum(weighted_grads.flip(-2), dim=-2).flip(-2) - weighted_grads
+        return grad_weights * transmittance_after - grads_behind
+
+
+def volume_rendering_weights(delta_density: TensorType[..., "num_samples", 1]) -> TensorType[..., "num_samples", 1]:
+    """Computes the volume rendering weights of samples along rays, with a fused backward pass.
+
+    The weight of sample i is (1 - exp(-delta_density_i)) * exp(-sum_{j<i} delta_density_j).
+
+    Args:
+        delta_density: Optical depth of each sample, i.e. its density times its length.
+
+    Returns:
+        Weights for each sample.
+    """
+    return _VolumeRenderingWeights.apply(delta_density)
@@ -22,6 +22,7 @@ from rich.progress import (
     BarColumn,
     Progress,
     ProgressColumn,
+    Task,
     TaskProgressColumn,
     TextColumn,
     TimeRemainingColumn,
@@ -38,7 +39,7 @@ class ItersPerSecColumn(ProgressColumn):
         super().__init__()
         self.suffix = suffix
 
-    def render(self, task: "Task") -> Text:
+    def render(self, task: Task) -> Text:
         """Show data transfer speed."""
         speed = task.finished_speed or task.speed
         if speed is None:
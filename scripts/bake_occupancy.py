@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+bake_occupancy.py
+"""
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import torch
+import tyro
+from rich.console import Console
+
+from nerfstudio.model_components.occupancy_grids import BakedOccupancyGrid
+from nerfstudio.utils.eval_utils import eval_setup
+
+CONSOLE = Console(width=120)
+
+
+@dataclass
+class BakeOccupancy:
+    """Load a checkpoint, bake the occupancy grid of its proposal networks, and save it back into the checkpoint."""
+
+    # Path to config YAML file.
+    load_config: Path
+    # Path to save the checkpoint with the baked grid to. Overwrites the loaded checkpoint if None.
+    output_path: Optional[Path] = None
+    # Smallest proposal density of an occupied cell.
+    density_threshold: float = 0.01
+    # Number of points at which the proposal networks are probed in each cell.
+    num_samples_per_cell: int = 8
+
+    def main(self) -> None:
+        """Main function."""
+        _, pipeline, checkpoint_path = eval_setup(self.load_config, test_mode="inference")
+        model = pipeline.model
+        occupancy_grid = getattr(model, "occupancy_grid", None)
+        if not isinstance(occupancy_grid, BakedOccupancyGrid):
+            CONSOLE.print(f"[bold red]{type(model).__name__} has no occupancy grid to bake.")
+            sys.exit(1)
+
+        occupancy_grid.bake(
+            model.density_fns,
+            density_threshold=self.density_threshold,
+            num_samples_per_cell=self.num_samples_per_cell,
+        )
+        num_occupied = sum(bin(byte).count("1") for byte in occupancy_grid.bitfield.tolist())
+        CONSOLE.print(f"{num_occupied / occupancy_grid.resolution**3:.1%} of the occupancy grid cells are occupied")
+
+        # Only the grid is updated, the rest of the checkpoint is kept as is.
+        loaded_state = torch.load(checkpoint_path, map_location="cpu")
+        for name, module in model.named_modules():
+            if isinstance(module, BakedOccupancyGrid):
+                loaded_state["pipeline"][f"_model.{name}.bitfield"] = module.bitfield.cpu()
+        output_path = checkpoint_path if self.output_path is None else self.output_path
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        torch.save(loaded_state, output_path)
+        CONSOLE.print(f"Saved the checkpoint with the baked occupancy grid to: {output_path}")
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BakeOccupancy).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
+
+# For sphinx docs
+get_parser_fn = lambda: tyro.extras.get_parser(BakeOccupancy)  # noqa
@@ -0,0 +1,95 @@
+"""
+Benchmark of the rendering throughput on the CPU against the number of workers rendering chunks in parallel.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import torch
+import tyro
+from rich.console import Console
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.configs.method_configs import method_configs
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.models.base_model import Model
+from nerfstudio.utils.eval_utils import eval_setup
+
+CONSOLE = Console(width=120)
+
+
+@dataclass
+class BenchmarkCPURendering:
+    """Time the rendering of a camera on the CPU with an increasing number of workers."""
+
+    load_config: Optional[Path] = None
+    """Config of a trained model to render. A randomly initialized model of the given method is rendered if None."""
+    method: str = "vanilla-nerf"
+    """Method of the randomly initialized model. Its fields have to run without tiny-cuda-nn."""
+    image_size: int = 128
+    """Width and height of the rendered image."""
+    num_workers: Tuple[int, ...] = ()
+    """Numbers of workers to time. Powers of two up to the number of cores if empty."""
+    bf16: bool = False
+    """Whether to also time every number of workers in bfloat16."""
+    num_iters: int = 3
+    """Number of timed renders per case."""
+
+    def _setup_model(self) -> Model:
+        """Returns the model to render on the CPU."""
+        if self.load_config is not None:
+            _, pipeline, _ = eval_setup(self.load_config, test_mode="inference", device="cpu")
+            return pipeline.model
+        scene_box = SceneBox(aabb=torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]]))
+        model = method_configs[self.method].pipeline.model.setup(scene_box=scene_box, num_train_data=1)
+        return model.eval()
+
+    def main(self) -> None:
+        """Run the benchmark"""
+        model = self._setup_model()
+        cameras = Cameras(
+            camera_to_worlds=torch.tensor([[[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 4.0]]]),
+            fx=float(self.image_size),
+            fy=float(self.image_size),
+            cx=self.image_size / 2,
+            cy=self.image_size / 2,
+            width=self.image_size,
+            height=self.image_size,
+        )
+        camera_ray_bundle = cameras.generate_rays(camera_indices=0)
+        num_workers = self.num_workers
+        if not num_workers:
+            num_cores = os.cpu_count() or 1
+            num_workers = tuple(2**i for i in range(num_cores.bit_length()))
+
+        base_rays_per_sec = None
+        for bf16 in (False, True) if self.bf16 else (False,):
+            for workers in num_workers:
+                model.config.eval_num_cpu_workers = workers
+                model.config.eval_cpu_bf16 = bf16
+                model.get_outputs_for_camera_ray_bundle(camera_ray_bundle)  # warm up
+                start = time.perf_counter()
+                for _ in range(self.num_iters):
+                    model.get_outputs_for_camera_ray_bundle(camera_ray_bundle)
+                rays_per_sec = len(camera_ray_bundle) * self.num_iters / (time.perf_counter() - start)
+                if base_rays_per_sec is None:
+                    base_rays_per_sec = rays_per_sec
+                CONSOLE.print(
+                    f"{workers:>3} workers{' bf16' if bf16 else '     '}: {rays_per_sec:12.0f} rays/s, "
+                    f"speedup {rays_per_sec / base_rays_per_sec:5.2f}x"
+                )
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkCPURendering).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
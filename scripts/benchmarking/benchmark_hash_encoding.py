@@ -0,0 +1,129 @@
+"""
+Microbenchmark comparing the torch HashEncoding against its previous per-corner implementation.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import torch
+import tyro
+from rich.console import Console
+
+from nerfstudio.field_components.encodings import HashEncoding
+
+CONSOLE = Console(width=120)
+
+
+def reference_pytorch_fwd(encoding: HashEncoding, in_tensor: torch.Tensor) -> torch.Tensor:
+    """The previous torch implementation, which hashes and interpolates the 8 cell corners one by one."""
+
+    def hash_fn(in_tensor):
+        in_tensor = in_tensor * torch.tensor([1, 2654435761, 805459861]).to(in_tensor.device)
+        x = torch.bitwise_xor(in_tensor[..., 0], in_tensor[..., 1])
+        x = torch.bitwise_xor(x, in_tensor[..., 2])
+        x %= encoding.hash_table_size
+        x += encoding.hash_offset.to(x.device)
+        return x
+
+    in_tensor = in_tensor[..., None, :]  # [..., 1, 3]
+    scaled = in_tensor * encoding.scalings.view(-1, 1).to(in_tensor.device)  # [..., L, 3]
+    scaled_c = torch.ceil(scaled).type(torch.int32)
+    scaled_f = torch.floor(scaled).type(torch.int32)
+
+    offset = scaled - scaled_f
+
+    hashed_0 = hash_fn(scaled_c)  # [..., num_levels]
+    hashed_1 = hash_fn(torch.cat([scaled_c[..., 0:1], scaled_f[..., 1:2], scaled_c[..., 2:3]], dim=-1))
+    hashed_2 = hash_fn(torch.cat([scaled_f[..., 0:1], scaled_f[..., 1:2], scaled_c[..., 2:3]], dim=-1))
+    hashed_3 = hash_fn(torch.cat([scaled_f[..., 0:1], scaled_c[..., 1:2], scaled_c[..., 2:3]], dim=-1))
+    hashed_4 = hash_fn(torch.cat([scaled_c[..., 0:1], scaled_c[..., 1:2], scaled_f[..., 2:3]], dim=-1))
+    hashed_5 = hash_fn(torch.cat([scaled_c[..., 0:1], scaled_f[..., 1:2], scaled_f[..., 2:3]], dim=-1))
+    hashed_6 = hash_fn(scaled_f)
+    hashed_7 = hash_fn(torch.cat([scaled_f[..., 0:1], scaled_c[..., 1:2], scaled_f[..., 2:3]], dim=-1))
+
+    f_0 = encoding.hash_table[hashed_0]  # [..., num_levels, features_per_level]
+    f_1 = encoding.hash_table[hashed_1]
+    f_2 = encoding.hash_table[hashed_2]
+    f_3 = encoding.hash_table[hashed_3]
+    f_4 = encoding.hash_table[hashed_4]
+    f_5 = encoding.hash_table[hashed_5]
+    f_6 = encoding.hash_table[hashed_6]
+    f_7 = encoding.hash_table[hashed_7]
+
+    f_03 = f_0 * offset[..., 0:1] + f_3 * (1 - offset[..., 0:1])
+    f_12 = f_1 * offset[..., 0:1] + f_2 * (1 - offset[..., 0:1])
+    f_56 = f_5 * offset[..., 0:1] + f_6 * (1 - offset[..., 0:1])
+    f_47 = f_4 * offset[..., 0:1] + f_7 * (1 - offset[..., 0:1])
+
+    f0312 = f_03 * offset[..., 1:2] + f_12 * (1 - offset[..., 1:2])
+    f4756 = f_47 * offset[..., 1:2] + f_56 * (1 - offset[..., 1:2])
+
+    encoded_value = f0312 * offset[..., 2:3] + f4756 * (1 - offset[..., 2:3])  # [..., num_levels, features_per_level]
+
+    return torch.flatten(encoded_value, start_dim=-2, end_dim=-1)  # [..., num_levels * features_per_level]
+
+
+@dataclass
+class BenchmarkHashEncoding:
+    """Time the forward and backward passes of the torch HashEncoding against its previous implementation."""
+
+    num_points: int = 1 << 18
+    """Number of points encoded per call."""
+    num_levels: int = 16
+    """Number of levels of the encoding."""
+    log2_hashmap_size: int = 19
+    """Size of the hash map of each level."""
+    chunk_size: Optional[int] = None
+    """Number of points encoded at once by the new implementation."""
+    num_iters: int = 10
+    """Number of timed calls per case."""
+    device: str = "cuda" if torch.cuda.is_available() else "cpu"
+    """Device to encode the points on."""
+
+    def _time(self, fn: Callable[[], object]) -> float:
+        """Returns the average time of a call to fn in milliseconds."""
+        fn()  # warm up
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(self.num_iters):
+            fn()
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        return (time.perf_counter() - start) / self.num_iters * 1000
+
+    def main(self) -> None:
+        """Run the benchmark"""
+        encoding = HashEncoding(
+            num_levels=self.num_levels,
+            log2_hashmap_size=self.log2_hashmap_size,
+            implementation="torch",
+            chunk_size=self.chunk_size,
+        ).to(self.device)
+        in_tensor = torch.rand((self.num_points, 3), device=self.device)
+
+        max_error = (encoding(in_tensor) - reference_pytorch_fwd(encoding, in_tensor)).abs().max().item()
+        CONSOLE.print(f"Largest difference to the previous implementation: {max_error:.3g}")
+
+        implementations = {
+            "previous": lambda: reference_pytorch_fwd(encoding, in_tensor),
+            "vectorized": lambda: encoding(in_tensor),
+        }
+        for name, encode in implementations.items():
+            with torch.no_grad():
+                forward_ms = self._time(encode)
+            backward_ms = self._time(lambda: encode().sum().backward())  # pylint: disable=cell-var-from-loop
+            CONSOLE.print(f"{name:>10}: forward {forward_ms:9.3f} ms, forward and backward {backward_ms:9.3f} ms")
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkHashEncoding).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
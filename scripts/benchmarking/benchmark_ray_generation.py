@@ -0,0 +1,91 @@
+"""
+Microbenchmark comparing the fast and generic paths of Cameras.generate_rays.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import torch
+import tyro
+from rich.console import Console
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.cameras.lie_groups import exp_map_SO3xR3
+
+CONSOLE = Console(width=120)
+
+
+@dataclass
+class BenchmarkRayGeneration:
+    """Time full image and batched ray generation with and without the fast path."""
+
+    num_cameras: int = 100
+    """Number of cameras."""
+    image_height: int = 800
+    """Height of the images."""
+    image_width: int = 800
+    """Width of the images."""
+    num_rays: int = 4096
+    """Number of rays per batch, as used in a training step."""
+    num_iters: int = 50
+    """Number of timed calls per case."""
+    device: str = "cuda"
+    """Device to generate the rays on."""
+
+    def _time(self, fn: Callable[[], object]) -> float:
+        """Returns the average time of a call to fn in milliseconds."""
+        fn()  # warm up and fill the caches
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(self.num_iters):
+            fn()
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        return (time.perf_counter() - start) / self.num_iters * 1000
+
+    def main(self) -> None:
+        """Run the benchmark"""
+        cameras = Cameras(
+            camera_to_worlds=exp_map_SO3xR3(torch.randn((self.num_cameras, 6))),
+            fx=self.image_width * 0.8,
+            fy=self.image_width * 0.8,
+            cx=self.image_width / 2.0,
+            cy=self.image_height / 2.0,
+            width=self.image_width,
+            height=self.image_height,
+            distortion_params=torch.zeros((self.num_cameras, 6)),
+        ).to(self.device)
+        camera_indices = torch.randint(0, self.num_cameras, (self.num_rays, 1), device=self.device)
+        coords = torch.rand((self.num_rays, 2), device=self.device) * torch.tensor(
+            [self.image_height, self.image_width], device=self.device
+        )
+        camera_opt_to_camera = exp_map_SO3xR3(torch.zeros((self.num_rays, 6), device=self.device))
+
+        cases = {
+            "full image": lambda fast_path: cameras.generate_rays(0, fast_path=fast_path),
+            "ray batch": lambda fast_path: cameras.generate_rays(
+                camera_indices, coords, camera_opt_to_camera=camera_opt_to_camera, fast_path=fast_path
+            ),
+        }
+        with torch.no_grad():
+            for name, generate_rays in cases.items():
+                generic_ms = self._time(lambda: generate_rays(False))  # pylint: disable=cell-var-from-loop
+                fast_ms = self._time(lambda: generate_rays(True))  # pylint: disable=cell-var-from-loop
+                CONSOLE.print(
+                    f"{name:>10}: generic {generic_ms:8.3f} ms, fast {fast_ms:8.3f} ms, "
+                    f"speedup {generic_ms / fast_ms:.2f}x"
+                )
+
+
+def entrypoint():
+    """Entrypoint for use with pyproject scripts."""
+    tyro.extras.set_accent_color("bright_yellow")
+    tyro.cli(BenchmarkRayGeneration).main()
+
+
+if __name__ == "__main__":
+    entrypoint()
@@ -29,6 +29,7 @@ ENTRYPOINTS = [
     "ns-train",
     "ns-eval",
     "ns-render",
+    "ns-bake-occupancy",
     "ns-dev-test",
 ]
 
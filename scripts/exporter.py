@@ -17,11 +17,15 @@ from rich.console import Console
 from typing_extensions import Annotated, Literal
 
 from nerfstudio.cameras.rays import RayBundle
-from nerfstudio.exporter import texture_utils, tsdf_utils
+from nerfstudio.exporter import marching_cubes, texture_utils, tsdf_utils
 from nerfstudio.exporter.exporter_utils import (
     generate_point_cloud,
     get_mesh_from_filename,
+    sample_point_cloud,
+    write_point_cloud_ply,
 )
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+from nerfstudio.fields.base_field import Field
 from nerfstudio.pipelines.base_pipeline import Pipeline
 from nerfstudio.utils.eval_utils import eval_setup
 
@@ -62,6 +66,10 @@ class ExportPointCloud(Exporter):
     """Number of rays to evaluate per batch. Decrease if you run out of memory."""
     std_ratio: float = 10.0
     """Threshold based on STD of the average distances across the point cloud to remove outliers."""
+    voxel_size: Optional[float] = 0.005
+    """Only keep one point per voxel of this size, for a uniform density. Every point is kept if None."""
+    min_accumulation: float = 0.5
+    """Smallest accumulation of a ray whose point is kept. The image regions below it are not sampled again."""
 
     def main(self) -> None:
         """Export point cloud."""
@@ -71,8 +79,25 @@ class ExportPointCloud(Exporter):
 
         _, pipeline, _ = eval_setup(self.load_config)
 
-        # Increase the batchsize to speed up the evaluation.
-        pipeline.datamanager.train_pixel_sampler.num_rays_per_batch = self.num_rays_per_batch
+        # Without outlier removal nor normal estimation, the points are written as they are generated.
+        if not self.remove_outliers and not self.estimate_normals:
+            num_points = write_point_cloud_ply(
+                self.output_dir / "point_cloud.ply",
+                sample_point_cloud(
+                    pipeline,
+                    num_points=self.num_points,
+                    rgb_output_name=self.rgb_output_name,
+                    depth_output_name=self.depth_output_name,
+                    min_accumulation=self.min_accumulation,
+                    voxel_size=self.voxel_size,
+                    use_bounding_box=self.use_bounding_box,
+                    bounding_box_min=self.bounding_box_min,
+                    bounding_box_max=self.bounding_box_max,
+                    num_rays_per_batch=self.num_rays_per_batch,
+                ),
+            )
+            CONSOLE.print(f"[bold green]:white_check_mark: Saved a point cloud with {num_points} points")
+            return
 
         pcd = generate_point_cloud(
             pipeline=pipeline,
@@ -86,6 +111,9 @@ class ExportPointCloud(Exporter):
             bounding_box_min=self.bounding_box_min,
             bounding_box_max=self.bounding_box_max,
             std_ratio=self.std_ratio,
+            min_accumulation=self.min_accumulation,
+            voxel_size=self.voxel_size,
+            num_rays_per_batch=self.num_rays_per_batch,
         )
         torch.cuda.empty_cache()
 
@@ -118,6 +146,10 @@ class ExportTSDFMesh(Exporter):
     """Minimum of the bounding box, used if use_bounding_box is True."""
     bounding_box_max: Tuple[float, float, float] = (1, 1, 1)
     """Minimum of the bounding box, used if use_bounding_box is True."""
+    use_sparse_volume: bool = False
+    """Whether to only allocate the blocks of the TSDF volume near the observed surfaces."""
+    block_size: int = 8
+    """Number of voxels along each axis of the blocks of the sparse TSDF volume."""
     texture_method: Literal["tsdf", "nerf"] = "nerf"
     """Method to texture the mesh with. Either 'tsdf' or 'nerf'."""
     px_per_uv_triangle: int = 4
@@ -128,6 +160,8 @@ class ExportTSDFMesh(Exporter):
     """If using xatlas for unwrapping, the pixels per side of the texture image."""
     target_num_faces: Optional[int] = 50000
     """Target number of faces for the mesh to texture."""
+    output_format: Literal["obj", "ply", "glb"] = "obj"
+    """Format of the textured mesh file. The texture is embedded in GLB files."""
 
     def main(self) -> None:
         """Export mesh"""
@@ -148,6 +182,8 @@ class ExportTSDFMesh(Exporter):
             use_bounding_box=self.use_bounding_box,
             bounding_box_min=self.bounding_box_min,
             bounding_box_max=self.bounding_box_max,
+            use_sparse_volume=self.use_sparse_volume,
+            block_size=self.block_size,
         )
 
         # possibly
@@ -166,6 +202,7 @@ class ExportTSDFMesh(Exporter):
                 px_per_uv_triangle=self.px_per_uv_triangle if self.unwrap_method == "custom" else None,
                 unwrap_method=self.unwrap_method,
                 num_pixels_per_side=self.num_pixels_per_side,
+                output_format=self.output_format,
             )
 
 
@@ -207,6 +244,8 @@ class ExportPoissonMesh(Exporter):
     """If using xatlas for unwrapping, the pixels per side of the texture image."""
     target_num_faces: Optional[int] = 50000
     """Target number of faces for the mesh to texture."""
+    output_format: Literal["obj", "ply", "glb"] = "obj"
+    """Format of the textured mesh file. The texture is embedded in GLB files."""
     std_ratio: float = 10.0
     """Threshold based on STD of the average distances across the point cloud to remove outliers."""
 
@@ -244,9 +283,6 @@ class ExportPoissonMesh(Exporter):
         _, pipeline, _ = eval_setup(self.load_config)
         self.validate_pipeline(pipeline)
 
-        # Increase the batchsize to speed up the evaluation.
-        pipeline.datamanager.train_pixel_sampler.num_rays_per_batch = self.num_rays_per_batch
-
         # Whether the normals should be estimated based on the point cloud.
         estimate_normals = self.normal_method == "open3d"
 
@@ -262,6 +298,7 @@ class ExportPoissonMesh(Exporter):
             bounding_box_min=self.bounding_box_min,
             bounding_box_max=self.bounding_box_max,
             std_ratio=self.std_ratio,
+            num_rays_per_batch=self.num_rays_per_batch,
         )
         torch.cuda.empty_cache()
         CONSOLE.print(f"[bold green]:white_check_mark: Generated {pcd}")
@@ -299,19 +336,104 @@ class ExportPoissonMesh(Exporter):
                 px_per_uv_triangle=self.px_per_uv_triangle if self.unwrap_method == "custom" else None,
                 unwrap_method=self.unwrap_method,
                 num_pixels_per_side=self.num_pixels_per_side,
+                output_format=self.output_format,
             )
 
 
 @dataclass
 class ExportMarchingCubesMesh(Exporter):
     """
-    NOT YET IMPLEMENTED
-    Export a mesh using marching cubes.
+    Export a mesh using marching cubes on the density field.
     """
 
+    isosurface_threshold: float = 10.0
+    """Density of the extracted surface."""
+    resolution: int = 64
+    """Resolution of the coarse grid, refined near the surface num_refinement_levels times."""
+    num_refinement_levels: int = 3
+    """Number of times the cells near the surface are split in eight."""
+    block_size: int = 8
+    """Number of cells of the blocks passed to marching cubes along each axis."""
+    use_bounding_box: bool = True
+    """Only query points within the bounding box. The contracted space of the field is meshed otherwise."""
+    bounding_box_min: Tuple[float, float, float] = (-1, -1, -1)
+    """Minimum of the bounding box, used if use_bounding_box is True."""
+    bounding_box_max: Tuple[float, float, float] = (1, 1, 1)
+    """Maximum of the bounding box, used if use_bounding_box is True."""
+    num_points_per_chunk: int = 1 << 18
+    """Number of points the density is evaluated at at once. Decrease if you run out of memory."""
+    num_cpu_workers: int = 1
+    """Number of chunks evaluated in parallel when the model runs on the CPU."""
+    texture_method: Literal["none", "nerf"] = "nerf"
+    """Method to texture the mesh with. Either 'none' or 'nerf'."""
+    px_per_uv_triangle: int = 4
+    """Number of pixels per UV triangle."""
+    unwrap_method: Literal["xatlas", "custom"] = "xatlas"
+    """The method to use for unwrapping the mesh."""
+    num_pixels_per_side: int = 2048
+    """If using xatlas for unwrapping, the pixels per side of the texture image."""
+    target_num_faces: Optional[int] = 50000
+    """Target number of faces for the mesh to texture."""
+    output_format: Literal["obj", "ply", "glb"] = "obj"
+    """Format of the textured mesh file. The texture is embedded in GLB files."""
+
     def main(self) -> None:
         """Export mesh"""
-        raise NotImplementedError("Marching cubes not implemented yet.")
+
+        if not self.output_dir.exists():
+            self.output_dir.mkdir(parents=True)
+
+        _, pipeline, _ = eval_setup(self.load_config, test_mode="inference")
+        density_field = getattr(pipeline.model, "field", None)
+        if not isinstance(density_field, Field):
+            CONSOLE.print(f"[bold red]{type(pipeline.model).__name__} has no density field to mesh.")
+            sys.exit(1)
+
+        spatial_distortion = None
+        if self.use_bounding_box:
+            aabb = torch.tensor([self.bounding_box_min, self.bounding_box_max], dtype=torch.float32)
+        else:
+            spatial_distortion = getattr(density_field, "spatial_distortion", None)
+            if spatial_distortion is not None and not isinstance(spatial_distortion, SceneContraction):
+                CONSOLE.print(f"[bold red]Unsupported spatial distortion {type(spatial_distortion).__name__}.")
+                sys.exit(1)
+            aabb = pipeline.model.scene_box.aabb
+
+        CONSOLE.print("Computing Mesh... this may take a while.")
+        mesh = marching_cubes.generate_mesh_from_density(
+            density_field.density_fn,
+            aabb.to(pipeline.device),
+            spatial_distortion=spatial_distortion,
+            isosurface_threshold=self.isosurface_threshold,
+            resolution=self.resolution,
+            num_refinement_levels=self.num_refinement_levels,
+            block_size=self.block_size,
+            num_points_per_chunk=self.num_points_per_chunk,
+            num_cpu_workers=self.num_cpu_workers,
+        )
+        CONSOLE.print(f"[bold green]:white_check_mark: Computed a mesh with {len(mesh.faces)} faces")
+
+        CONSOLE.print("Saving Mesh...")
+        tsdf_utils.TSDF.export_mesh(mesh, filename=str(self.output_dir / "marching_cubes_mesh.ply"))
+        print("\033[A\033[A")
+        CONSOLE.print("[bold green]:white_check_mark: Saving Mesh")
+
+        # This will texture the mesh with NeRF and export to a mesh.obj file
+        # and a material and texture file
+        if self.texture_method == "nerf":
+            mesh = get_mesh_from_filename(
+                str(self.output_dir / "marching_cubes_mesh.ply"), target_num_faces=self.target_num_faces
+            )
+            CONSOLE.print("Texturing mesh with NeRF")
+            texture_utils.export_textured_mesh(
+                mesh,
+                pipeline,
+                self.output_dir,
+                px_per_uv_triangle=self.px_per_uv_triangle if self.unwrap_method == "custom" else None,
+                unwrap_method=self.unwrap_method,
+                num_pixels_per_side=self.num_pixels_per_side,
+                output_format=self.output_format,
+            )
 
 
 Commands = Union[
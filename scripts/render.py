@@ -8,10 +8,11 @@ import json
 import os
 import struct
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import ExitStack
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import mediapy as media
 import numpy as np
@@ -29,6 +30,7 @@ from typing_extensions import Literal, assert_never
 
 from nerfstudio.cameras.camera_paths import get_path_from_json, get_spiral_path
 from nerfstudio.cameras.cameras import Cameras, CameraType
+from nerfstudio.cameras.rays import RayBundle
 from nerfstudio.pipelines.base_pipeline import Pipeline
 from nerfstudio.utils import install_checks
 from nerfstudio.utils.eval_utils import eval_setup
@@ -37,6 +39,106 @@ from nerfstudio.utils.rich_utils import ItersPerSecColumn
 CONSOLE = Console(width=120)
 
 
+def _get_frame_batches(cameras: Cameras, frame_indices: List[int], num_rays_per_chunk: int) -> List[List[int]]:
+    """Groups the frames to render into batches. Frames smaller than a chunk are rendered together, so that every
+    forward pass gets a full chunk of rays.
+
+    Args:
+        cameras: Cameras to render.
+        frame_indices: Indices of the frames to render.
+        num_rays_per_chunk: Number of rays the model renders per forward pass.
+    """
+    num_frames_per_batch = 1
+    if not cameras.is_jagged:
+        num_pixels_per_frame = int(cameras.image_height[0]) * int(cameras.image_width[0])
+        num_frames_per_batch = max(num_rays_per_chunk // num_pixels_per_frame, 1)
+    return [
+        frame_indices[start_idx : start_idx + num_frames_per_batch]
+        for start_idx in range(0, len(frame_indices), num_frames_per_batch)
+    ]
+
+
+def _get_progress(description: str) -> Progress:
+    """Returns a progress bar for the frames of a trajectory.
+
+    Args:
+        description: What is being done to the frames.
+    """
+    return Progress(
+        TextColumn(f":movie_camera: {description} :movie_camera:"),
+        BarColumn(),
+        TaskProgressColumn(show_speed=True),
+        ItersPerSecColumn(suffix="fps"),
+        TimeRemainingColumn(elapsed_when_finished=True, compact=True),
+    )
+
+
+def _check_rendered_output_names(outputs: Dict[str, torch.Tensor], rendered_output_names: List[str]) -> None:
+    """Exits with an error if any of the outputs to visualise is not rendered by the model.
+
+    Args:
+        outputs: Outputs rendered by the model.
+        rendered_output_names: Outputs to visualise.
+    """
+    for rendered_output_name in rendered_output_names:
+        if rendered_output_name not in outputs:
+            CONSOLE.rule("Error", style="red")
+            CONSOLE.print(f"Could not find {rendered_output_name} in the model outputs", justify="center")
+            CONSOLE.print(f"Please set --rendered_output_name to one of: {outputs.keys()}", justify="center")
+            sys.exit(1)
+
+
+def _generate_frame_rays(cameras: Cameras, camera_indices: List[int]) -> RayBundle:
+    """Generates the rays of a batch of frames, stacked along the last dimension.
+
+    Args:
+        cameras: Cameras to render.
+        camera_indices: Indices of the frames of the batch.
+    """
+    with torch.no_grad():
+        if len(camera_indices) == 1:
+            return cameras.generate_rays(camera_indices=camera_indices[0])
+        camera_indices_tensor = torch.tensor(camera_indices, device=cameras.device)[:, None]
+        return cameras.generate_rays(camera_indices=camera_indices_tensor, keep_shape=True)
+
+
+def _get_frame_images(
+    outputs: Dict[str, torch.Tensor], rendered_output_names: List[str], num_frames: int
+) -> List[np.ndarray]:
+    """Splits the outputs rendered for a batch of frames into one image per frame, with the outputs side by side.
+
+    Args:
+        outputs: Outputs of the batch, with the frames stacked along the last dimension.
+        rendered_output_names: Outputs to visualise.
+        num_frames: Number of frames of the batch.
+    """
+    render_images = []
+    for frame_idx in range(num_frames):
+        render_image = []
+        for rendered_output_name in rendered_output_names:
+            output_image = outputs[rendered_output_name]
+            output_image = output_image.view(*output_image.shape[:2], num_frames, -1)[:, :, frame_idx].numpy()
+            if output_image.shape[-1] == 1:
+                output_image = np.concatenate((output_image,) * 3, axis=-1)
+            render_image.append(output_image)
+        render_images.append(np.concatenate(render_image, axis=1))
+    return render_images
+
+
+def _write_frame_image(output_image_dir: Path, camera_idx: int, render_image: np.ndarray) -> None:
+    """Saves the image of a frame. It is written under a temporary name first, so that an interrupted render never
+    leaves a truncated image behind that a resumed render would skip.
+
+    Args:
+        output_image_dir: Directory of the images of the trajectory.
+        camera_idx: Index of the frame.
+        render_image: Image of the frame.
+    """
+    partial_image_path = output_image_dir / f"{camera_idx:05d}.partial.png"
+    media.write_image(partial_image_path, render_image)
+    os.replace(partial_image_path, output_image_dir / f"{camera_idx:05d}.png")
+
+
 def _render_trajectory_video(
     pipeline: Pipeline,
     cameras: Cameras,
@@ -48,6 +150,8 @@ def _render_trajectory_video(
     seconds: float = 5.0,
     output_format: Literal["images", "video"] = "video",
     camera_type: CameraType = CameraType.PERSPECTIVE,
+    frame_indices: Optional[List[int]] = None,
+    skip_existing: bool = False,
 ) -> None:
     """Helper function to create a video of the spiral trajectory.
 
@@ -62,19 +166,15 @@ def _render_trajectory_video(
         seconds: Length of output video.
         output_format: How to save output data.
         camera_type: Camera projection format type.
+        frame_indices: Indices of the frames to render. Renders all frames if None.
+        skip_existing: Whether to skip the frames whose images already exist.
     """
     CONSOLE.print("[bold green]Creating trajectory " + output_format)
     cameras.rescale_output_resolution(rendered_resolution_scaling_factor)
     cameras = cameras.to(pipeline.device)
     fps = len(cameras) / seconds
 
-    progress = Progress(
-        TextColumn(":movie_camera: Rendering :movie_camera:"),
-        BarColumn(),
-        TaskProgressColumn(show_speed=True),
-        ItersPerSecColumn(suffix="fps"),
-        TimeRemainingColumn(elapsed_when_finished=True, compact=True),
-    )
+    progress = _get_progress("Rendering")
     if output_format == "images":
         output_image_dir = output_filename.parent / output_filename.stem
         output_image_dir.mkdir(parents=True, exist_ok=True)
@@ -88,50 +188,100 @@ def _render_trajectory_video(
         # (unless we reserve enough space to overwrite with our uuid tag,
         # but we don't know how big the video file will be, so it's not certain!)
 
+    if frame_indices is None:
+        frame_indices = list(range(cameras.size))
+    if skip_existing and output_format == "images":
+        frame_indices = [idx for idx in frame_indices if not (output_image_dir / f"{idx:05d}.png").exists()]
+    if not frame_indices:
+        CONSOLE.print("All frames are already rendered")
+        return
+
+    batches = _get_frame_batches(cameras, frame_indices, pipeline.model.config.eval_num_rays_per_chunk)
+
     with ExitStack() as stack:
-        writer = (
-            stack.enter_context(
-                media.VideoWriter(
-                    path=output_filename,
-                    shape=(
-                        int(render_height * rendered_resolution_scaling_factor),
-                        int(render_width * rendered_resolution_scaling_factor) * len(rendered_output_names),
-                    ),
-                    fps=fps,
-                )
+        writer = None
+        if output_format == "video":
+            frame_shape = (
+                int(render_height * rendered_resolution_scaling_factor),
+                int(render_width * rendered_resolution_scaling_factor) * len(rendered_output_names),
             )
-            if output_format == "video"
-            else None
-        )
-        with progress:
-            for camera_idx in progress.track(range(cameras.size), description=""):
-                camera_ray_bundle = cameras.generate_rays(camera_indices=camera_idx)
-                with torch.no_grad():
-                    outputs = pipeline.model.get_outputs_for_camera_ray_bundle(camera_ray_bundle)
-                render_image = []
-                for rendered_output_name in rendered_output_names:
-                    if rendered_output_name not in outputs:
-                        CONSOLE.rule("Error", style="red")
-                        CONSOLE.print(f"Could not find {rendered_output_name} in the model outputs", justify="center")
-                        CONSOLE.print(
-                            f"Please set --rendered_output_name to one of: {outputs.keys()}", justify="center"
-                        )
-                        sys.exit(1)
-                    output_image = outputs[rendered_output_name].cpu().numpy()
-                    if output_image.shape[-1] == 1:
-                        output_image = np.concatenate((output_image,) * 3, axis=-1)
-                    render_image.append(output_image)
-                render_image = np.concatenate(render_image, axis=1)
+            writer = stack.enter_context(media.VideoWriter(path=output_filename, shape=frame_shape, fps=fps))
+
+        def write_frames(camera_indices: List[int], outputs: Dict[str, torch.Tensor]) -> None:
+            """Writes the rendered outputs of a batch of frames to the images or the video."""
+            render_images = _get_frame_images(outputs, rendered_output_names, len(camera_indices))
+            for camera_idx, render_image in zip(camera_indices, render_images):
                 if output_format == "images":
-                    media.write_image(output_image_dir / f"{camera_idx:05d}.png", render_image)
+                    _write_frame_image(output_image_dir, camera_idx, render_image)
                 if output_format == "video" and writer is not None:
                     writer.add_image(render_image)
 
+        # The rays of the next batch are generated and the previous batch is written on background threads while
+        # the current batch renders. At most one batch waits to be written, which also keeps the frames in order.
+        ray_executor = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+        write_executor = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+        with progress:
+            task = progress.add_task("", total=len(frame_indices))
+            next_ray_bundle = ray_executor.submit(_generate_frame_rays, cameras, batches[0])
+            pending_write: Optional[Future] = None
+            for batch_idx, camera_indices in enumerate(batches):
+                camera_ray_bundle = next_ray_bundle.result()
+                if batch_idx + 1 < len(batches):
+                    next_ray_bundle = ray_executor.submit(_generate_frame_rays, cameras, batches[batch_idx + 1])
+                with torch.no_grad():
+                    outputs = pipeline.model.get_outputs_for_camera_ray_bundle(camera_ray_bundle, outputs_to_cpu=True)
+                _check_rendered_output_names(outputs, rendered_output_names)
+                if pending_write is not None:
+                    pending_write.result()
+                pending_write = write_executor.submit(write_frames, camera_indices, outputs)
+                progress.advance(task, len(camera_indices))
+            if pending_write is not None:
+                pending_write.result()
+
     if output_format == "video":
         if camera_type == CameraType.EQUIRECTANGULAR:
             insert_spherical_metadata_into_file(output_filename)
 
 
+def _stitch_trajectory_video(
+    output_filename: Path,
+    num_frames: int,
+    seconds: float = 5.0,
+    camera_type: CameraType = CameraType.PERSPECTIVE,
+) -> None:
+    """Assembles the images of a trajectory rendered with output_format "images" into a video.
+
+    Args:
+        output_filename: Name of the output file. The images are read from the directory of the same name.
+        num_frames: Number of frames of the trajectory.
+        seconds: Length of output video.
+        camera_type: Camera projection format type.
+    """
+    output_image_dir = output_filename.parent / output_filename.stem
+    image_paths = [output_image_dir / f"{idx:05d}.png" for idx in range(num_frames)]
+    missing_image_paths = [image_path for image_path in image_paths if not image_path.exists()]
+    if missing_image_paths:
+        CONSOLE.rule("Error", style="red")
+        CONSOLE.print(
+            f"{len(missing_image_paths)} of {num_frames} frames are missing, starting with {missing_image_paths[0]}",
+            justify="center",
+        )
+        CONSOLE.print("Please render the missing frames before stitching the video", justify="center")
+        sys.exit(1)
+
+    CONSOLE.print("[bold green]Stitching trajectory video")
+    output_filename.parent.mkdir(parents=True, exist_ok=True)
+    progress = _get_progress("Stitching")
+    frame_shape = media.read_image(image_paths[0]).shape[:2]
+    with progress:
+        with media.VideoWriter(path=output_filename, shape=frame_shape, fps=num_frames / seconds) as writer:
+            for image_path in progress.track(image_paths, description=""):
+                writer.add_image(media.read_image(image_path))
+
+    if camera_type == CameraType.EQUIRECTANGULAR:
+        insert_spherical_metadata_into_file(output_filename)
+
+
 def insert_spherical_metadata_into_file(
     output_filename: Path,
 ) -> None:
@@ -224,14 +374,48 @@ class RenderTrajectory:
     output_format: Literal["images", "video"] = "video"
     # Specifies number of rays per chunk during eval.
     eval_num_rays_per_chunk: Optional[int] = None
+    # Device to render on. Uses the GPU if one is available when None.
+    device: Optional[str] = None
+    # Number of chunks rendered in parallel on the CPU, each with its share of the torch threads.
+    num_cpu_workers: int = 1
+    # Whether to render in bfloat16 on the CPU.
+    cpu_bf16: bool = False
+    # Shard "i/n" of the frames to render, out of n contiguous ranges. Sharded renders save images to the directory
+    # named after the output file and skip the frames already there. The shards are assembled with --stitch.
+    shard: Optional[str] = None
+    # Skip the frames whose images already exist, to resume an interrupted render. Resumed renders only save images,
+    # run with --stitch afterwards to assemble the video.
+    resume: bool = False
+    # Assemble the video from the images rendered by the shards instead of rendering.
+    stitch: bool = False
+
+    def _get_frame_indices(self, num_frames: int) -> Optional[List[int]]:
+        """Returns the indices of the frames of the shard to render, or None to render all frames."""
+        if self.shard is None:
+            return None
+        try:
+            shard_idx, num_shards = (int(x) for x in self.shard.split("/"))
+        except ValueError:
+            shard_idx, num_shards = -1, 0
+        if not 0 <= shard_idx < num_shards:
+            CONSOLE.rule("Error", style="red")
+            CONSOLE.print(f"Invalid shard {self.shard}, expected i/n with 0 <= i < n", justify="center")
+            sys.exit(1)
+        return list(range(shard_idx * num_frames // num_shards, (shard_idx + 1) * num_frames // num_shards))
 
     def main(self) -> None:
         """Main function."""
-        _, pipeline, _ = eval_setup(
-            self.load_config,
-            eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
-            test_mode="test" if self.traj == "spiral" else "inference",
-        )
+        # Stitching a camera path from a file does not need the model
+        pipeline = None
+        if not self.stitch or self.traj == "spiral":
+            _, pipeline, _ = eval_setup(
+                self.load_config,
+                eval_num_rays_per_chunk=self.eval_num_rays_per_chunk,
+                test_mode="test" if self.traj == "spiral" else "inference",
+                device=self.device,
+            )
+            pipeline.model.config.eval_num_cpu_workers = self.num_cpu_workers
+            pipeline.model.config.eval_cpu_bf16 = self.cpu_bf16
 
         install_checks.check_ffmpeg_installed()
 
@@ -239,6 +423,7 @@ class RenderTrajectory:
 
         # TODO(ethan): use camera information from parsing args
         if self.traj == "spiral":
+            assert pipeline is not None
             camera_start = pipeline.datamanager.eval_dataloader.get_camera(image_idx=0).flatten()
             # TODO(ethan): pass in the up direction of the camera
             camera_type = CameraType.PERSPECTIVE
@@ -263,6 +448,13 @@ class RenderTrajectory:
         else:
             assert_never(self.traj)
 
+        if self.stitch:
+            _stitch_trajectory_video(self.output_path, camera_path.size, seconds=seconds, camera_type=camera_type)
+            return
+
+        assert pipeline is not None
+        # Sharded and resumed renders save every frame as an image as soon as it is rendered
+        render_images = self.shard is not None or self.resume
         _render_trajectory_video(
             pipeline,
             camera_path,
@@ -270,10 +462,12 @@ class RenderTrajectory:
             rendered_output_names=self.rendered_output_names,
             rendered_resolution_scaling_factor=1.0 / self.downscale_factor,
             seconds=seconds,
-            output_format=self.output_format,
+            output_format="images" if render_images else self.output_format,
             camera_type=camera_type,
             render_width=render_width,
             render_height=render_height,
+            frame_indices=self._get_frame_indices(camera_path.size),
+            skip_existing=render_images,
         )
 
 
@@ -39,6 +39,8 @@ class TextureMesh:
     """If using xatlas for unwrapping, the pixels per side of the texture image."""
     target_num_faces: Optional[int] = 50000
     """Target number of faces for the mesh to texture."""
+    output_format: Literal["obj", "ply", "glb"] = "obj"
+    """Format of the textured mesh file. The texture is embedded in GLB files."""
 
     def main(self) -> None:
         """Export textured mesh"""
@@ -53,15 +55,16 @@ class TextureMesh:
         # load the Pipeline
         _, pipeline, _ = eval_setup(self.load_config, test_mode="inference")
 
-        # texture the mesh with NeRF and export to a mesh.obj file
+        # texture the mesh with NeRF and export to a mesh file
         # and a material and texture file
         texture_utils.export_textured_mesh(
             mesh,
             pipeline,
-            self.px_per_uv_triangle,
             self.output_dir,
+            px_per_uv_triangle=self.px_per_uv_triangle if self.unwrap_method == "custom" else None,
             unwrap_method=self.unwrap_method,
             num_pixels_per_side=self.num_pixels_per_side,
+            output_format=self.output_format,
         )
 
 
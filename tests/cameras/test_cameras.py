@@ -7,6 +7,7 @@ from itertools import product
 import torch
 
 from nerfstudio.cameras.cameras import Cameras, CameraType
+from nerfstudio.cameras.lie_groups import exp_map_SO3xR3
 from nerfstudio.cameras.rays import RayBundle
 
 BATCH_SIZE = 2
@@ -278,6 +279,108 @@ def check_generate_rays_shape():
         assert shape == output_size
 
 
+def test_generate_rays_fast_path():
+    """Test that the fast path of generate_rays matches the generic path"""
+    num_cameras = 3
+    camera_to_worlds = exp_map_SO3xR3(torch.randn((num_cameras, 6)) * 0.5)
+    distortion_params = torch.tensor([[0.1, -0.05, 0.0, 0.0, 0.01, -0.02]]).repeat(num_cameras, 1)
+    distortion_params[2] = 0.0
+    for camera_type, height in product(
+        [CameraType.PERSPECTIVE, CameraType.FISHEYE, CameraType.EQUIRECTANGULAR], [24, torch.tensor([[24], [24], [20]])]
+    ):
+        cameras = Cameras(
+            camera_to_worlds=camera_to_worlds,
+            fx=torch.tensor([[20.0], [20.0], [25.0]]),
+            fy=torch.tensor([[20.0], [20.0], [24.0]]),
+            cx=16.0,
+            cy=12.0,
+            width=32,
+            height=height,
+            distortion_params=distortion_params,
+            camera_type=camera_type,
+            times=torch.tensor([0.0, 0.5, 1.0]),
+        )
+        all_kwargs = [{}, {"keep_shape": False}, {"keep_shape": True}]
+        if not cameras.is_jagged:
+            all_kwargs.append({"camera_opt_to_camera": exp_map_SO3xR3(torch.randn((1, 6)) * 0.1)[0]})
+        for camera_idx in range(num_cameras):
+            for kwargs in all_kwargs:
+                ray_bundle = cameras.generate_rays(camera_idx, **kwargs)
+                generic_ray_bundle = cameras.generate_rays(camera_idx, fast_path=False, **kwargs)
+                assert ray_bundle.shape == generic_ray_bundle.shape
+                _check_ray_bundle_close(ray_bundle, generic_ray_bundle)
+
+        num_rays = 100
+        camera_indices = torch.randint(0, num_cameras, (num_rays, 1))
+        coords = torch.rand((num_rays, 2)) * torch.tensor([20.0, 32.0])
+        camera_opt_to_camera = exp_map_SO3xR3(torch.randn((num_rays, 6)) * 0.1)
+        distortion_params_delta = torch.randn((num_rays, 6)) * 0.01
+        ray_bundle = cameras.generate_rays(
+            camera_indices,
+            coords,
+            camera_opt_to_camera=camera_opt_to_camera,
+            distortion_params_delta=distortion_params_delta,
+        )
+        generic_ray_bundle = cameras.generate_rays(
+            camera_indices,
+            coords,
+            camera_opt_to_camera=camera_opt_to_camera,
+            distortion_params_delta=distortion_params_delta,
+            fast_path=False,
+        )
+        assert ray_bundle.shape == (num_rays,)
+        _check_ray_bundle_close(ray_bundle, generic_ray_bundle)
+
+
+def test_generate_rays_jagged():
+    """Test that rendering all images of jagged cameras concatenates the flattened image of each camera"""
+    cameras = Cameras(
+        camera_to_worlds=exp_map_SO3xR3(torch.randn((3, 6)) * 0.5),
+        fx=20.0,
+        fy=20.0,
+        cx=16.0,
+        cy=12.0,
+        width=torch.tensor([[32], [30], [8]]),
+        height=torch.tensor([[24], [5], [16]]),
+    )
+    assert cameras.is_jagged
+    camera_indices = torch.tensor([[2], [0], [2], [1]])
+    ray_bundle = cameras.generate_rays(camera_indices)
+    expected = [cameras.generate_rays(int(i), keep_shape=True).flatten() for i in camera_indices[:, 0]]
+    assert ray_bundle.shape == (16 * 8 + 24 * 32 + 16 * 8 + 5 * 30,)
+    assert torch.equal(ray_bundle.camera_indices, torch.cat([rays.camera_indices for rays in expected]))
+    assert torch.allclose(ray_bundle.directions, torch.cat([rays.directions for rays in expected]), atol=1e-5)
+
+
+def test_generate_rays_after_modifying_cameras():
+    """Test that the fast path notices cameras modified after it cached their properties"""
+    cameras = Cameras(
+        camera_to_worlds=exp_map_SO3xR3(torch.randn((2, 6)) * 0.5),
+        fx=20.0,
+        fy=20.0,
+        cx=16.0,
+        cy=12.0,
+        width=32,
+        height=24,
+        times=torch.tensor([0.0, 1.0]),
+    )
+    assert cameras.generate_rays(0).shape == (24, 32)
+    cameras.height[0] = 12
+    assert cameras.generate_rays(0).shape == (12, 32)
+    cameras.distortion_params = torch.tensor([[0.1, -0.05, 0.0, 0.0, 0.01, -0.02]]).repeat(2, 1)
+    _check_ray_bundle_close(cameras.generate_rays(1), cameras.generate_rays(1, fast_path=False))
+    cameras.camera_type[1] = CameraType.FISHEYE.value
+    _check_ray_bundle_close(cameras.generate_rays(1), cameras.generate_rays(1, fast_path=False))
+
+
+def _check_ray_bundle_close(ray_bundle: RayBundle, other: RayBundle):
+    assert torch.allclose(ray_bundle.origins, other.origins, atol=1e-6)
+    assert torch.allclose(ray_bundle.directions, other.directions, atol=1e-5)
+    assert torch.allclose(ray_bundle.pixel_area, other.pixel_area, rtol=1e-3, atol=1e-9)
+    assert torch.equal(ray_bundle.camera_indices, other.camera_indices)
+    assert torch.equal(ray_bundle.times, other.times)
+
+
 def _check_dataclass_allclose(ipt, other):
     for field in dataclasses.fields(ipt):
         if getattr(ipt, field.name) is not None:
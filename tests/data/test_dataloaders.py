@@ -0,0 +1,61 @@
+"""
+Test the cache dataloader
+"""
+import itertools
+import random
+
+import pytest
+import torch
+from torch.utils.data import Dataset
+
+from nerfstudio.data.utils.dataloaders import CacheDataloader
+
+
+class _ImageDataset(Dataset):
+    """Small in-memory dataset of random images"""
+
+    def __init__(self, num_images=10, height=4, width=5):
+        self.images = torch.rand((num_images, height, width, 3), generator=torch.Generator().manual_seed(0))
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, image_idx):
+        return {"image_idx": image_idx, "image": self.images[image_idx]}
+
+
+def _get_batches(prefetch_images, num_batches=12):
+    """Return the first batches of a cache dataloader that resamples images every few iterations"""
+    random.seed(0)
+    dataloader = CacheDataloader(
+        _ImageDataset(),
+        num_images_to_sample_from=3,
+        num_times_to_repeat_images=2,
+        prefetch_images=prefetch_images,
+    )
+    assert dataloader.prefetch_images == prefetch_images
+    return list(itertools.islice(iter(dataloader), num_batches))
+
+
+def test_prefetch_images():
+    """Test that prefetching images yields the same batches as loading them on demand"""
+    batches = _get_batches(prefetch_images=False)
+    prefetched_batches = _get_batches(prefetch_images=True)
+    assert len({tuple(batch["image_idx"].tolist()) for batch in batches}) > 1
+    for batch, prefetched_batch in zip(batches, prefetched_batches):
+        assert torch.equal(batch["image_idx"], prefetched_batch["image_idx"])
+        assert torch.equal(batch["image"], prefetched_batch["image"])
+
+
+def test_close_prefetch_executor():
+    """Test that closing the dataloader shuts down its prefetch thread"""
+    dataloader = CacheDataloader(
+        _ImageDataset(), num_images_to_sample_from=3, num_times_to_repeat_images=2, prefetch_images=True
+    )
+    next(iter(dataloader))
+    prefetch_executor = dataloader.prefetch_executor
+    assert prefetch_executor is not None and dataloader.prefetch_future is not None
+    dataloader.close()
+    assert dataloader.prefetch_executor is None and dataloader.prefetch_future is None
+    with pytest.raises(RuntimeError):
+        prefetch_executor.submit(print)
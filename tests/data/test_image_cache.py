@@ -0,0 +1,117 @@
+"""
+Test the decoded image cache
+"""
+import concurrent.futures
+import os
+import random
+
+import numpy as np
+import torch
+from PIL import Image
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.data.dataparsers.base_dataparser import DataparserOutputs
+from nerfstudio.data.datasets.base_dataset import InputDataset
+from nerfstudio.data.pixel_samplers import PixelSampler
+from nerfstudio.data.utils.dataloaders import CacheDataloader
+from nerfstudio.data.utils.image_cache import DecodedImageCache
+
+
+def _write_images(directory, num_images=3, height=12, width=16, num_channels=3, alpha_color=None):
+    """Write random RGB(A) images and return their dataparser outputs"""
+    rng = np.random.default_rng(0)
+    image_filenames = []
+    for i in range(num_images):
+        filename = directory / f"image_{i}.png"
+        Image.fromarray(rng.integers(0, 256, (height, width, num_channels), dtype=np.uint8)).save(filename)
+        image_filenames.append(filename)
+    cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3, :].repeat(num_images, 1, 1),
+        fx=10.0,
+        fy=10.0,
+        cx=width / 2,
+        cy=height / 2,
+        width=width,
+        height=height,
+    )
+    return DataparserOutputs(image_filenames=image_filenames, cameras=cameras, alpha_color=alpha_color)
+
+
+def test_decoded_image_cache(tmp_path):
+    """Test cache hits, invalidation by modification time and scale factor, and equality with decoded images"""
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+    dataparser_outputs = _write_images(image_dir)
+
+    uncached_dataset = InputDataset(dataparser_outputs)
+    dataset = InputDataset(dataparser_outputs, image_cache_dir=cache_dir)
+    for i in range(len(dataset)):
+        assert torch.equal(dataset.get_image(i), uncached_dataset.get_image(i))
+        assert torch.equal(dataset.get_image_uint8(i), uncached_dataset.get_image_uint8(i))
+    assert sorted(path.suffix for path in cache_dir.iterdir()) == [".bin", ".json"]
+    # The uint8 images are views into the cache, not copies
+    assert np.shares_memory(dataset.get_image_uint8(0).numpy(), dataset.image_cache._buffer)  # pylint: disable=W0212
+
+    # A second dataset maps the existing cache instead of decoding the images
+    def fail_to_decode(image_idx):
+        raise AssertionError(f"Decoded image {image_idx} despite a valid cache")
+
+    cached_dataset = InputDataset(dataparser_outputs, image_cache_dir=cache_dir)
+    assert cached_dataset.image_cache is not None
+    assert cached_dataset.image_cache.data_path == dataset.image_cache.data_path
+    cached_dataset.image_cache.load_fn = fail_to_decode
+    for i in range(len(cached_dataset)):
+        assert torch.equal(cached_dataset.get_image(i), uncached_dataset.get_image(i))
+
+    # Rewriting an image changes its modification time, which results in a fresh cache
+    stat = os.stat(dataparser_outputs.image_filenames[1])
+    Image.fromarray(np.zeros((12, 16, 3), dtype=np.uint8)).save(dataparser_outputs.image_filenames[1])
+    os.utime(dataparser_outputs.image_filenames[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    touched_dataset = InputDataset(dataparser_outputs, image_cache_dir=cache_dir)
+    assert touched_dataset.image_cache.data_path != dataset.image_cache.data_path
+    assert torch.all(touched_dataset.get_image(1) == 0)
+    assert torch.equal(touched_dataset.get_image(0), uncached_dataset.get_image(0))
+
+    # So does a different scale factor
+    scaled_dataset = InputDataset(dataparser_outputs, scale_factor=0.5, image_cache_dir=cache_dir)
+    assert scaled_dataset.image_cache.data_path != touched_dataset.image_cache.data_path
+    assert scaled_dataset.get_image(0).shape == (6, 8, 3)
+    assert torch.equal(scaled_dataset.get_image(2), InputDataset(dataparser_outputs, scale_factor=0.5).get_image(2))
+    assert len(list(cache_dir.glob("*.bin"))) == 3
+
+
+def test_decoded_image_cache_window(tmp_path):
+    """Test that building the cache only decodes a bounded number of images ahead of the one being written"""
+    dataparser_outputs = _write_images(tmp_path, num_images=10)
+    num_decoded = []
+
+    def load_fn(image_idx):
+        num_decoded.append(image_idx)
+        return np.full((2, 2, 3), image_idx, dtype=np.uint8)
+
+    cache = DecodedImageCache(tmp_path / "cache", dataparser_outputs.image_filenames, 1.0, load_fn)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        images = cache._decode_in_order(executor, window_size=3)  # pylint: disable=protected-access
+        assert int(next(images)[0, 0, 0]) == 0
+        assert len(num_decoded) <= 4
+        assert [int(image[0, 0, 0]) for image in images] == list(range(1, 10))
+
+
+def test_uint8_cached_batches(tmp_path):
+    """Test that pixels sampled from cached uint8 images match the ones sampled from float images"""
+    alpha_color = torch.tensor([0.2, 0.4, 0.6])
+    dataparser_outputs = _write_images(tmp_path, num_channels=4, alpha_color=alpha_color)
+    dataset = InputDataset(dataparser_outputs, image_cache_dir=tmp_path / "cache")
+    pixel_batches = {}
+    for image_type in ("float32", "uint8"):
+        random.seed(0)
+        torch.manual_seed(0)
+        dataloader = CacheDataloader(dataset, num_images_to_sample_from=2, image_type=image_type)
+        image_batch = next(iter(dataloader))
+        assert image_batch["image"].dtype == (torch.uint8 if image_type == "uint8" else torch.float32)
+        pixel_batches[image_type] = PixelSampler(num_rays_per_batch=64, alpha_color=alpha_color).sample(image_batch)
+    assert torch.equal(pixel_batches["uint8"]["indices"], pixel_batches["float32"]["indices"])
+    assert torch.allclose(pixel_batches["uint8"]["image"], pixel_batches["float32"]["image"])
+    # The pixels were composited onto the alpha color
+    assert not torch.allclose(pixel_batches["uint8"]["image"], dataset.get_image_uint8(0)[0, 0, :3].float() / 255.0)
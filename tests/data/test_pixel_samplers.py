@@ -0,0 +1,130 @@
+"""
+Test pixel samplers
+"""
+import pytest
+import torch
+
+from nerfstudio.data.datamanagers.variable_res_datamanager import variable_res_collate
+from nerfstudio.data.pixel_samplers import (
+    ImportancePixelSampler,
+    MaskPixelIndex,
+    PixelSampler,
+)
+
+
+def test_masked_pixel_sampler():
+    """Test that masked sampling only returns valid pixels"""
+    num_images, image_height, image_width = 3, 8, 10
+    mask = torch.zeros((num_images, image_height, image_width, 1), dtype=torch.bool)
+    mask[0, 2:4, 5:7] = True
+    mask[2, 7, 0] = True
+    batch = {
+        "image_idx": torch.tensor([4, 5, 6]),
+        "image": torch.rand((num_images, image_height, image_width, 3)),
+        "mask": mask,
+    }
+
+    sampler = PixelSampler(num_rays_per_batch=256)
+    pixel_batch = sampler.sample(batch)
+    assert pixel_batch["image"].shape == (256, 3)
+    assert torch.all(pixel_batch["mask"])
+    assert set(pixel_batch["indices"][:, 0].tolist()) <= {4, 6}
+
+    # The index is built once per batch of masks
+    mask_index = sampler.get_mask_index(mask)
+    assert sampler.get_mask_index(mask) is mask_index
+    assert mask_index.counts.tolist() == [4, 0, 1]
+
+    sampler.set_image_weights(torch.tensor([0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0]))
+    pixel_batch = sampler.sample(batch)
+    assert torch.all(pixel_batch["indices"][:, 0] == 6)
+    assert torch.all(pixel_batch["indices"][:, 1:] == torch.tensor([7, 0]))
+
+
+def test_mask_pixel_index():
+    """Test the CSR index of valid pixels"""
+    mask = torch.rand((2, 5, 6, 1)) > 0.5
+    mask_index = MaskPixelIndex.from_mask(mask)
+    assert mask_index.counts.sum() == mask.sum()
+    indices = mask_index.sample(1000)
+    assert torch.all(mask[indices[:, 0], indices[:, 1], indices[:, 2]])
+
+
+def test_packed_pixel_sampler():
+    """Test sampling from images of different shapes packed into one buffer"""
+    shapes = [(4, 6), (5, 3), (2, 2)]
+    batch_list = []
+    for i, (image_height, image_width) in enumerate(shapes):
+        image = torch.full((image_height, image_width, 3), float(i))
+        mask = torch.zeros((image_height, image_width, 1), dtype=torch.bool)
+        mask[-1, -1] = True
+        batch_list.append({"image_idx": i, "image": image, "mask": mask})
+    batch = variable_res_collate(batch_list)
+    assert batch["image"].shape == (4 * 6 + 5 * 3 + 2 * 2, 3)
+
+    sampler = PixelSampler(num_rays_per_batch=100)
+    pixel_batch = sampler.sample(batch)
+    indices = pixel_batch["indices"]
+    assert pixel_batch["image"].shape == (100, 3)
+    assert torch.all(pixel_batch["image"][:, 0] == indices[:, 0].float())
+    heights = torch.tensor([shape[0] for shape in shapes])
+    widths = torch.tensor([shape[1] for shape in shapes])
+    assert torch.all(indices[:, 1] == heights[indices[:, 0]] - 1)
+    assert torch.all(indices[:, 2] == widths[indices[:, 0]] - 1)
+
+
+def test_importance_pixel_sampler():
+    """Test that rays focus on high error cells and that the loss weights stay unbiased"""
+    num_images, image_height, image_width = 2, 20, 30
+    batch = {"image_idx": torch.tensor([0, 1]), "image": torch.rand((num_images, image_height, image_width, 3))}
+    sampler = ImportancePixelSampler(num_rays_per_batch=4096, num_cameras=num_images, cell_size=8, error_decay=0.0)
+    pixel_batch = sampler.sample(batch)
+    assert torch.allclose(pixel_batch["loss_weights"], torch.ones(4096))
+
+    # All of the error is in the bottom right cell of the second image, which is cut off by the image border
+    sampler.error_map.zero_()
+    sampler.update_error_map(torch.tensor([[1, 19, 29]]), torch.tensor([1.0]))
+    assert sampler.error_map[1, 2, 3] == 1.0
+    pixel_batch = sampler.sample(batch)
+    indices = pixel_batch["indices"]
+    in_cell = (indices[:, 0] == 1) & (indices[:, 1] >= 16) & (indices[:, 2] >= 24)
+    # The cell holds 24 of the 1200 pixels, so it gets 0.75 + 0.25 * 24 / 1200 of the rays
+    assert abs(float(in_cell.float().mean()) - 0.755) < 0.05
+    assert torch.all(indices[:, 1] < image_height) and torch.all(indices[:, 2] < image_width)
+    assert abs(float(pixel_batch["loss_weights"].mean()) - 1.0) < 0.2
+
+
+def test_packed_pixel_sampler_empty_mask():
+    """Test that images whose mask has no valid pixel don't get any rays"""
+    batch_list = []
+    for i, (image_height, image_width) in enumerate([(4, 6), (5, 3), (2, 2)]):
+        image = torch.full((image_height, image_width, 3), float(i))
+        mask = torch.zeros((image_height, image_width, 1), dtype=torch.bool)
+        if i != 1:
+            mask[0, 0] = True
+        batch_list.append({"image_idx": i, "image": image, "mask": mask})
+    list_batch = {
+        "image_idx": torch.arange(3),
+        "image": [batch["image"] for batch in batch_list],
+        "mask": [batch["mask"] for batch in batch_list],
+    }
+    sampler = PixelSampler(num_rays_per_batch=101)
+
+    pixel_batch = sampler.sample(variable_res_collate([dict(batch) for batch in batch_list]))
+    indices = pixel_batch["indices"]
+    assert pixel_batch["image"].shape == (101, 3)
+    assert torch.all(pixel_batch["mask"])
+    assert torch.all(pixel_batch["image"][:, 0] == indices[:, 0].float())
+    assert torch.bincount(indices[:, 0], minlength=3).tolist() == [50, 0, 51]
+
+    pixel_batch = sampler.sample(list_batch)
+    indices = pixel_batch["indices"]
+    assert torch.all(pixel_batch["image"][:, 0] == indices[:, 0].float())
+    assert torch.bincount(indices[:, 0], minlength=3).tolist() == [50, 0, 51]
+
+    for mask in list_batch["mask"]:
+        mask[:] = False
+    with pytest.raises(ValueError):
+        sampler.sample(variable_res_collate([dict(batch) for batch in batch_list]))
+    with pytest.raises(ValueError):
+        sampler.sample(list_batch)
@@ -0,0 +1,83 @@
+"""
+Test the sampling of point clouds from the depth renders of the training cameras
+"""
+from types import SimpleNamespace
+
+import torch
+
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.exporter.exporter_utils import sample_point_cloud
+from nerfstudio.pipelines.base_pipeline import Pipeline
+
+PLANE_DEPTH = 0.5
+
+
+class _StubModel:  # pylint: disable=too-few-public-methods
+    """Renders the plane z = -PLANE_DEPTH, opaque where the rays point to positive x and transparent elsewhere. The
+    color of the rays is their accumulation."""
+
+    def __call__(self, ray_bundle):
+        directions = ray_bundle.directions
+        accumulation = (0.5 + directions[:, :1]).clamp(0.0, 1.0)
+        return {
+            "rgb": accumulation.expand(-1, 3),
+            "depth": PLANE_DEPTH / -directions[:, 2:],
+            "accumulation": accumulation,
+        }
+
+
+class _StubPipeline(Pipeline):  # pylint: disable=abstract-method
+    """Holds the training cameras and the stub model"""
+
+    def __init__(self, cameras):
+        super().__init__()
+        self.datamanager = SimpleNamespace(train_dataset=SimpleNamespace(cameras=cameras))
+        self._stub_model = _StubModel()
+
+    @property
+    def model(self):
+        return self._stub_model
+
+    @property
+    def device(self):
+        return "cpu"
+
+
+def _get_pipeline() -> _StubPipeline:
+    """Returns a pipeline with two overlapping cameras looking down the -z axis"""
+    camera_to_worlds = torch.eye(4)[None, :3].repeat(2, 1, 1)
+    camera_to_worlds[1, 0, 3] = 0.2
+    cameras = Cameras(camera_to_worlds=camera_to_worlds, fx=10.0, fy=10.0, cx=12.0, cy=10.0, width=24, height=20)
+    return _StubPipeline(cameras)
+
+
+def _sample_point_cloud(**kwargs):
+    """Returns all the points and colors sampled from the stub pipeline"""
+    torch.manual_seed(0)
+    batches = list(sample_point_cloud(_get_pipeline(), num_rays_per_batch=64, **kwargs))
+    points = torch.cat([batch[0] for batch in batches])
+    rgbs = torch.cat([batch[1] for batch in batches])
+    assert all(batch[2] is None for batch in batches)
+    return points, rgbs
+
+
+def test_sample_point_cloud_min_accumulation():
+    """Test that the rays whose accumulation is below min_accumulation are dropped"""
+    points, rgbs = _sample_point_cloud(num_points=300, min_accumulation=0.6)
+    assert len(points) == 300
+    assert torch.allclose(points[:, 2], torch.tensor(-PLANE_DEPTH))
+    assert torch.all(rgbs >= 0.6)
+    # the rays are spread over the whole opaque part of the images
+    assert rgbs[:, 0].max() > 0.9
+
+
+def test_sample_point_cloud_voxel_size():
+    """Test that there is at most one point per voxel, even for the voxels seen by both cameras"""
+    voxel_size = 0.05
+    points, rgbs = _sample_point_cloud(num_points=10000, min_accumulation=0.5, voxel_size=voxel_size)
+    assert torch.all(rgbs >= 0.5)
+    voxels = torch.floor(points / voxel_size).long()
+    assert len(torch.unique(voxels, dim=0)) == len(points)
+    # the opaque part of the plane, seen through the pixel centers of the cameras, covers the voxels of
+    # 0 <= x < 0.6 and -0.5 <= y < 0.5, most of which hold a point
+    assert len(points) > 0.8 * 12 * 20
@@ -0,0 +1,91 @@
+"""
+Test marching cubes on blocks, and the mesh extraction from density fields
+"""
+import numpy as np
+import torch
+from skimage import measure
+
+from nerfstudio.exporter.marching_cubes import BlockMarchingCubes, generate_mesh_from_density
+
+RADIUS = 0.71
+
+
+def _sphere_sdf(positions):
+    """Signed distance to a sphere centered at the origin"""
+    return torch.linalg.norm(positions, dim=-1) - RADIUS
+
+
+def _get_skimage_mesh(values):
+    """Returns the vertices and faces found by marching cubes on the whole grid"""
+    vertices, faces, _, _ = measure.marching_cubes(values.numpy(), level=0.0, allow_degenerate=False)
+    return torch.from_numpy(vertices.copy()), torch.from_numpy(faces.astype(np.int64))
+
+
+def _check_watertight(vertices, faces):
+    """Checks that every edge is shared by exactly two faces, and that no vertex is duplicated"""
+    assert len(torch.unique(torch.round(vertices * 1e4), dim=0)) == len(vertices)
+    edges = torch.cat([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    _, counts = torch.unique(torch.sort(edges, dim=-1)[0], dim=0, return_counts=True)
+    assert torch.all(counts == 2)
+    # Consistently oriented faces traverse every edge once in each direction
+    assert len(torch.unique(edges, dim=0)) == len(edges)
+
+
+def _check_same_points(points, expected_points, atol=1e-4):
+    """Checks that every point is close to one of the expected points, and the other way around"""
+    assert len(points) == len(expected_points)
+    distances = torch.cdist(points.double(), expected_points.double())
+    assert torch.all(torch.amin(distances, dim=0) < atol)
+    assert torch.all(torch.amin(distances, dim=1) < atol)
+
+
+def test_block_marching_cubes():
+    """Test that meshing a sphere block by block gives the same watertight mesh as meshing the whole grid"""
+    block_size, num_blocks_per_axis = 4, 5
+    resolution = block_size * num_blocks_per_axis
+    corners = torch.stack(torch.meshgrid([torch.arange(resolution + 1)] * 3, indexing="ij"), dim=-1)
+    values = _sphere_sdf(corners / resolution * 2.0 - 1.0)
+
+    marching_cubes = BlockMarchingCubes(block_size=block_size)
+    blocks = torch.stack(torch.meshgrid([torch.arange(num_blocks_per_axis)] * 3, indexing="ij"), dim=-1).view(-1, 3)
+    # The blocks are added in two chunks
+    for chunk in torch.split(blocks, 70):
+        block_origins = chunk * block_size
+        block_values = torch.stack(
+            [
+                values[x : x + block_size + 1, y : y + block_size + 1, z : z + block_size + 1]
+                for x, y, z in block_origins
+            ]
+        )
+        marching_cubes.add_blocks(block_values, block_origins)
+    vertices, faces, normals, colors = marching_cubes.get_mesh()
+    assert colors is None
+    assert normals.shape == vertices.shape
+
+    expected_vertices, expected_faces = _get_skimage_mesh(values)
+    assert len(faces) == len(expected_faces)
+    _check_same_points(vertices, expected_vertices)
+    _check_watertight(vertices, faces)
+
+
+def test_generate_mesh_from_density():
+    """Test that refining a coarse grid near a sphere gives the same watertight mesh as meshing the finest grid"""
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+
+    def density_fn(positions):
+        # The density is 10 on the sphere and grows inwards
+        return (10.0 - _sphere_sdf(positions))[..., None]
+
+    mesh = generate_mesh_from_density(
+        density_fn, aabb, isosurface_threshold=10.0, resolution=8, num_refinement_levels=2, block_size=4
+    )
+    _check_watertight(mesh.vertices, mesh.faces)
+    assert torch.allclose(torch.linalg.norm(mesh.vertices, dim=-1), torch.tensor(RADIUS), atol=2.0 / 32)
+    assert torch.allclose(torch.linalg.norm(mesh.normals, dim=-1), torch.tensor(1.0), atol=1e-4)
+
+    corners = torch.stack(torch.meshgrid([torch.arange(33)] * 3, indexing="ij"), dim=-1)
+    expected_vertices, expected_faces = _get_skimage_mesh(_sphere_sdf(corners / 32 * 2.0 - 1.0))
+    expected_vertices = expected_vertices / 32 * 2.0 - 1.0
+    assert len(mesh.faces) == len(expected_faces)
+    # The density is evaluated in float32, in which the interpolation on the edges is less precise
+    _check_same_points(mesh.vertices, expected_vertices, atol=1e-3)
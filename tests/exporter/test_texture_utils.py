@@ -0,0 +1,196 @@
+"""
+Test the texture rasterization and the textured mesh writers
+"""
+import json
+import struct
+
+import numpy as np
+import pytest
+import torch
+
+from nerfstudio.exporter.texture_utils import (
+    rasterize_uv_triangles,
+    write_glb,
+    write_obj,
+    write_ply,
+)
+
+
+def _get_textured_square():
+    """Returns a square of two triangles, split along a UV seam on its diagonal"""
+    vertices = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0], [0.0, 1.0, 0.0]])
+    faces = np.array([[0, 1, 2], [0, 2, 3]])
+    # The corners of vertex 2 have the same texture coordinates in both faces, but those of vertex 0 differ
+    texture_coordinates = np.array([[[0.1, 0.2], [0.4, 0.2], [0.4, 0.5]], [[0.6, 0.1], [0.4, 0.5], [0.9, 0.6]]])
+    vertex_normals = np.tile([[0.0, 0.0, 1.0]], (4, 1))
+    return vertices, faces, texture_coordinates, vertex_normals
+
+
+def _get_uv_layout():
+    """Returns the texture coordinates of a layout like those of xatlas: a chart of triangles sharing their edges,
+    an isolated triangle and a sliver, separated by empty texels"""
+    grid_u, grid_v = np.meshgrid(np.linspace(0.05, 0.45, 4), np.linspace(0.05, 0.6, 3), indexing="xy")
+    grid = np.stack([grid_u, grid_v], axis=-1)
+    grid[1, 1:3] += [0.03, -0.04]
+    triangles = []
+    for row in range(2):
+        for col in range(3):
+            triangles.append([grid[row, col], grid[row, col + 1], grid[row + 1, col + 1]])
+            triangles.append([grid[row, col], grid[row + 1, col + 1], grid[row + 1, col]])
+    triangles.append([[0.6, 0.1], [0.9, 0.2], [0.7, 0.45]])
+    triangles.append([[0.55, 0.6], [0.95, 0.62], [0.6, 0.65]])
+    return np.array(triangles)
+
+
+def _rasterize_brute_force(texture_coordinates, num_pixels_w, num_pixels_h, num_padding_pixels):
+    """Returns the distances of every pixel center to every triangle whose padded bounding box holds the pixel,
+    infinite for the other triangles, and the barycentric coordinates of the pixel centers in every triangle"""
+    image_size = np.array([num_pixels_w, num_pixels_h])
+    pixel_coordinates = texture_coordinates * image_size - 0.5
+    box_min = np.floor(pixel_coordinates.min(axis=1) - num_padding_pixels)
+    box_max = np.ceil(pixel_coordinates.max(axis=1) + num_padding_pixels)
+
+    y, x = np.meshgrid(np.arange(num_pixels_h), np.arange(num_pixels_w), indexing="ij")
+    pixels = np.stack([x, y], axis=-1)[:, :, None]  # (num_pixels_h, num_pixels_w, 1, 2)
+    p = (pixels + 0.5) / image_size
+    v0, v1, v2 = texture_coordinates[:, 0], texture_coordinates[:, 1], texture_coordinates[:, 2]
+
+    def cross(a, b, c):
+        return (a[..., 0] - b[..., 0]) * (c[..., 1] - b[..., 1]) - (a[..., 1] - b[..., 1]) * (c[..., 0] - b[..., 0])
+
+    barycentric_coordinates = np.stack([cross(p, v1, v2), cross(p, v2, v0), cross(p, v0, v1)], axis=-1)
+    barycentric_coordinates /= cross(v2, v0, v1)[:, None]
+    distances = np.abs(barycentric_coordinates).sum(axis=-1)
+    in_box = np.all((pixels >= box_min) & (pixels <= box_max), axis=-1)
+    distances[~in_box] = np.inf
+    return distances, barycentric_coordinates
+
+
+@pytest.mark.parametrize("num_pixels_per_chunk", [1 << 20, 300, 10])
+def test_rasterize_uv_triangles(num_pixels_per_chunk):
+    """Test that every pixel goes to its closest triangle, whatever the number of triangles processed at once"""
+    texture_coordinates = _get_uv_layout()
+    num_pixels_w, num_pixels_h, num_padding_pixels = 40, 32, 2
+    triangle_indices, barycentric_coordinates = rasterize_uv_triangles(
+        torch.from_numpy(texture_coordinates).float(),
+        num_pixels_w,
+        num_pixels_h,
+        num_padding_pixels=num_padding_pixels,
+        num_pixels_per_chunk=num_pixels_per_chunk,
+    )
+    assert triangle_indices.shape == (num_pixels_h, num_pixels_w)
+    assert barycentric_coordinates.shape == (num_pixels_h, num_pixels_w, 3)
+    triangle_indices = triangle_indices.numpy()
+    barycentric_coordinates = barycentric_coordinates.numpy()
+
+    expected_distances, expected_barycentric_coordinates = _rasterize_brute_force(
+        texture_coordinates.astype(np.float32).astype(np.float64), num_pixels_w, num_pixels_h, num_padding_pixels
+    )
+    covered = np.isfinite(expected_distances).any(axis=-1)
+    assert covered.any() and not covered.all()
+    assert np.all(triangle_indices[~covered] == 0)
+    assert np.allclose(barycentric_coordinates[~covered], 1.0 / 3.0)
+
+    # the picked triangle is one of the closest, and the only one unless another is as close up to rounding
+    y, x = np.nonzero(covered)
+    picked_distances = expected_distances[y, x, triangle_indices[y, x]]
+    sorted_distances = np.sort(expected_distances[y, x], axis=-1)
+    assert np.allclose(picked_distances, sorted_distances[:, 0], atol=1e-5)
+    unique = sorted_distances[:, 1] - sorted_distances[:, 0] > 1e-4
+    assert unique.mean() > 0.9
+    expected_triangle_indices = np.argmin(expected_distances[y, x], axis=-1)
+    assert np.array_equal(triangle_indices[y, x][unique], expected_triangle_indices[unique])
+    assert np.allclose(
+        barycentric_coordinates[y, x], expected_barycentric_coordinates[y, x, triangle_indices[y, x]], atol=1e-5
+    )
+
+
+def test_write_obj(tmp_path):
+    """Test that the OBJ file holds the mesh, with the texture coordinates of every corner flipped vertically"""
+    vertices, faces, texture_coordinates, vertex_normals = _get_textured_square()
+    write_obj(tmp_path / "mesh.obj", vertices, faces, texture_coordinates, vertex_normals, "material_0.mtl")
+    assert "map_Kd material_0.png" in (tmp_path / "material_0.mtl").read_text(encoding="utf-8")
+
+    rows = {"v": [], "vt": [], "vn": [], "f": []}
+    for line in (tmp_path / "mesh.obj").read_text(encoding="utf-8").splitlines():
+        keyword, *values = line.split()
+        if keyword in rows:
+            rows[keyword].append(values)
+    assert np.allclose(np.array(rows["v"], dtype=float), vertices)
+    assert np.allclose(np.array(rows["vn"], dtype=float), vertex_normals)
+    uvs = np.array(rows["vt"], dtype=float)
+    corners = np.array([[corner.split("/") for corner in face] for face in rows["f"]], dtype=int) - 1
+    assert corners.shape == (2, 3, 3)
+    assert np.array_equal(corners[..., 0], faces)
+    assert np.array_equal(corners[..., 2], faces)
+    assert np.allclose(
+        uvs[corners[..., 1]], np.stack([texture_coordinates[..., 0], 1.0 - texture_coordinates[..., 1]], -1)
+    )
+
+
+def test_write_ply(tmp_path):
+    """Test that the binary PLY file holds the mesh, with the texture coordinates of every corner flipped vertically"""
+    vertices, faces, texture_coordinates, vertex_normals = _get_textured_square()
+    write_ply(tmp_path / "mesh.ply", vertices, faces, texture_coordinates, vertex_normals, "material_0.png")
+
+    data = (tmp_path / "mesh.ply").read_bytes()
+    header, body = data.split(b"end_header\n", 1)
+    header_lines = header.decode("ascii").splitlines()
+    assert header_lines[:2] == ["ply", "format binary_little_endian 1.0"]
+    assert "comment TextureFile material_0.png" in header_lines
+    assert "element vertex 4" in header_lines and "element face 2" in header_lines
+
+    vertex_data = np.frombuffer(body, dtype="<f4", count=4 * 6).reshape(4, 6)
+    assert np.allclose(vertex_data[:, :3], vertices)
+    assert np.allclose(vertex_data[:, 3:], vertex_normals)
+    offset = vertex_data.nbytes
+    face_size = 1 + 3 * 4 + 1 + 6 * 4
+    assert len(body) == offset + 2 * face_size
+    for face_idx in range(2):
+        face = body[offset + face_idx * face_size : offset + (face_idx + 1) * face_size]
+        assert face[0] == 3 and face[13] == 6
+        assert np.array_equal(np.frombuffer(face[1:13], dtype="<i4"), faces[face_idx])
+        uvs = np.frombuffer(face[14:], dtype="<f4").reshape(3, 2)
+        assert np.allclose(uvs[:, 0], texture_coordinates[face_idx, :, 0])
+        assert np.allclose(uvs[:, 1], 1.0 - texture_coordinates[face_idx, :, 1])
+
+
+def test_write_glb(tmp_path):
+    """Test that the GLB file holds the mesh, split along the UV seams, in 4 byte aligned chunks"""
+    vertices, faces, texture_coordinates, vertex_normals = _get_textured_square()
+    texture_png = b"\x89PNG not really an image"
+    write_glb(tmp_path / "mesh.glb", vertices, faces, texture_coordinates, vertex_normals, texture_png)
+
+    data = (tmp_path / "mesh.glb").read_bytes()
+    magic, version, length = struct.unpack_from("<4sII", data, 0)
+    assert (magic, version, length) == (b"glTF", 2, len(data))
+    json_length, json_type = struct.unpack_from("<I4s", data, 12)
+    assert json_type == b"JSON" and json_length % 4 == 0
+    gltf = json.loads(data[20 : 20 + json_length])
+    binary_length, binary_type = struct.unpack_from("<I4s", data, 20 + json_length)
+    assert binary_type == b"BIN\x00" and binary_length % 4 == 0
+    assert 28 + json_length + binary_length == len(data)
+    binary_chunk = data[28 + json_length :]
+    assert gltf["buffers"] == [{"byteLength": binary_length}]
+
+    def read_accessor(accessor_idx, dtype, num_components):
+        accessor = gltf["accessors"][accessor_idx]
+        buffer_view = gltf["bufferViews"][accessor["bufferView"]]
+        assert buffer_view["byteOffset"] % 4 == 0
+        view = binary_chunk[buffer_view["byteOffset"] : buffer_view["byteOffset"] + buffer_view["byteLength"]]
+        return np.frombuffer(view, dtype=dtype).reshape(accessor["count"], num_components)
+
+    attributes = gltf["meshes"][0]["primitives"][0]["attributes"]
+    positions = read_accessor(attributes["POSITION"], "<f4", 3)
+    normals = read_accessor(attributes["NORMAL"], "<f4", 3)
+    uvs = read_accessor(attributes["TEXCOORD_0"], "<f4", 2)
+    indices = read_accessor(gltf["meshes"][0]["primitives"][0]["indices"], "<u4", 1).reshape(2, 3)
+    # Vertex 0 is split in two
+    assert len(positions) == 5
+    assert np.allclose(positions[indices], vertices[faces])
+    assert np.allclose(normals[indices], vertex_normals[faces])
+    # glTF has its texture coordinates origin at the top left corner of the image, so they are not flipped
+    assert np.allclose(uvs[indices], texture_coordinates)
+
+    image_view = gltf["bufferViews"][gltf["images"][0]["bufferView"]]
+    assert binary_chunk[image_view["byteOffset"] : image_view["byteOffset"] + image_view["byteLength"]] == texture_png
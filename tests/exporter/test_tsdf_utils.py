@@ -0,0 +1,119 @@
+"""
+Test the TSDF integration
+"""
+import torch
+import torch.nn.functional as F
+
+from nerfstudio.exporter.tsdf_utils import TSDF, SparseTSDF
+
+
+def _get_frames(num_frames, height=12, width=16, generator=None):
+    """Returns cameras looking down at a unit volume from around (0, 0, 3), and random depth and color images"""
+    c2w = torch.eye(4)[None].repeat(num_frames, 1, 1)
+    c2w[:, :3, 3] = torch.tensor([0.0, 0.0, 3.0]) + 0.3 * torch.randn((num_frames, 3), generator=generator)
+    K = torch.tensor([[8.0, 0.0, width / 2], [0.0, 8.0, height / 2], [0.0, 0.0, 1.0]])[None].repeat(num_frames, 1, 1)
+    depth_images = 1.5 + 2.5 * torch.rand((num_frames, 1, height, width), generator=generator)
+    # Pixels without depth are not integrated
+    depth_images[torch.rand(depth_images.shape, generator=generator) < 0.2] = 0.0
+    color_images = torch.rand((num_frames, 3, height, width), generator=generator)
+    return c2w, K, depth_images, color_images
+
+
+def _integrate_sequentially(tsdf, c2w, K, depth_images, color_images):
+    """Integrates the images one after the other, as the TSDF used to"""
+    voxel_world_coords = torch.cat([tsdf.voxel_coords.view(3, -1), torch.ones(1, tsdf.values.numel())])
+    values = tsdf.values.view(-1)
+    weights = tsdf.weights.view(-1)
+    colors = tsdf.colors.view(-1, 3)
+    image_size = torch.tensor([depth_images.shape[-1], depth_images.shape[-2]])
+    for i in range(c2w.shape[0]):
+        voxel_cam_coords = torch.inverse(c2w[i]) @ voxel_world_coords
+        voxel_cam_coords[1:3] = -voxel_cam_coords[1:3]
+        voxel_depth = torch.linalg.norm(voxel_cam_coords[:3], dim=0)
+        voxel_pixel_coords = (K[i] @ (voxel_cam_coords[:3] / voxel_cam_coords[2:3]))[:2]
+        grid = (2.0 * voxel_pixel_coords.T / image_size - 1.0)[None, None]
+        sampled_depth = F.grid_sample(depth_images[i : i + 1], grid, mode="nearest", align_corners=False)[0, 0, 0]
+        sampled_colors = F.grid_sample(color_images[i : i + 1], grid, mode="nearest", align_corners=False)[0, :, 0].T
+        dist = sampled_depth - voxel_depth
+        valid = (voxel_depth > 0) & (sampled_depth > 0) & (dist > -tsdf.truncation)
+        total_weights = weights[valid] + 1.0
+        new_values = torch.clamp(dist[valid] / tsdf.truncation, min=-1.0, max=1.0)
+        values[valid] = (values[valid] * weights[valid] + new_values) / total_weights
+        colors[valid] = (colors[valid] * weights[valid, None] + sampled_colors[valid]) / total_weights[:, None]
+        weights[valid] = torch.clamp(total_weights, max=1.0)
+
+
+def _get_tsdf(volume_dims=(10, 12, 14)):
+    """Returns an empty TSDF of the unit volume"""
+    return TSDF.from_aabb(torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]]), torch.tensor(volume_dims))
+
+
+def test_integrate_tsdf():
+    """Test that integrating a batch of images at once matches integrating them one after the other"""
+    generator = torch.Generator().manual_seed(0)
+    tsdf = _get_tsdf()
+    tsdf.truncation_margin = 2.0
+    reference_tsdf = _get_tsdf()
+    reference_tsdf.truncation_margin = 2.0
+    # The second batch updates voxels that already have a weight
+    for _ in range(2):
+        c2w, K, depth_images, color_images = _get_frames(4, generator=generator)
+        tsdf.integrate_tsdf(c2w, K, depth_images, color_images=color_images, num_voxels_per_tile=500)
+        _integrate_sequentially(reference_tsdf, c2w, K, depth_images, color_images)
+    assert 0 < int(torch.count_nonzero(tsdf.weights)) < tsdf.weights.numel()
+    assert torch.equal(tsdf.weights, reference_tsdf.weights)
+    assert torch.allclose(tsdf.values, reference_tsdf.values, atol=1e-5)
+    assert torch.allclose(tsdf.colors, reference_tsdf.colors, atol=1e-5)
+
+
+def _get_plane_frames(num_frames, height=24, width=32, generator=None):
+    """Returns cameras looking down at the tilted plane z = 0.2 x + 0.1, and its depth images"""
+    c2w = torch.eye(4)[None].repeat(num_frames, 1, 1)
+    c2w[:, :3, 3] = torch.tensor([0.0, 0.0, 3.0]) + 0.2 * torch.randn((num_frames, 3), generator=generator)
+    K = torch.tensor([[10.0, 0.0, width / 2], [0.0, 10.0, height / 2], [0.0, 0.0, 1.0]])[None].repeat(num_frames, 1, 1)
+    pixel_coords = torch.stack(torch.meshgrid(torch.arange(width), torch.arange(height), indexing="xy"), dim=-1) + 0.5
+    directions = torch.cat([pixel_coords, torch.ones((height, width, 1))], dim=-1) @ torch.inverse(K[0]).T
+    directions = directions * torch.tensor([1.0, -1.0, -1.0])
+    directions = directions / torch.linalg.norm(directions, dim=-1, keepdim=True)
+    # distance along the rays to the plane
+    normal = torch.tensor([0.2, 0.0, -1.0])
+    origins = c2w[:, None, None, :3, 3]
+    depths = (-0.1 - torch.sum(origins * normal, dim=-1)) / torch.sum(directions * normal, dim=-1)
+    color_images = torch.rand((num_frames, 3, height, width), generator=generator)
+    return c2w, K, depths[:, None], color_images
+
+
+def _sort_rows(rows):
+    """Returns the rows sorted lexicographically"""
+    for column in reversed(range(rows.shape[1])):
+        rows = rows[torch.sort(rows[:, column], stable=True)[1]]
+    return rows
+
+
+def test_sparse_tsdf():
+    """Test that the sparse TSDF gives the same mesh as the dense TSDF"""
+    generator = torch.Generator().manual_seed(0)
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    volume_dims = torch.tensor([32, 32, 32])
+    tsdf = TSDF.from_aabb(aabb, volume_dims)
+    sparse_tsdf = SparseTSDF.from_aabb(aabb, volume_dims, block_size=4)
+    # The blocks are allocated over several batches
+    for _ in range(3):
+        c2w, K, depth_images, color_images = _get_plane_frames(2, generator=generator)
+        tsdf.integrate_tsdf(c2w, K, depth_images, color_images=color_images)
+        sparse_tsdf.integrate_tsdf(c2w, K, depth_images, color_images=color_images, num_blocks_per_tile=50)
+    assert 0 < sparse_tsdf.num_blocks < 8**3
+    assert sparse_tsdf.values.shape[0] >= sparse_tsdf.num_blocks
+    keys = sparse_tsdf.block_keys[: sparse_tsdf.num_blocks]
+    assert torch.equal(sparse_tsdf.sorted_block_keys, torch.sort(keys)[0])
+    assert torch.equal(keys[sparse_tsdf.sorted_block_indices], sparse_tsdf.sorted_block_keys)
+
+    mesh = tsdf.get_mesh()
+    sparse_mesh = sparse_tsdf.get_mesh()
+    assert len(sparse_mesh.faces) == len(mesh.faces) > 0
+    vertices = torch.cat([mesh.vertices, mesh.colors], dim=-1)
+    sparse_vertices = torch.cat([sparse_mesh.vertices.to(mesh.vertices), sparse_mesh.colors], dim=-1)
+    assert torch.allclose(_sort_rows(sparse_vertices), _sort_rows(vertices), atol=1e-5)
+    face_centers = _sort_rows(mesh.vertices[mesh.faces.long()].mean(dim=1))
+    sparse_face_centers = _sort_rows(sparse_mesh.vertices[sparse_mesh.faces.long()].mean(dim=1).to(face_centers))
+    assert torch.allclose(sparse_face_centers, face_centers, atol=1e-5)
@@ -1,6 +1,8 @@
 """
 Encoding Tests
 """
+import itertools
+
 import pytest
 import torch
 
@@ -171,6 +173,26 @@ def test_tensor_hash_encoder():
     assert encoded.shape == (10, out_dim)
 
 
+def test_tensor_hash_encoder_torch():
+    """Test the torch hash encoding against trilinear interpolation of the hashed cell corners"""
+    encoder = encodings.HashEncoding(num_levels=4, max_res=64, log2_hashmap_size=10, implementation="torch")
+    in_tensor = torch.rand((7, 5, 3))
+    encoded = encoder(in_tensor)
+    assert encoded.shape == (7, 5, 8)
+
+    scaled = in_tensor[..., None, :] * encoder.scalings.view(-1, 1)
+    expected = torch.zeros((7, 5, 4, 2))
+    for corner in itertools.product([False, True], repeat=3):
+        corner = torch.tensor(corner)
+        grid_coords = torch.where(corner, torch.ceil(scaled), torch.floor(scaled)).long()
+        weights = torch.where(corner, scaled - torch.floor(scaled), 1 - scaled + torch.floor(scaled))
+        expected += torch.prod(weights, dim=-1, keepdim=True) * encoder.hash_table[encoder.hash_fn(grid_coords)]
+    assert torch.allclose(encoded, expected.view(7, 5, 8), atol=1e-6)
+
+    encoder.chunk_size = 4
+    assert torch.allclose(encoder(in_tensor), encoded)
+
+
 if __name__ == "__main__":
     test_scaling_and_offset()
     test_nerf_encoder()
@@ -179,3 +201,4 @@ if __name__ == "__main__":
     test_tensor_cp_encoder()
     test_tensor_sh_encoder()
     test_tensor_hash_encoder()
+    test_tensor_hash_encoder_torch()
@@ -0,0 +1,22 @@
+"""
+Test losses
+"""
+import torch
+
+from nerfstudio.model_components.losses import MSELoss, weighted_rgb_loss
+
+
+def test_weighted_rgb_loss():
+    """Test that the rgb loss is the mean squared error, with each ray scaled by its loss weight"""
+    image = torch.rand((8, 3))
+    rgb = torch.rand((8, 3))
+    assert torch.allclose(weighted_rgb_loss(image, rgb), MSELoss()(image, rgb))
+
+    loss_weights = torch.zeros(8)
+    loss_weights[:4] = 2.0
+    expected_loss = 2.0 * MSELoss(reduction="sum")(image[:4], rgb[:4]) / image.numel()
+    assert torch.allclose(weighted_rgb_loss(image, rgb, loss_weights), expected_loss)
+
+
+if __name__ == "__main__":
+    test_weighted_rgb_loss()
@@ -0,0 +1,44 @@
+"""
+Test baked occupancy grids
+"""
+import torch
+
+from nerfstudio.field_components.spatial_distortions import SceneContraction
+from nerfstudio.model_components.occupancy_grids import BakedOccupancyGrid
+
+
+def test_baked_occupancy_grid():
+    """Test baking, querying and reloading an occupancy grid in contracted space"""
+    aabb = torch.tensor([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    occupancy_grid = BakedOccupancyGrid(aabb, resolution=32, spatial_distortion=SceneContraction(order=float("inf")))
+
+    positions = torch.randn((1000, 3)) * 3
+    normalized_positions = occupancy_grid.get_normalized_positions(positions)
+    assert torch.allclose(occupancy_grid.get_world_positions(normalized_positions), positions, atol=1e-3, rtol=1e-3)
+
+    def density_fn(positions):
+        """Ball of radius 0.5 around (0.2, 0, 0)"""
+        return (torch.linalg.norm(positions - torch.tensor([0.2, 0.0, 0.0]), dim=-1, keepdim=True) < 0.5).float()
+
+    assert not occupancy_grid.is_baked
+    assert torch.all(occupancy_grid.get_occupancy(positions))
+    occupancy_grid.bake([density_fn], density_threshold=0.5)
+    assert occupancy_grid.is_baked
+
+    occupancy = occupancy_grid.get_occupancy(positions)
+    assert torch.equal(occupancy_grid(positions), occupancy)
+    assert torch.equal(dict(occupancy_grid.named_buffers())["bitfield"], occupancy_grid.bitfield)
+    assert torch.all(occupancy[density_fn(positions)[:, 0] > 0])
+    assert not torch.any(occupancy[torch.linalg.norm(positions - torch.tensor([0.2, 0.0, 0.0]), dim=-1) > 1.0])
+    masked_density_fn = occupancy_grid.mask_density_fn(density_fn)
+    assert torch.equal(masked_density_fn(positions), density_fn(positions))
+
+    # Baked grids reload as baked, and checkpoints without a baked grid load as unbaked
+    reloaded_grid = BakedOccupancyGrid(aabb, resolution=32, spatial_distortion=SceneContraction(order=float("inf")))
+    reloaded_grid.load_state_dict(occupancy_grid.state_dict())
+    assert torch.equal(reloaded_grid.get_occupancy(positions), occupancy)
+    reloaded_grid.load_state_dict({})
+    assert reloaded_grid.is_baked
+    unbaked_grid = BakedOccupancyGrid(aabb, resolution=32)
+    unbaked_grid.load_state_dict({})
+    assert not unbaked_grid.is_baked
@@ -0,0 +1,49 @@
+"""
+Test ray generators
+"""
+import torch
+
+from nerfstudio.cameras.camera_optimizers import CameraOptimizerConfig
+from nerfstudio.cameras.cameras import Cameras
+from nerfstudio.cameras.lie_groups import exp_map_SO3xR3
+from nerfstudio.model_components.ray_generators import RayGenerator
+
+
+def test_direction_lut_matches_generate_rays():
+    """Test that rays from the precomputed directions match rays generated on the fly"""
+    num_cameras = 3
+    camera_to_worlds = exp_map_SO3xR3(torch.randn((num_cameras, 6)) * 0.5)
+    distortion_params = torch.tensor([[0.1, -0.05, 0.0, 0.0, 0.01, -0.02]]).repeat(num_cameras, 1)
+    distortion_params[2] = 0.0
+    cameras = Cameras(
+        camera_to_worlds=camera_to_worlds,
+        fx=torch.tensor([[20.0], [20.0], [25.0]]),
+        fy=torch.tensor([[20.0], [20.0], [24.0]]),
+        cx=16.0,
+        cy=12.0,
+        width=32,
+        height=24,
+        distortion_params=distortion_params,
+    )
+    camera_optimizer = CameraOptimizerConfig(mode="off").setup(num_cameras=num_cameras, device="cpu")
+
+    ray_generator = RayGenerator(cameras, camera_optimizer)
+    lut_ray_generator = RayGenerator(cameras, camera_optimizer, use_direction_lut=True)
+    assert lut_ray_generator.use_direction_lut
+    assert lut_ray_generator.direction_lut.shape == (2, 24, 32, 3)
+
+    num_rays = 100
+    ray_indices = torch.stack(
+        [
+            torch.randint(0, num_cameras, (num_rays,)),
+            torch.randint(0, 24, (num_rays,)),
+            torch.randint(0, 32, (num_rays,)),
+        ],
+        dim=-1,
+    )
+    ray_bundle = ray_generator(ray_indices)
+    lut_ray_bundle = lut_ray_generator(ray_indices)
+    assert torch.allclose(ray_bundle.origins, lut_ray_bundle.origins)
+    assert torch.allclose(ray_bundle.directions, lut_ray_bundle.directions, atol=1e-5)
+    assert torch.allclose(ray_bundle.pixel_area, lut_ray_bundle.pixel_area, rtol=1e-4, atol=1e-9)
+    assert torch.equal(ray_bundle.camera_indices, lut_ray_bundle.camera_indices)
@@ -5,12 +5,16 @@ Test samplers
 import torch
 
 from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.model_components import renderers
 from nerfstudio.model_components.ray_samplers import (
     LinearDisparitySampler,
     LogSampler,
     PDFSampler,
+    ProposalNetworkSampler,
     SqrtSampler,
     UniformSampler,
+    pack_ray_samples,
+    unpack_sample_values,
 )
 from nerfstudio.model_components.scene_colliders import NearFarCollider
 
@@ -108,6 +112,88 @@ def test_pdf_sampler():
     # TODO Tancik: Add more precise tests
 
 
+def test_packed_ray_samples():
+    """Test that packed samples render the same as the dense samples they were packed from"""
+    num_rays, num_samples = 10, 16
+    origins = torch.zeros((num_rays, 3))
+    directions = torch.nn.functional.normalize(torch.randn((num_rays, 3)), dim=-1)
+    ray_bundle = RayBundle(origins=origins, directions=directions, pixel_area=torch.ones((num_rays, 1)))
+    ray_bundle = NearFarCollider(near_plane=2, far_plane=4)(ray_bundle)
+    ray_samples = UniformSampler(num_samples=num_samples)(ray_bundle)
+    densities = torch.rand((num_rays, num_samples, 1)) * 5
+    rgb = torch.rand((num_rays, num_samples, 3))
+
+    # Keeping every sample must not change anything
+    mask = torch.ones((num_rays, num_samples), dtype=torch.bool)
+    packed_samples, packed_info, ray_indices = pack_ray_samples(ray_samples, mask)
+    assert packed_info[:, 1].tolist() == [num_samples] * num_rays
+    weights = ray_samples.get_weights(densities)
+    packed_weights = packed_samples.get_weights_packed(densities[mask], ray_indices, num_rays)
+    assert torch.allclose(unpack_sample_values(packed_weights, mask), weights, atol=1e-6)
+
+    packed_kwargs = {"ray_indices": ray_indices, "num_rays": num_rays}
+    rgb_renderer = renderers.RGBRenderer(background_color="last_sample")
+    assert torch.allclose(
+        rgb_renderer(rgb=rgb[mask], weights=packed_weights, **packed_kwargs), rgb_renderer(rgb=rgb, weights=weights)
+    )
+    depth_renderer = renderers.DepthRenderer(method="median")
+    assert torch.allclose(
+        depth_renderer(packed_weights, packed_samples, **packed_kwargs), depth_renderer(weights, ray_samples)
+    )
+    acc_renderer = renderers.AccumulationRenderer()
+    assert torch.allclose(acc_renderer(packed_weights, **packed_kwargs), acc_renderer(weights), atol=1e-6)
+
+    # Dropping empty samples only drops their weight
+    mask = torch.rand((num_rays, num_samples)) > 0.5
+    mask[..., -1] = True
+    densities[~mask] = 0.0
+    packed_samples, packed_info, ray_indices = pack_ray_samples(ray_samples, mask)
+    assert torch.equal(packed_info[:, 1], mask.sum(dim=-1))
+    assert torch.equal(packed_info[1:, 0], torch.cumsum(packed_info[:-1, 1], dim=0))
+    packed_weights = packed_samples.get_weights_packed(densities[mask], ray_indices, num_rays)
+    assert torch.allclose(unpack_sample_values(packed_weights, mask), ray_samples.get_weights(densities), atol=1e-6)
+
+
+def test_proposal_sample_mask():
+    """Test that terminating rays early with the proposal transmittance barely changes renders"""
+    torch.manual_seed(0)
+    num_rays = 32
+    origins = torch.zeros((num_rays, 3))
+    directions = torch.nn.functional.normalize(torch.randn((num_rays, 3)), dim=-1)
+    ray_bundle = RayBundle(origins=origins, directions=directions, pixel_area=torch.ones((num_rays, 1)) * 1e-4)
+    ray_bundle = NearFarCollider(near_plane=0.05, far_plane=10.0)(ray_bundle)
+
+    def density_fn(positions):
+        """Solid outside of a sphere of radius 2"""
+        radius = torch.linalg.norm(positions, dim=-1, keepdim=True)
+        return 200.0 * (radius > 2.0).float()
+
+    sampler = ProposalNetworkSampler(
+        num_proposal_samples_per_ray=(64, 32), num_nerf_samples_per_ray=48, num_proposal_network_iterations=2
+    )
+    ray_samples, weights_list, ray_samples_list = sampler.generate_ray_samples(ray_bundle, [density_fn, density_fn])
+    densities = density_fn(ray_samples.frustums.get_positions())
+    rgb = torch.rand((*ray_samples.shape, 3))
+    rgb_renderer = renderers.RGBRenderer(background_color=torch.zeros(3))
+    weights = ray_samples.get_weights(densities)
+    dense_rgb = rgb_renderer(rgb=rgb, weights=weights)
+
+    mask = sampler.get_sample_mask(ray_samples, weights_list, ray_samples_list, min_transmittance=1e-4)
+    assert torch.all(mask[..., 0])
+    assert not torch.all(mask)
+    packed_samples, _, ray_indices = pack_ray_samples(ray_samples, mask)
+    packed_weights = packed_samples.get_weights_packed(densities[mask], ray_indices, num_rays)
+    packed_rgb = rgb_renderer(rgb=rgb[mask], weights=packed_weights, ray_indices=ray_indices, num_rays=num_rays)
+
+    # The render changes by at most the weight of the dropped samples, which is the transmittance at the first of them
+    dropped_weights = torch.sum(weights[..., 0] * ~mask, dim=-1)
+    assert torch.all(torch.abs(packed_rgb - dense_rgb) <= dropped_weights[:, None] + 1e-6)
+    # It exceeds min_transmittance where the proposal overestimates the attenuation of the bin the sphere is hit in
+    assert torch.all(dropped_weights < 5e-3)
+
+
 if __name__ == "__main__":
     test_uniform_sampler()
     test_pdf_sampler()
+    test_packed_ray_samples()
+    test_proposal_sample_mask()
@@ -82,8 +82,69 @@ def test_depth_renderer():
     assert torch.min(depth) > 0
 
 
+def test_composite_renderer():
+    """Test that the fused weights and composite match the separate renderers"""
+    num_rays, num_samples = 5, 12
+    starts = torch.sort(torch.rand((num_rays, num_samples, 1), dtype=torch.float64) * 4 + 1, dim=-2)[0]
+    ends = torch.cat([starts[..., 1:, :], starts[..., -1:, :] + 0.1], dim=-2)
+    frustums = Frustums(
+        origins=torch.zeros((num_rays, num_samples, 3)),
+        directions=torch.ones((num_rays, num_samples, 3)),
+        starts=starts,
+        ends=ends,
+        pixel_area=torch.ones((num_rays, num_samples, 1)),
+    )
+    ray_samples = RaySamples(frustums=frustums, deltas=ends - starts)
+    densities = torch.rand((num_rays, num_samples, 1), dtype=torch.float64, requires_grad=True)
+    rgb = torch.rand((num_rays, num_samples, 3), dtype=torch.float64, requires_grad=True)
+
+    def reference_weights(densities):
+        delta_density = ray_samples.deltas * densities
+        transmittance = torch.exp(-torch.cumsum(delta_density, dim=-2) + delta_density)
+        return transmittance * (1 - torch.exp(-delta_density))
+
+    weights = ray_samples.get_weights(densities)
+    assert torch.allclose(weights, reference_weights(densities))
+    assert torch.autograd.gradcheck(ray_samples.get_weights, (densities,))
+
+    background_color = torch.tensor([0.1, 0.2, 0.3], dtype=torch.float64)
+    ray_indices = torch.arange(num_rays)[:, None].repeat(1, num_samples).view(-1)
+    for depth_method in ("median", "expected"):
+        composite_renderer = renderers.CompositeRenderer(background_color=background_color, depth_method=depth_method)
+        comp_rgb, depth, accumulation = composite_renderer(rgb=rgb, weights=weights, ray_samples=ray_samples)
+        expected_rgb = renderers.RGBRenderer(background_color=background_color)(rgb=rgb, weights=weights)
+        assert torch.allclose(comp_rgb, expected_rgb)
+        assert torch.allclose(depth, renderers.DepthRenderer(method=depth_method)(weights, ray_samples))
+        assert torch.allclose(accumulation, renderers.AccumulationRenderer()(weights))
+
+        # The samples of every ray packed together
+        packed_outputs = composite_renderer(
+            rgb=rgb.view(-1, 3),
+            weights=weights.view(-1, 1),
+            ray_samples=ray_samples.flatten(),
+            ray_indices=ray_indices,
+            num_rays=num_rays,
+        )
+        for packed_output, output in zip(packed_outputs, (comp_rgb, depth, accumulation)):
+            assert torch.allclose(packed_output, output)
+
+        def composite(densities, rgb, renderer=composite_renderer):
+            comp_rgb, _, accumulation = renderer(
+                rgb=rgb, weights=ray_samples.get_weights(densities), ray_samples=ray_samples
+            )
+            return comp_rgb, accumulation
+
+        assert torch.autograd.gradcheck(composite, (densities, rgb))
+
+    def composite_expected_depth(densities, rgb):
+        return composite_renderer(rgb=rgb, weights=ray_samples.get_weights(densities), ray_samples=ray_samples)[1]
+
+    assert torch.autograd.gradcheck(composite_expected_depth, (densities, rgb))
+
+
 if __name__ == "__main__":
     test_rgb_renderer()
     test_sh_renderer()
     test_acc_renderer()
     test_depth_renderer()
+    test_composite_renderer()
@@ -0,0 +1,154 @@
+"""
+Test the evaluation of models on the rays of a whole camera
+"""
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from nerfstudio.cameras.rays import RayBundle
+from nerfstudio.data.scene_box import SceneBox
+from nerfstudio.models.base_model import Model, ModelConfig
+
+
+class _StubModel(Model):
+    """Model whose outputs are simple functions of the rays, and which runs out of memory on large chunks"""
+
+    def __init__(self, config, max_num_rays_per_chunk=None, device=None):
+        super().__init__(
+            config=config, scene_box=SceneBox(aabb=torch.tensor([[-1.0] * 3, [1.0] * 3])), num_train_data=1
+        )
+        self.max_num_rays_per_chunk = max_num_rays_per_chunk
+        self.stub_device = device
+        self.num_rays_per_forward = []
+
+    @property
+    def device(self):
+        return self.device_indicator_param.device if self.stub_device is None else self.stub_device
+
+    def get_param_groups(self):
+        return {}
+
+    def get_outputs(self, ray_bundle):
+        self.num_rays_per_forward.append(len(ray_bundle))
+        if self.max_num_rays_per_chunk is not None and len(ray_bundle) > self.max_num_rays_per_chunk:
+            raise RuntimeError("CUDA out of memory. Tried to allocate a chunk that is too large")
+        return {
+            "rgb": torch.sigmoid(ray_bundle.directions + ray_bundle.origins),
+            "depth": torch.norm(ray_bundle.origins, dim=-1, keepdim=True),
+            "camera_indices": ray_bundle.camera_indices,
+        }
+
+    def get_loss_dict(self, outputs, batch, metrics_dict=None):
+        return {}
+
+    def get_image_metrics_and_images(self, outputs, batch):
+        return {}, {}
+
+
+def _get_camera_ray_bundle(image_height=6, image_width=5):
+    """Returns the rays of a random camera"""
+    return RayBundle(
+        origins=torch.randn((image_height, image_width, 3)),
+        directions=torch.randn((image_height, image_width, 3)),
+        pixel_area=torch.ones((image_height, image_width, 1)),
+        camera_indices=torch.randint(0, 10, (image_height, image_width, 1)),
+    )
+
+
+def _check_outputs(outputs, model, camera_ray_bundle):
+    """Checks the outputs against the outputs of the whole camera rendered at once"""
+    model.max_num_rays_per_chunk = None
+    expected_outputs = model.get_outputs(camera_ray_bundle.flatten())
+    assert set(outputs) == {"rgb", "depth", "camera_indices"}
+    for output_name, output in outputs.items():
+        expected_output = expected_outputs[output_name].view(*camera_ray_bundle.shape, -1)
+        assert output.dtype == expected_output.dtype
+        # Vectorized kernels may round the tail of a chunk differently
+        assert torch.allclose(output, expected_output)
+
+
+@pytest.mark.parametrize("outputs_to_cpu", [False, True])
+def test_get_outputs_for_camera_ray_bundle(outputs_to_cpu):
+    """Test that the chunks are written into the outputs in place"""
+    model = _StubModel(ModelConfig(enable_collider=False, eval_num_rays_per_chunk=7))
+    camera_ray_bundle = _get_camera_ray_bundle()
+    outputs = model.get_outputs_for_camera_ray_bundle(camera_ray_bundle, outputs_to_cpu=outputs_to_cpu)
+    assert model.num_rays_per_forward == [7, 7, 7, 7, 2]
+    assert all(output.device.type == "cpu" for output in outputs.values())
+    _check_outputs(outputs, model, camera_ray_bundle)
+
+
+def _fake_cuda_memory(monkeypatch, model):
+    """Reports the memory statistics of a GPU on which every ray takes 100 bytes, for a model rendering on the CPU"""
+    monkeypatch.setattr(torch.cuda, "reset_peak_memory_stats", lambda device: None)
+    monkeypatch.setattr(torch.cuda, "empty_cache", lambda: None)
+    monkeypatch.setattr(torch.cuda, "memory_allocated", lambda device: 0)
+    monkeypatch.setattr(torch.cuda, "memory_reserved", lambda device: 0)
+    monkeypatch.setattr(torch.cuda, "max_memory_allocated", lambda device: 100 * model.num_rays_per_forward[-1])
+    monkeypatch.setattr(torch.cuda, "mem_get_info", lambda device: (5000, 10000))
+    monkeypatch.setattr(torch.cuda, "current_stream", lambda device: SimpleNamespace(synchronize=lambda: None))
+
+
+def test_get_outputs_for_camera_ray_bundle_out_of_memory(monkeypatch):
+    """Test that adaptive chunks are resized to the free memory, and halved when they run out of memory"""
+    config = ModelConfig(enable_collider=False, eval_num_rays_per_chunk=8, eval_adaptive_chunk_size=True)
+    model = _StubModel(config, max_num_rays_per_chunk=10, device=torch.device("cuda"))
+    _fake_cuda_memory(monkeypatch, model)
+    camera_ray_bundle = _get_camera_ray_bundle()
+    outputs = model.get_outputs_for_camera_ray_bundle(camera_ray_bundle, outputs_to_cpu=True)
+    # 5000 * 0.8 free bytes fit 40 rays, clamped to the 22 and 12 rays left, which run out of memory until the chunk
+    # is halved down to 10 rays
+    assert model.num_rays_per_forward == [8, 22, 20, 10, 12, 12, 10, 2]
+    _check_outputs(outputs, model, camera_ray_bundle)
+
+
+def test_get_outputs_for_camera_ray_bundle_single_ray_out_of_memory(monkeypatch):
+    """Test that running out of memory on a single ray is raised instead of retried"""
+    config = ModelConfig(enable_collider=False, eval_num_rays_per_chunk=2, eval_adaptive_chunk_size=True)
+    model = _StubModel(config, max_num_rays_per_chunk=0, device=torch.device("cuda"))
+    _fake_cuda_memory(monkeypatch, model)
+    with pytest.raises(RuntimeError, match="out of memory"):
+        model.get_outputs_for_camera_ray_bundle(_get_camera_ray_bundle())
+    assert model.num_rays_per_forward == [2, 1]
+
+
+@pytest.mark.parametrize("eval_cpu_bf16", [False, True])
+def test_get_outputs_on_cpu_workers(eval_cpu_bf16):
+    """Test that rendering chunks on CPU workers matches rendering them one after the other"""
+    config = ModelConfig(enable_collider=False, eval_num_rays_per_chunk=4, eval_num_cpu_workers=3)
+    config.eval_cpu_bf16 = eval_cpu_bf16
+    model = _StubModel(config)
+    camera_ray_bundle = _get_camera_ray_bundle()
+    num_threads = torch.get_num_threads()
+    # More threads than workers, so that every worker is given fewer threads
+    torch.set_num_threads(6)
+    try:
+        outputs = model.get_outputs_for_camera_ray_bundle(camera_ray_bundle)
+        assert torch.get_num_threads() == 6
+    finally:
+        torch.set_num_threads(num_threads)
+    assert sorted(model.num_rays_per_forward) == [2] + [4] * 7
+    if eval_cpu_bf16:
+        assert outputs["rgb"].dtype == torch.float32
+        expected_outputs = _StubModel(ModelConfig(enable_collider=False)).get_outputs_for_camera_ray_bundle(
+            camera_ray_bundle
+        )
+        assert torch.allclose(outputs["rgb"], expected_outputs["rgb"], atol=1e-2)
+        assert torch.equal(outputs["camera_indices"], expected_outputs["camera_indices"])
+    else:
+        _check_outputs(outputs, model, camera_ray_bundle)
+
+
+def test_get_outputs_on_cpu_workers_error():
+    """Test that the torch threads are restored when a worker raises"""
+    config = ModelConfig(enable_collider=False, eval_num_rays_per_chunk=4, eval_num_cpu_workers=3)
+    model = _StubModel(config, max_num_rays_per_chunk=3)
+    num_threads = torch.get_num_threads()
+    torch.set_num_threads(6)
+    try:
+        with pytest.raises(RuntimeError, match="out of memory"):
+            model.get_outputs_for_camera_ray_bundle(_get_camera_ray_bundle())
+        assert torch.get_num_threads() == 6
+    finally:
+        torch.set_num_threads(num_threads)
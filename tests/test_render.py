@@ -0,0 +1,155 @@
+# pylint: disable=protected-access
+"""
+Test the helpers used to render trajectories
+"""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+import mediapy as media
+import numpy as np
+import pytest
+import torch
+
+from nerfstudio.cameras.cameras import Cameras
+from scripts import render
+
+
+def _get_cameras(num_cameras: int, height=4, width=5) -> Cameras:
+    """Returns cameras at the origin looking down the same axis"""
+    return Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3].repeat(num_cameras, 1, 1),
+        fx=10.0,
+        fy=10.0,
+        cx=width / 2,
+        cy=height / 2,
+        width=width,
+        height=height,
+    )
+
+
+def test_get_frame_batches():
+    """Test that frames are batched to fill the chunks, and jagged cameras are rendered one frame at a time"""
+    frame_indices = [0, 2, 3, 4, 6]
+    batches = render._get_frame_batches(_get_cameras(7), frame_indices, num_rays_per_chunk=45)
+    assert batches == [[0, 2], [3, 4], [6]]
+    batches = render._get_frame_batches(_get_cameras(7), frame_indices, num_rays_per_chunk=10)
+    assert batches == [[0], [2], [3], [4], [6]]
+    jagged_cameras = Cameras(
+        camera_to_worlds=torch.eye(4)[None, :3].repeat(2, 1, 1),
+        fx=10.0,
+        fy=10.0,
+        cx=2.0,
+        cy=2.0,
+        width=torch.tensor([[5], [3]]),
+        height=4,
+    )
+    assert render._get_frame_batches(jagged_cameras, [0, 1], num_rays_per_chunk=1000) == [[0], [1]]
+
+
+def test_get_frame_images():
+    """Test that the outputs of a batch of frames are split into the image of each frame"""
+    cameras = _get_cameras(3)
+    camera_indices = [2, 0, 1]
+    camera_ray_bundle = render._generate_frame_rays(cameras, camera_indices)
+    assert camera_ray_bundle.shape == (4, 5, 3)
+    assert torch.equal(camera_ray_bundle.camera_indices[0, 0, :, 0], torch.tensor(camera_indices))
+    # Outputs rendered for the whole batch of rays, as returned by get_outputs_for_camera_ray_bundle
+    rgb = torch.rand((4, 5, 3, 3))
+    depth = torch.rand((4, 5, 3, 1))
+    outputs = {"rgb": rgb.view(4, 5, -1), "depth": depth.view(4, 5, -1)}
+    render_images = render._get_frame_images(outputs, ["rgb", "depth"], num_frames=3)
+    assert len(render_images) == 3
+    for frame_idx, render_image in enumerate(render_images):
+        expected_image = torch.cat([rgb[:, :, frame_idx], depth[:, :, frame_idx].repeat(1, 1, 3)], dim=1)
+        assert render_image.shape == (4, 10, 3)
+        assert torch.equal(torch.from_numpy(render_image), expected_image)
+
+
+def test_get_frame_indices():
+    """Test that the shards cover every frame exactly once"""
+    for num_frames in (1, 7, 30):
+        for num_shards in range(1, 9):
+            frame_indices = []
+            for shard_idx in range(num_shards):
+                render_trajectory = render.RenderTrajectory(
+                    load_config=Path("config.yml"), shard=f"{shard_idx}/{num_shards}"
+                )
+                frame_indices += render_trajectory._get_frame_indices(num_frames)
+            assert frame_indices == list(range(num_frames))
+    assert render.RenderTrajectory(load_config=Path("config.yml"))._get_frame_indices(5) is None
+    for shard in ("2/2", "-1/2", "1", "a/b"):
+        with pytest.raises(SystemExit):
+            render.RenderTrajectory(load_config=Path("config.yml"), shard=shard)._get_frame_indices(5)
+
+
+class _StubModel:  # pylint: disable=too-few-public-methods
+    """Renders every frame in a uniform color given by its camera index"""
+
+    def __init__(self, num_rays_per_chunk):
+        self.config = SimpleNamespace(eval_num_rays_per_chunk=num_rays_per_chunk)
+        self.rendered_camera_indices = []
+
+    def get_outputs_for_camera_ray_bundle(self, camera_ray_bundle, outputs_to_cpu=False):
+        """Returns the color of the frames, stacked along the last dimension"""
+        assert outputs_to_cpu
+        camera_indices = camera_ray_bundle.camera_indices.view(*camera_ray_bundle.shape)
+        self.rendered_camera_indices += camera_indices[0, 0].view(-1).tolist()
+        rgb = (camera_indices[..., None].float() / 10.0).expand(*camera_indices.shape, 3)
+        return {"rgb": rgb.reshape(*camera_indices.shape[:2], -1)}
+
+
+def test_render_trajectory_images(tmp_path):
+    """Test that rendering a shard skips the existing frames, and replaces the partially written ones"""
+    output_image_dir = tmp_path / "renders" / "output"
+    output_image_dir.mkdir(parents=True)
+    existing_image = np.full((4, 5, 3), 255, dtype=np.uint8)
+    media.write_image(output_image_dir / "00001.png", existing_image)
+    # Left behind by a render interrupted while writing the image
+    (output_image_dir / "00002.partial.png").write_bytes(b"truncated")
+
+    pipeline = SimpleNamespace(device="cpu", model=_StubModel(num_rays_per_chunk=40))
+    render._render_trajectory_video(
+        pipeline,
+        _get_cameras(5),
+        output_filename=tmp_path / "renders" / "output.mp4",
+        rendered_output_names=["rgb"],
+        render_width=5,
+        render_height=4,
+        output_format="images",
+        frame_indices=[0, 1, 2, 3],
+        skip_existing=True,
+    )
+    assert pipeline.model.rendered_camera_indices == [0, 2, 3]
+    assert sorted(path.name for path in output_image_dir.iterdir()) == [f"{idx:05d}.png" for idx in range(4)]
+    assert np.array_equal(media.read_image(output_image_dir / "00001.png"), existing_image)
+    for camera_idx in (0, 2, 3):
+        image = media.read_image(output_image_dir / f"{camera_idx:05d}.png")
+        assert image.shape == (4, 5, 3)
+        assert np.all(np.abs(image - camera_idx / 10.0 * 255) <= 1)
+
+
+def test_stitch_trajectory_video_missing_frames(tmp_path):
+    """Test that stitching refuses to assemble a video with missing frames"""
+    output_image_dir = tmp_path / "output"
+    output_image_dir.mkdir()
+    media.write_image(output_image_dir / "00000.png", np.zeros((4, 6, 3), dtype=np.uint8))
+    with pytest.raises(SystemExit):
+        render._stitch_trajectory_video(tmp_path / "output.mp4", num_frames=2)
+    assert not (tmp_path / "output.mp4").exists()
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is required to write videos")
+def test_stitch_trajectory_video(tmp_path):
+    """Test that the images of a trajectory are assembled into a video in order"""
+    output_image_dir = tmp_path / "output"
+    output_image_dir.mkdir()
+    for idx in range(3):
+        media.write_image(output_image_dir / f"{idx:05d}.png", np.full((16, 16, 3), 100 * idx, dtype=np.uint8))
+    render._stitch_trajectory_video(tmp_path / "output.mp4", num_frames=3, seconds=1.0)
+    video = media.read_video(tmp_path / "output.mp4")
+    assert video.shape == (3, 16, 16, 3)
+    assert np.all(np.abs(video.mean(axis=(1, 2, 3)) - np.array([0, 100, 200])) < 10)